@@ -1,12 +1,20 @@
+import hmac
 from typing import Annotated
 
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Query, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from jwt import PyJWKClientError
 from jwt.exceptions import InvalidTokenError
 from pydantic import ValidationError
 
-from app.core.auth.oidc import verify_token
+from app.api.http_exceptions import (
+    admin_only_exception,
+    invalid_cursor_exception,
+    invalid_scrape_token_exception,
+)
+from app.core.auth.oidc import verify_token_async
+from app.core.config import settings
+from app.core.pagination import Cursor, decode_cursor
 from app.core.repos.users_repo import UsersRepositoryDep
 from app.models import User
 
@@ -15,26 +23,58 @@ bearer_auth_scheme = HTTPBearer()
 TokenDep = Annotated[HTTPAuthorizationCredentials, Depends(bearer_auth_scheme)]
 
 
-def get_current_user(users: UsersRepositoryDep, token: TokenDep) -> User:
+async def get_current_user(users: UsersRepositoryDep, token: TokenDep) -> User:
     try:
-        token_data = verify_token(token.credentials)
+        token_data = await verify_token_async(token.credentials)
     except (InvalidTokenError, ValidationError, PyJWKClientError):
         # PyJWKClientError can occur if the JWKS endpoint is unreachable or the kid mentioned in the header was not found in the JWKS, e.g. if someone sends a JWT from a different issuer
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid or expired token",
         )
-    user = users.find_one_by_clerk_user_id(token_data.sub)
+    user = await users.find_one_by_clerk_user_id_cached(token_data.sub)
     if not user:
         # we could not find the user, but we trust our Identity Provider
         # so we create a new user record
-        created = users.create(
-            clerk_user_id=token_data.sub,
-        )
-        return created
+        user = await users.find_or_create(clerk_user_id=token_data.sub)
     if not user.is_active:
         raise HTTPException(status_code=401, detail="Inactive user")
     return user
 
 
 CurrentUser = Annotated[User, Depends(get_current_user)]
+
+
+async def get_current_admin(current_user: CurrentUser) -> User:
+    if current_user.clerk_user_id not in settings.ADMIN_CLERK_USER_IDS:
+        raise admin_only_exception()
+    return current_user
+
+
+CurrentAdmin = Annotated[User, Depends(get_current_admin)]
+
+
+async def verify_scrape_token(token: TokenDep) -> None:
+    """The scrapers send METRICS_SCRAPE_TOKEN as bearer token, Prometheus with `authorization` in its scrape config."""
+    expected = settings.METRICS_SCRAPE_TOKEN
+    if not expected or not hmac.compare_digest(
+        token.credentials.encode(), expected.encode()
+    ):
+        raise invalid_scrape_token_exception()
+
+
+async def get_cursor(
+    cursor: Annotated[
+        str | None,
+        Query(description="The next_cursor of the previous page."),
+    ] = None,
+) -> Cursor | None:
+    if cursor is None:
+        return None
+    try:
+        return decode_cursor(cursor)
+    except ValueError:
+        raise invalid_cursor_exception()
+
+
+CursorDep = Annotated[Cursor | None, Depends(get_cursor)]
@@ -0,0 +1,43 @@
+import hashlib
+
+from fastapi import Request, Response
+
+from app.api.http_exceptions import not_modified_exception
+from app.core.response_cache import CachedResponse
+
+
+def make_etag(request: Request, *versions: object) -> str:
+    """
+    Strong ETag over the versions of everything a response contains and the query parameters that shape it.
+    The user is not part of it, responses vary by the Authorization header instead.
+    """
+    query = sorted(request.query_params.multi_items())
+    raw = "|".join(map(str, [*versions, query]))
+    return f'"{hashlib.sha256(raw.encode()).hexdigest()[:32]}"'
+
+
+def etag_headers(etag: str) -> dict[str, str]:
+    # no-cache lets clients store the response, but makes them revalidate it every time
+    return {
+        "ETag": etag,
+        "Cache-Control": "private, no-cache",
+        "Vary": "Authorization",
+    }
+
+
+def check_if_none_match(request: Request, etag: str) -> None:
+    """Raises a 304 if the client already has the current representation."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is None:
+        return
+    # If-None-Match uses the weak comparison
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    if "*" in candidates or etag in candidates:
+        raise not_modified_exception(etag_headers(etag))
+
+
+def cached_response(request: Request, cached: CachedResponse) -> Response:
+    check_if_none_match(request, cached.etag)
+    return Response(
+        cached.body, media_type="application/json", headers=etag_headers(cached.etag)
+    )
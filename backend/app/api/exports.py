@@ -0,0 +1,47 @@
+from collections.abc import AsyncIterator, Callable, Sequence
+from typing import Any, TypeVar
+
+from fastapi.responses import StreamingResponse
+
+from app.api.serialization import dump_csv
+from app.core.db import DbSession, open_session
+from app.models import ExportFormat
+
+R = TypeVar("R", bound=Sequence[Any])
+
+MEDIA_TYPES = {
+    ExportFormat.NDJSON: "application/x-ndjson",
+    ExportFormat.CSV: "text/csv; charset=utf-8",
+}
+
+
+def export_response(
+    name: str,
+    export_format: ExportFormat,
+    columns: Sequence[str],
+    stream_rows: Callable[[DbSession], AsyncIterator[Sequence[R]]],
+    dump_ndjson: Callable[[Sequence[R]], bytes],
+) -> StreamingResponse:
+    """
+    Streams the batches of `stream_rows` as NDJSON or as CSV with the `columns` as header.
+    The body is sent after the request's session is closed, so the rows are read through a session of their own.
+    """
+
+    async def body() -> AsyncIterator[bytes]:
+        if export_format == ExportFormat.CSV:
+            yield dump_csv([columns])
+        async with open_session() as session:
+            async for rows in stream_rows(session):
+                if export_format == ExportFormat.CSV:
+                    yield dump_csv(rows)
+                else:
+                    yield dump_ndjson(rows)
+
+    return StreamingResponse(
+        body(),
+        media_type=MEDIA_TYPES[export_format],
+        headers={
+            "Content-Disposition": f'attachment; filename="{name}.{export_format.value}"',
+            "Cache-Control": "private, no-store",
+        },
+    )
@@ -19,3 +19,49 @@ def settlement_not_matching_amount_due() -> HTTPException:
         status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
         detail="The amount due of all affected disbursements does not match the amount provided in the request body.",
     )
+
+
+def settlement_conflict_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="Some disbursements listed in settled_disbursement_ids are being settled by another request. Retry once it has finished.",
+    )
+
+
+def nothing_to_settle_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        detail="There are no unsettled disbursements with the other user in the given currency.",
+    )
+
+
+def not_a_counterparty_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        detail="Some users listed in user_ids do not share any disbursements with you.",
+    )
+
+
+def not_modified_exception(headers: dict[str, str]) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+
+def invalid_cursor_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        detail="The cursor is invalid. Use the next_cursor of a previous page.",
+    )
+
+
+def admin_only_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_403_FORBIDDEN,
+        detail="Only admins can access this resource.",
+    )
+
+
+def invalid_scrape_token_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_403_FORBIDDEN,
+        detail="The metrics require the scrape token.",
+    )
@@ -1,6 +1,7 @@
 from fastapi import APIRouter
 
 from app.api.routes import (
+    balances,
     disbursements,
     settlements,
     users,
@@ -12,3 +13,4 @@ api_router.include_router(users.router)
 api_router.include_router(utils.router)
 api_router.include_router(disbursements.router)
 api_router.include_router(settlements.router)
+api_router.include_router(balances.router)
@@ -0,0 +1,161 @@
+import hashlib
+import hmac
+import logging
+import re
+import threading
+import time
+from collections.abc import Sequence
+from datetime import datetime, timezone
+from pathlib import Path
+
+from fastapi.routing import APIRoute
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.routing import BaseRoute, Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core import metrics
+from app.core.concurrency import current_threadpool_tracer
+from app.core.config import settings
+from app.core.db import QueryBudget, RequestDbStats, request_db_stats
+from app.core.profiling import RequestProfile
+
+logger = logging.getLogger(__name__)
+
+
+def query_budget(operation: str) -> QueryBudget:
+    return QueryBudget(
+        max_statements=settings.QUERY_BUDGET_OVERRIDES.get(
+            operation, settings.QUERY_BUDGET_MAX_STATEMENTS
+        ),
+        max_repeats=settings.QUERY_BUDGET_MAX_REPEATS,
+    )
+
+
+class MetricsMiddleware:
+    """
+    Records count, latency, in-flight requests and database time per operation, i.e. per route's unique id.
+    Reports the database time in a `Server-Timing` header and checks the statements against the query budget.
+    A plain ASGI middleware, so that the response body is not buffered.
+    """
+
+    def __init__(self, app: ASGIApp, routes: Sequence[BaseRoute]) -> None:
+        self.app = app
+        self.routes = routes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        operation = self._operation(scope)
+        budget = query_budget(operation)
+        db_stats = RequestDbStats(
+            enforced_budget=budget if settings.QUERY_BUDGET_MODE == "raise" else None
+        )
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = MutableHeaders(scope=message)
+                # streamed responses may run more statements after the headers are sent
+                headers.append(
+                    "Server-Timing",
+                    f'db;dur={db_stats.seconds * 1000:.1f};desc="{db_stats.statements} statements", '
+                    f"app;dur={(time.perf_counter() - start) * 1000:.1f}",
+                )
+            await send(message)
+
+        token = request_db_stats.set(db_stats)
+        metrics.http_requests_in_flight.inc(operation)
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            duration = time.perf_counter() - start
+            request_db_stats.reset(token)
+            metrics.http_request_duration.observe(duration, operation)
+            metrics.http_requests_in_flight.dec(operation)
+            metrics.http_requests.inc(operation, str(status))
+            metrics.http_request_db_statements.observe(db_stats.statements, operation)
+            metrics.http_request_db_duration.observe(db_stats.seconds, operation)
+            logger.debug(
+                "%s %d in %.1fms, %d statements in %.1fms",
+                operation,
+                status,
+                duration * 1000,
+                db_stats.statements,
+                db_stats.seconds * 1000,
+            )
+            if settings.QUERY_BUDGET_MODE == "warn":
+                for violation in db_stats.budget_violations(budget):
+                    logger.warning("Query budget of %s: %s", operation, violation)
+
+    def _operation(self, scope: Scope) -> str:
+        # routing happens behind the middleware, so match once more to know the route up front
+        for route in self.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                if isinstance(route, APIRoute):
+                    return route.unique_id
+                return getattr(route, "name", None) or "unnamed"
+        return "unmatched"
+
+
+class ProfilingMiddleware:
+    """
+    Profiles requests with an `X-Profile` header equal to PROFILING_TOKEN.
+    Writes the profile to PROFILING_DIR and names the file in the `X-Profile` response header.
+    Keeps the PROFILING_MAX_FILES newest profiles.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self._requested(scope):
+            await self.app(scope, receive, send)
+            return
+        path = scope["path"]
+        # bounded, file names are limited to 255 bytes
+        name = "{}-{}-{}-{}".format(
+            datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f"),
+            scope["method"],
+            re.sub(r"[^\w.-]", "_", path.strip("/"))[:64],
+            hashlib.sha256(path.encode()).hexdigest()[:8],
+        )
+
+        async def send_with_profile(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append("X-Profile", f"{name}.folded")
+            await send(message)
+
+        profile = RequestProfile(
+            threading.get_ident(), settings.PROFILING_INTERVAL_MS / 1000
+        )
+        token = current_threadpool_tracer.set(profile)
+        profile.start()
+        try:
+            await self.app(scope, receive, send_with_profile)
+        finally:
+            profile.stop()
+            current_threadpool_tracer.reset(token)
+            details = {"method": scope["method"], "path": path}
+            folded = profile.write(settings.PROFILING_DIR, name, details)
+            logger.info("Wrote profile %s", folded)
+            prune_profiles(settings.PROFILING_DIR, settings.PROFILING_MAX_FILES)
+
+    def _requested(self, scope: Scope) -> bool:
+        token = Headers(scope=scope).get("x-profile")
+        if not settings.PROFILING_TOKEN or token is None:
+            return False
+        return hmac.compare_digest(token.encode(), settings.PROFILING_TOKEN.encode())
+
+
+def prune_profiles(directory: str, keep: int) -> None:
+    """Deletes all but the `keep` newest profiles, each being a .folded and a .json file."""
+    # names start with the timestamp
+    profiles = sorted(Path(directory).glob("*.folded"), reverse=True)
+    for folded in profiles[keep:]:
+        folded.unlink(missing_ok=True)
+        folded.with_suffix(".json").unlink(missing_ok=True)
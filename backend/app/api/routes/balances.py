@@ -0,0 +1,47 @@
+from collections.abc import Sequence
+
+from fastapi import APIRouter
+from pydantic import UUID4
+
+from app.api.deps import CurrentUser
+from app.core.repos.pair_balances_repo import (
+    CounterpartyBalance,
+    PairBalancesRepositoryDep,
+)
+from app.models import BalancePublic, BalancesPublic, Currency, Money
+
+router = APIRouter(prefix="/balances", tags=["balances"])
+
+
+def to_balances_public(balances: Sequence[CounterpartyBalance]) -> BalancesPublic:
+    return BalancesPublic(
+        data=[
+            BalancePublic(
+                counterparty_id=b.counterparty_id,
+                balance=Money(amount=round(b.amount, 2), currency=Currency(b.currency)),
+            )
+            for b in balances
+        ]
+    )
+
+
+@router.get("/")
+async def find_all(
+    current_user: CurrentUser, repo: PairBalancesRepositoryDep
+) -> BalancesPublic:
+    """
+    Net unsettled balances between you and each of your counterparties, per currency.
+    """
+    balances = await repo.find_for_user(current_user.id)
+    return to_balances_public(balances)
+
+
+@router.get("/{other_user_id}")
+async def find_one(
+    other_user_id: UUID4, current_user: CurrentUser, repo: PairBalancesRepositoryDep
+) -> BalancesPublic:
+    """
+    Net unsettled balance between you and the other user, per currency.
+    """
+    balances = await repo.find_for_user(current_user.id, other_user_id)
+    return to_balances_public(balances)
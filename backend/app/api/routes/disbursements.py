@@ -1,16 +1,32 @@
 from typing import Annotated
 
-from fastapi import APIRouter, Query, status
+from fastapi import APIRouter, Body, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
 from pydantic import UUID4
 
-from app.api.deps import CurrentUser
+from app.api.deps import CurrentUser, CursorDep
+from app.api.etags import (
+    cached_response,
+    check_if_none_match,
+    etag_headers,
+    make_etag,
+)
+from app.api.exports import export_response
 from app.api.http_exceptions import not_found_exception
-from app.core.repos.disbursements_repo import DisbursementRepositoryDep
+from app.api.serialization import dump_disbursements, dump_disbursements_ndjson
+from app.core.config import settings
+from app.core.repos.disbursements_repo import (
+    DisbursementRepositoryDep,
+    DisbursementRow,
+    DisbursementsRepository,
+)
+from app.core.response_cache import CachedResponse, response_cache
 from app.models import (
     Disbursement,
     DisbursementCreate,
     DisbursementPublic,
     DisbursementsPublic,
+    ExportFormat,
     Money,
 )
 
@@ -20,7 +36,7 @@ router = APIRouter(prefix="/disbursements", tags=["disbursements"])
 @router.post(
     "/", response_model=DisbursementPublic, status_code=status.HTTP_201_CREATED
 )
-def create(
+async def create(
     dto: DisbursementCreate, repo: DisbursementRepositoryDep, current_user: CurrentUser
 ) -> DisbursementPublic:
     disbursement = Disbursement.model_validate(
@@ -31,49 +47,151 @@ def create(
             "owner_id": current_user.id,
         },
     )
-    repo.create_and_refresh(disbursement)
+    await repo.create_and_refresh(disbursement)
     return DisbursementPublic(
         **disbursement.model_dump(), amount_paid=Money(**disbursement.model_dump())
     )
 
 
-@router.get("/")
-def find_all_owned(
+@router.post(
+    "/bulk",
+    response_model=list[DisbursementPublic],
+    status_code=status.HTTP_201_CREATED,
+)
+async def create_bulk(
+    dtos: Annotated[
+        list[DisbursementCreate],
+        Body(min_length=1, max_length=settings.DISBURSEMENTS_BULK_MAX_SIZE),
+    ],
+    repo: DisbursementRepositoryDep,
+    current_user: CurrentUser,
+) -> list[DisbursementPublic]:
+    """
+    Creates all disbursements at once, or none of them.
+    """
+    disbursements = [
+        Disbursement.model_validate(
+            dto,
+            update={
+                "amount": dto.amount_paid.amount,
+                "currency": dto.amount_paid.currency.value,
+                "owner_id": current_user.id,
+            },
+        )
+        for dto in dtos
+    ]
+    created = await repo.create_many(disbursements)
+    return list(map(DisbursementPublic.make, created))
+
+
+@router.get("/", response_model=DisbursementsPublic)
+async def find_all_owned(
+    request: Request,
     current_user: CurrentUser,
     repo: DisbursementRepositoryDep,
-    limit: Annotated[int, Query(max=100)] = 10,
-    offset: Annotated[int, Query(min=0)] = 0,
-) -> DisbursementsPublic:
-    disbursements = repo.find_all_owned(current_user.id, limit, offset)
-    data = list(map(DisbursementPublic.make, disbursements))
-    total = repo.count_owned(current_user.id)
-    return DisbursementsPublic(data=data, total=total)
+    after: CursorDep,
+    limit: Annotated[int, Query(ge=1, le=100)] = 10,
+    offset: Annotated[int, Query(ge=0, deprecated=True)] = 0,
+) -> Response:
+    """
+    Supports conditional requests with `If-None-Match`.
+    """
+
+    async def load() -> CachedResponse:
+        # read before the page, so that the page is never older than its ETag
+        version = await repo.version_owned(current_user.id)
+        etag = make_etag(request, version)
+        if response_cache.backend is None:
+            # nothing to store, so a 304 may skip the page query. With the cache on, the page is built
+            # and stored and cached_response answers with the 304
+            check_if_none_match(request, etag)
+        disbursements, next_cursor = await repo.find_all_owned(
+            current_user.id, limit, offset, after
+        )
+        body = dump_disbursements(disbursements, version.total, next_cursor)
+        return CachedResponse(etag, body)
 
+    cached = await response_cache.get_or_load(current_user.id, request, load)
+    return cached_response(request, cached)
 
-@router.get("/users/{other_user_id}")
-def find_all_with_user(
+
+@router.get("/users/{other_user_id}", response_model=DisbursementsPublic)
+async def find_all_with_user(
+    request: Request,
     other_user_id: UUID4,
     current_user: CurrentUser,
     repo: DisbursementRepositoryDep,
-    limit: Annotated[int, Query(max=100)] = 10,
-    offset: Annotated[int, Query(min=0)] = 0,
+    after: CursorDep,
+    limit: Annotated[int, Query(ge=1, le=100)] = 10,
+    offset: Annotated[int, Query(ge=0, deprecated=True)] = 0,
     exclude_settled: bool = True,
-) -> DisbursementsPublic:
-    disbursements = repo.find_all_between(
-        current_user.id, other_user_id, limit, offset, exclude_settled
+) -> Response:
+    """
+    Supports conditional requests with `If-None-Match`.
+    """
+
+    async def load() -> CachedResponse:
+        version = await repo.version_between(
+            current_user.id, other_user_id, exclude_settled
+        )
+        total = await repo.count_owned(current_user.id)
+        etag = make_etag(request, version, total)
+        if response_cache.backend is None:
+            # nothing to store, so a 304 may skip the page query. With the cache on, the page is built
+            # and stored and cached_response answers with the 304
+            check_if_none_match(request, etag)
+        disbursements, next_cursor = await repo.find_all_between(
+            current_user.id, other_user_id, limit, offset, exclude_settled, after
+        )
+        body = dump_disbursements(disbursements, total, next_cursor)
+        return CachedResponse(etag, body)
+
+    cached = await response_cache.get_or_load(current_user.id, request, load)
+    return cached_response(request, cached)
+
+
+@router.get(
+    "/export",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"application/x-ndjson": {}, "text/csv": {}}}},
+)
+async def export(
+    current_user: CurrentUser,
+    export_format: Annotated[ExportFormat, Query(alias="format")] = ExportFormat.NDJSON,
+) -> StreamingResponse:
+    """
+    All your disbursements, newest first, streamed without pagination.
+    As NDJSON, every line is a disbursement like in the list responses. As CSV, the amount paid is flattened into `amount` and `currency`.
+    """
+    return export_response(
+        "disbursements",
+        export_format,
+        DisbursementRow._fields,
+        lambda session: DisbursementsRepository(session).stream_owned(current_user.id),
+        dump_disbursements_ndjson,
     )
-    data = list(map(DisbursementPublic.make, disbursements))
-    total = repo.count_owned(current_user.id)
-    return DisbursementsPublic(data=data, total=total)
 
 
 @router.get("/{id}")
-def find_one(
-    id: UUID4, current_user: CurrentUser, repo: DisbursementRepositoryDep
+async def find_one(
+    request: Request,
+    response: Response,
+    id: UUID4,
+    current_user: CurrentUser,
+    repo: DisbursementRepositoryDep,
 ) -> DisbursementPublic:
-    disbursement = repo.find_one_owned(id, current_user.id)
+    """
+    Supports conditional requests with `If-None-Match`.
+    """
+    updated_at = await repo.find_updated_at_owned(id, current_user.id)
+    if updated_at is None:
+        raise not_found_exception()
+    etag = make_etag(request, id, updated_at)
+    check_if_none_match(request, etag)
+    disbursement = await repo.find_one_owned(id, current_user.id)
     if not disbursement:
         raise not_found_exception()
+    response.headers.update(etag_headers(etag))
     return DisbursementPublic.make(disbursement)
 
 
@@ -82,10 +200,8 @@ def find_one(
     status_code=status.HTTP_204_NO_CONTENT,
     description="Soft-deletes the given resource.",
 )
-def delete(
+async def delete(
     id: UUID4, current_user: CurrentUser, repo: DisbursementRepositoryDep
 ) -> None:
-    disbursement = repo.find_one_owned(id, owner_id=current_user.id)
-    if not disbursement:
+    if not await repo.soft_delete(id, owner_id=current_user.id):
         raise not_found_exception()
-    repo.soft_delete(disbursement)
@@ -1,28 +1,66 @@
 import uuid
-from functools import reduce
+from datetime import datetime, timezone
+from typing import Annotated, Literal
 
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
 from pydantic import UUID4
 
-from app.api.deps import CurrentUser
+from app.api.deps import CurrentUser, CursorDep
+from app.api.etags import (
+    cached_response,
+    check_if_none_match,
+    etag_headers,
+    make_etag,
+)
+from app.api.exports import export_response
 from app.api.http_exceptions import (
+    not_a_counterparty_exception,
     not_found_exception,
+    nothing_to_settle_exception,
+    settlement_conflict_exception,
     settlement_not_matching_amount_due,
     settlement_not_matching_disbursements_exception,
 )
+from app.api.serialization import (
+    dump_settlements,
+    dump_settlements_ndjson,
+    settlement_json,
+)
 from app.core.db import SessionDep
 from app.core.repos.disbursements_repo import DisbursementRepositoryDep
-from app.core.repos.settlements_repo import SettlementsRepositoryDep
+from app.core.repos.pair_balances_repo import (
+    PairBalancesRepositoryDep,
+    PairDelta,
+)
+from app.core.repos.settlements_repo import (
+    SettlementRow,
+    SettlementsRepository,
+    SettlementsRepositoryDep,
+    involved_user_ids,
+)
+from app.core.response_cache import CachedResponse, response_cache
+from app.core.settle_up import minimize_transfers
 from app.models import (
-    Disbursement,
+    AmountDuePublic,
+    Currency,
+    ExportFormat,
+    Money,
     Settlement,
     SettlementCreate,
     SettlementPublic,
+    SettlementQuoteCreate,
+    SettlementQuotePublic,
     SettlementsPublic,
+    SettlementSuggestionPublic,
+    SettlementSuggestionsPublic,
 )
 
 router = APIRouter(prefix="/settlements", tags=["settlements"])
 
+# related resources that can be embedded with `include`
+SettlementInclude = Literal["disbursements"]
+
 
 def assert_current_user_is_settling(
     dto: SettlementCreate, current_user: CurrentUser
@@ -34,26 +72,43 @@ def assert_current_user_is_settling(
         )
 
 
-@router.post("/", response_model=SettlementPublic, status_code=status.HTTP_201_CREATED)
-def create(
+@router.post("/", status_code=status.HTTP_201_CREATED)
+async def create(
     dto: SettlementCreate,
     current_user: CurrentUser,
     session: SessionDep,
     disbursements_repo: DisbursementRepositoryDep,
-) -> Settlement:
+    pair_balances_repo: PairBalancesRepositoryDep,
+) -> SettlementPublic:
     # TODO refactor
     # TODO sender and receiver can be identical
     assert_current_user_is_settling(dto, current_user)
 
-    affected_disbursements = disbursements_repo.find_affected_for_settlement(
-        settled_disbursement_ids=dto.settled_disbursement_ids,
-        receiving_party_id=dto.receiving_party_id,
+    amounts_due = await disbursements_repo.sum_amount_due(
         sending_party_id=dto.sending_party_id,
+        receiving_party_id=dto.receiving_party_id,
+        settled_disbursement_ids=dto.settled_disbursement_ids,
+        lock=True,
     )
 
     # this simple check works thanks to uniqueness constraints in db and on the dto
-    if not len(affected_disbursements) == len(dto.settled_disbursement_ids):
+    locked = sum(a.disbursement_count for a in amounts_due)
+    if not locked == len(dto.settled_disbursement_ids):
+        # the missing rows either do not qualify or are locked by a concurrent settlement
+        matching = await disbursements_repo.count_affected_for_settlement(
+            settled_disbursement_ids=dto.settled_disbursement_ids,
+            receiving_party_id=dto.receiving_party_id,
+            sending_party_id=dto.sending_party_id,
+        )
+        if matching == len(dto.settled_disbursement_ids):
+            raise settlement_conflict_exception()
         raise settlement_not_matching_disbursements_exception()
+    # a settlement is paid in a single currency
+    if len(amounts_due) != 1 or amounts_due[0].currency != dto.currency.value:
+        raise settlement_not_matching_amount_due()
+    amount_due = amounts_due[0]
+    if round(amount_due.amount_due, 2) != -dto.amount_paid:
+        raise settlement_not_matching_amount_due()
     settlement = Settlement.model_validate(
         dto,
         update={
@@ -62,41 +117,239 @@ def create(
         },
     )
 
-    def to_total_amount_due(acc: float, d: Disbursement) -> float:
-        if d.paying_party_id != dto.sending_party_id:
-            return acc - d.amount
-        return acc + d.amount
+    session.add(settlement)
+    await session.flush()  # the disbursements reference the settlement
+    attached = await disbursements_repo.attach_to_settlement(
+        dto.settled_disbursement_ids, settlement.id
+    )
+    if attached != locked:
+        await session.rollback()
+        raise settlement_conflict_exception()
+    if dto.sending_party_id != dto.receiving_party_id:
+        await pair_balances_repo.apply(
+            [
+                PairDelta.between(
+                    dto.sending_party_id,
+                    dto.receiving_party_id,
+                    amount_due.currency,
+                    -amount_due.amount_due,
+                )
+            ]
+        )
+    involved = involved_user_ids(settlement)
+    await session.commit()
+    await response_cache.invalidate(involved)
+    await session.refresh(settlement)
+    return SettlementPublic.make(settlement)
+
 
-    # TODO we somehow need to get currencies in here, too.
-    total = reduce(to_total_amount_due, affected_disbursements, 0.0)
-    rounded_total = round(total, 2)
-    if rounded_total != -dto.amount_paid:
-        raise settlement_not_matching_amount_due()
+@router.post("/quote")
+async def quote(
+    dto: SettlementQuoteCreate,
+    current_user: CurrentUser,
+    disbursements_repo: DisbursementRepositoryDep,
+) -> SettlementQuotePublic:
+    """
+    The amount_paid per currency that `POST /settlements/` accepts for settling the disbursements
+    between you, as the sending party, and the receiving party.
+    """
+    amounts_due = await disbursements_repo.sum_amount_due(
+        sending_party_id=current_user.id,
+        receiving_party_id=dto.receiving_party_id,
+        settled_disbursement_ids=dto.settled_disbursement_ids,
+    )
+    found = sum(a.disbursement_count for a in amounts_due)
+    if dto.settled_disbursement_ids is not None and found != len(
+        dto.settled_disbursement_ids
+    ):
+        raise settlement_not_matching_disbursements_exception()
+    return SettlementQuotePublic(
+        data=[
+            AmountDuePublic(
+                amount_paid=Money(
+                    amount=round(-a.amount_due, 2), currency=Currency(a.currency)
+                ),
+                disbursement_count=a.disbursement_count,
+            )
+            for a in amounts_due
+        ]
+    )
 
-    for disbursement in affected_disbursements:
-        disbursement.sqlmodel_update({"settlement_id": settlement.id})
-    session.add(settlement)
-    session.add_all(affected_disbursements)
-    session.commit()
-    session.refresh(settlement)
-    return settlement
-
-
-@router.get("/")
-def find_all_owned(
-    current_user: CurrentUser, repo: SettlementsRepositoryDep
-) -> SettlementsPublic:
-    settlements = repo.find_all_owned(current_user.id)
-    total = repo.count_owned(current_user.id)
-    settlements_mapped = list(map(SettlementPublic.make, settlements))
-    return SettlementsPublic(data=settlements_mapped, total=total)
-
-
-@router.get("/{id}", response_model=SettlementPublic)
-def find_one(
-    id: UUID4, current_user: CurrentUser, repo: SettlementsRepositoryDep
-) -> Settlement:
-    settlement = repo.find_one_owned(id, owner_id=current_user.id)
+
+@router.post("/settle-all/{other_user_id}", status_code=status.HTTP_201_CREATED)
+async def settle_all(
+    other_user_id: UUID4,
+    currency: Currency,
+    current_user: CurrentUser,
+    session: SessionDep,
+    repo: SettlementsRepositoryDep,
+    pair_balances_repo: PairBalancesRepositoryDep,
+    settled_before: datetime | None = None,
+) -> SettlementPublic:
+    """
+    Settles all unsettled disbursements between you and the other user in the given currency,
+    optionally only those created before `settled_before`. You are the sending party and pay the amount due.
+    """
+    if other_user_id == current_user.id:
+        raise nothing_to_settle_exception()
+    settled = await repo.settle_all_between(
+        owner_id=current_user.id,
+        sending_party_id=current_user.id,
+        receiving_party_id=other_user_id,
+        currency=currency.value,
+        settled_at=datetime.now(timezone.utc),
+        settled_before=settled_before,
+    )
+    if settled is None:
+        raise nothing_to_settle_exception()
+    await pair_balances_repo.apply(
+        [
+            PairDelta.between(
+                current_user.id, other_user_id, currency.value, -settled.amount_due
+            )
+        ]
+    )
+    await session.commit()
+    await response_cache.invalidate([current_user.id, other_user_id])
+    settlement = await repo.find_one(settled.settlement_id)
+    if settlement is None:
+        raise RuntimeError(f"Settlement {settled.settlement_id} vanished after commit")
+    return SettlementPublic.make(settlement)
+
+
+@router.get("/", response_model=SettlementsPublic)
+async def find_all_owned(
+    request: Request,
+    current_user: CurrentUser,
+    repo: SettlementsRepositoryDep,
+    disbursements_repo: DisbursementRepositoryDep,
+    after: CursorDep,
+    limit: Annotated[int, Query(ge=1, le=100)] = 100,
+    include: SettlementInclude | None = None,
+) -> Response:
+    """
+    Supports conditional requests with `If-None-Match`.
+    """
+
+    async def load() -> CachedResponse:
+        # read before the page, so that the page is never older than its ETag
+        version = await repo.version_owned(current_user.id)
+        versions = [version]
+        if include == "disbursements":
+            versions.append(
+                await disbursements_repo.version_settled_by(current_user.id)
+            )
+        etag = make_etag(request, *versions)
+        if response_cache.backend is None:
+            # nothing to store, so a 304 may skip the page query. With the cache on, the page is built
+            # and stored and cached_response answers with the 304
+            check_if_none_match(request, etag)
+        settlements, next_cursor = await repo.find_all_owned(
+            current_user.id, limit, after
+        )
+        if include != "disbursements":
+            body = dump_settlements(
+                map(settlement_json, settlements), version.total, next_cursor
+            )
+        else:
+            # one extra query for the whole page, like selectinload
+            settled = await disbursements_repo.find_all_by_settlement(
+                [s.id for s in settlements]
+            )
+            body = dump_settlements(
+                (settlement_json(s, settled.get(s.id, [])) for s in settlements),
+                version.total,
+                next_cursor,
+            )
+        return CachedResponse(etag, body)
+
+    cached = await response_cache.get_or_load(current_user.id, request, load)
+    return cached_response(request, cached)
+
+
+@router.get("/suggestions")
+async def suggestions(
+    user_ids: Annotated[list[UUID4], Query(min_length=1, max_length=1000)],
+    currency: Currency,
+    current_user: CurrentUser,
+    pair_balances_repo: PairBalancesRepositoryDep,
+) -> SettlementSuggestionsPublic:
+    """
+    Suggests a minimal set of settlements that settles the unsettled disbursements within the group
+    of you and the listed users, who must all share disbursements with you.
+    Balances with users outside of the group are not affected.
+    """
+    others = set(user_ids) - {current_user.id}
+    counterparties = await pair_balances_repo.find_counterparty_ids(
+        current_user.id, list(others)
+    )
+    if counterparties != others:
+        raise not_a_counterparty_exception()
+    balances = await pair_balances_repo.sum_net_balances(
+        [current_user.id, *others], currency.value
+    )
+    return SettlementSuggestionsPublic(
+        data=[
+            SettlementSuggestionPublic(
+                sending_party_id=t.sending_party_id,
+                receiving_party_id=t.receiving_party_id,
+                amount_paid=Money(amount=t.amount, currency=currency),
+            )
+            for t in minimize_transfers(balances)
+        ]
+    )
+
+
+@router.get(
+    "/export",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"application/x-ndjson": {}, "text/csv": {}}}},
+)
+async def export(
+    current_user: CurrentUser,
+    export_format: Annotated[ExportFormat, Query(alias="format")] = ExportFormat.NDJSON,
+) -> StreamingResponse:
+    """
+    All your settlements, newest first, streamed without pagination and without their disbursements.
+    As NDJSON, every line is a settlement like in the list responses.
+    """
+    return export_response(
+        "settlements",
+        export_format,
+        SettlementRow._fields,
+        lambda session: SettlementsRepository(session).stream_owned(current_user.id),
+        dump_settlements_ndjson,
+    )
+
+
+@router.get("/{id}")
+async def find_one(
+    request: Request,
+    response: Response,
+    id: UUID4,
+    current_user: CurrentUser,
+    repo: SettlementsRepositoryDep,
+    disbursements_repo: DisbursementRepositoryDep,
+    include: SettlementInclude | None = None,
+) -> SettlementPublic:
+    """
+    Supports conditional requests with `If-None-Match`.
+    """
+    with_disbursements = include == "disbursements"
+    updated_at = await repo.find_updated_at_owned(id, current_user.id)
+    if updated_at is None:
+        raise not_found_exception()
+    versions: list[object] = [id, updated_at]
+    if with_disbursements:
+        versions.append(
+            await disbursements_repo.version_settled_by(current_user.id, id)
+        )
+    etag = make_etag(request, *versions)
+    check_if_none_match(request, etag)
+    settlement = await repo.find_one_owned(
+        id, owner_id=current_user.id, with_disbursements=with_disbursements
+    )
     if not settlement:
         raise not_found_exception()
-    return settlement
+    response.headers.update(etag_headers(etag))
+    return SettlementPublic.make(settlement, with_disbursements)
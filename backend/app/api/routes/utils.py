@@ -1,8 +1,108 @@
-from fastapi import APIRouter
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import PlainTextResponse
+
+from app.api.deps import CurrentAdmin, verify_scrape_token
+from app.core import metrics, slow_query_log
+from app.core.auth import oidc
+from app.core.db import PoolStatus, get_pool_status
+from app.core.repos.users_repo import user_cache
+from app.core.response_cache import response_cache
+from app.models import SlowQueriesPublic, SlowQueryPublic
 
 router = APIRouter(prefix="/utils", tags=["utils"])
 
+pool_connections = metrics.registry.gauge(
+    "db_pool_connections", "Connections of the pool by state.", ["state"]
+)
+pool_checkouts = metrics.registry.counter(
+    "db_pool_checkouts_total", "Connection checkouts from the pool."
+)
+pool_timeouts = metrics.registry.counter(
+    "db_pool_timeouts_total", "Checkouts that timed out waiting for a connection."
+)
+pool_wait = metrics.registry.counter(
+    "db_pool_wait_seconds_total", "Time spent waiting for a connection."
+)
+cache_lookups = metrics.registry.counter(
+    "cache_lookups_total", "Cache lookups by cache and result.", ["cache", "result"]
+)
+cache_evictions = metrics.registry.counter(
+    "cache_evictions_total", "Entries evicted or expired per cache.", ["cache"]
+)
+jwks_refreshes = metrics.registry.counter(
+    "jwks_refreshes_total", "Fetches of the JWKS by outcome.", ["outcome"]
+)
+
+
+def _collect() -> None:
+    pool = get_pool_status()
+    pool_connections.set(pool.size, "size")
+    pool_connections.set(pool.checked_out, "checked_out")
+    pool_connections.set(pool.idle, "idle")
+    pool_connections.set(pool.overflow, "overflow")
+    pool_checkouts.set(pool.checkouts)
+    pool_timeouts.set(pool.timeouts)
+    pool_wait.set(pool.total_wait_seconds)
+
+    for name, stats in [
+        ("token", oidc.token_cache.stats),
+        ("user", user_cache.stats),
+    ]:
+        cache_lookups.set(stats.hits, name, "hit")
+        cache_lookups.set(stats.misses, name, "miss")
+        cache_evictions.set(stats.evictions + stats.expirations, name)
+    response = response_cache.stats
+    cache_lookups.set(response.hits, "response", "hit")
+    cache_lookups.set(response.misses, "response", "miss")
+    cache_lookups.set(response.coalesced, "response", "coalesced")
+    cache_evictions.set(response.evictions, "response")
+    jwks = oidc.key_store.stats
+    cache_lookups.set(jwks.hits, "jwks", "hit")
+    cache_lookups.set(jwks.misses, "jwks", "miss")
+    jwks_refreshes.set(jwks.refreshes, "success")
+    jwks_refreshes.set(jwks.refresh_failures, "failure")
+
+
+metrics.registry.on_collect(_collect)
+
 
 @router.get("/health-check/")
 async def health_check() -> bool:
     return True
+
+
+@router.get("/db-pool/")
+async def db_pool(_admin: CurrentAdmin) -> PoolStatus:
+    """
+    Connection pool usage of this worker, to size pools against Postgres `max_connections`.
+    """
+    return get_pool_status()
+
+
+@router.get(
+    "/metrics/",
+    response_class=PlainTextResponse,
+    dependencies=[Depends(verify_scrape_token)],
+)
+async def metrics_endpoint() -> str:
+    """
+    Metrics of this worker in the Prometheus text format. Requires METRICS_SCRAPE_TOKEN as bearer token.
+    """
+    return metrics.registry.render()
+
+
+@router.get("/slow-queries/")
+async def slow_queries(
+    _admin: CurrentAdmin, limit: Annotated[int, Query(ge=1, le=1000)] = 100
+) -> SlowQueriesPublic:
+    """
+    The most recent statements of this worker above SLOW_QUERY_THRESHOLD_MS with their query plans, newest first.
+    """
+    return SlowQueriesPublic(
+        data=[
+            SlowQueryPublic.model_validate(entry)
+            for entry in slow_query_log.read_entries(limit)
+        ]
+    )
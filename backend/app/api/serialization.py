@@ -0,0 +1,143 @@
+"""
+Fast path for list responses: serializes plain dicts of the rows with precompiled TypeAdapters,
+skipping the public models and FastAPI's validation against the `response_model`.
+Produces the same JSON as the public models in app/models.py, keep both in sync.
+"""
+
+import csv
+import io
+import uuid
+from collections.abc import Iterable, Sequence
+from datetime import datetime
+
+from pydantic import TypeAdapter
+from typing_extensions import TypedDict
+
+from app.core.repos.disbursements_repo import DisbursementRow
+from app.core.repos.settlements_repo import SettlementRow
+
+
+class MoneyJson(TypedDict):
+    amount: float
+    currency: str
+
+
+class DisbursementJson(TypedDict):
+    id: uuid.UUID
+    owner_id: uuid.UUID
+    paying_party_id: uuid.UUID
+    on_behalf_of_party_id: uuid.UUID
+    comment: str | None
+    created_at: datetime
+    updated_at: datetime
+    amount_paid: MoneyJson
+
+
+class DisbursementsJson(TypedDict):
+    data: list[DisbursementJson]
+    total: int
+    next_cursor: str | None
+
+
+class SettlementJson(TypedDict):
+    id: uuid.UUID
+    owner_id: uuid.UUID
+    receiving_party_id: uuid.UUID
+    sending_party_id: uuid.UUID
+    amount_paid: float
+    currency: str
+    settled_at: datetime
+    created_at: datetime
+    updated_at: datetime
+    settled_disbursements: list[DisbursementJson] | None
+
+
+class SettlementsJson(TypedDict):
+    data: list[SettlementJson]
+    total: int
+    next_cursor: str | None
+
+
+disbursements_adapter = TypeAdapter(DisbursementsJson)
+settlements_adapter = TypeAdapter(SettlementsJson)
+disbursement_adapter = TypeAdapter(DisbursementJson)
+settlement_adapter = TypeAdapter(SettlementJson)
+
+
+def disbursement_json(d: DisbursementRow) -> DisbursementJson:
+    return {
+        "id": d.id,
+        "owner_id": d.owner_id,
+        "paying_party_id": d.paying_party_id,
+        "on_behalf_of_party_id": d.on_behalf_of_party_id,
+        "comment": d.comment,
+        "created_at": d.created_at,
+        "updated_at": d.updated_at,
+        "amount_paid": {"amount": d.amount, "currency": d.currency},
+    }
+
+
+def settlement_json(
+    s: SettlementRow,
+    settled_disbursements: Iterable[DisbursementRow] | None = None,
+) -> SettlementJson:
+    return {
+        "id": s.id,
+        "owner_id": s.owner_id,
+        "receiving_party_id": s.receiving_party_id,
+        "sending_party_id": s.sending_party_id,
+        "amount_paid": s.amount_paid,
+        "currency": s.currency,
+        "settled_at": s.settled_at,
+        "created_at": s.created_at,
+        "updated_at": s.updated_at,
+        "settled_disbursements": None
+        if settled_disbursements is None
+        else list(map(disbursement_json, settled_disbursements)),
+    }
+
+
+def dump_disbursements(
+    disbursements: Iterable[DisbursementRow], total: int, next_cursor: str | None
+) -> bytes:
+    body: DisbursementsJson = {
+        "data": list(map(disbursement_json, disbursements)),
+        "total": total,
+        "next_cursor": next_cursor,
+    }
+    return disbursements_adapter.dump_json(body)
+
+
+def dump_settlements(
+    settlements: Iterable[SettlementJson], total: int, next_cursor: str | None
+) -> bytes:
+    body: SettlementsJson = {
+        "data": list(settlements),
+        "total": total,
+        "next_cursor": next_cursor,
+    }
+    return settlements_adapter.dump_json(body)
+
+
+def dump_disbursements_ndjson(disbursements: Iterable[DisbursementRow]) -> bytes:
+    """One JSON object per line, like the items of the list responses."""
+    return b"".join(
+        disbursement_adapter.dump_json(disbursement_json(d)) + b"\n"
+        for d in disbursements
+    )
+
+
+def dump_settlements_ndjson(settlements: Iterable[SettlementRow]) -> bytes:
+    """One JSON object per line, like the items of the list responses."""
+    return b"".join(
+        settlement_adapter.dump_json(settlement_json(s)) + b"\n" for s in settlements
+    )
+
+
+def dump_csv(rows: Iterable[Sequence[object]]) -> bytes:
+    """CSV records of the rows, with datetimes in ISO 8601 like in the JSON responses."""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(
+        [v.isoformat() if isinstance(v, datetime) else v for v in row] for row in rows
+    )
+    return buffer.getvalue().encode()
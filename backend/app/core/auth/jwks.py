@@ -0,0 +1,112 @@
+import logging
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Any
+
+import jwt
+from jwt import PyJWKClientError
+
+logger = logging.getLogger(__name__)
+
+JwksFetcher = Callable[[], dict[str, Any]]
+
+
+@dataclass
+class JwksKeyStoreStats:
+    hits: int = 0
+    misses: int = 0
+    refreshes: int = 0
+    refresh_failures: int = 0
+    stale_serves: int = 0
+
+
+def make_jwks_fetcher(jwks_url: str, timeout_seconds: int) -> JwksFetcher:
+    # the client is only used for the http request, caching is done by JwksKeyStore
+    client = jwt.PyJWKClient(jwks_url, cache_jwk_set=False, timeout=timeout_seconds)
+
+    def fetch() -> dict[str, Any]:
+        data: dict[str, Any] = client.fetch_data()
+        return data
+
+    return fetch
+
+
+class JwksKeyStore:
+    """
+    Process-wide cache of the signing keys published by the identity provider.
+
+    Keys are kept for `ttl_seconds`. An unknown `kid` triggers at most one refresh per
+    `min_refresh_interval_seconds`, so tokens with made-up kids cannot make us hammer the JWKS endpoint.
+    Concurrent refreshes are coalesced into a single fetch. If a refresh fails, the previously fetched keys keep being served.
+    """
+
+    def __init__(
+        self,
+        fetch: JwksFetcher,
+        ttl_seconds: float,
+        min_refresh_interval_seconds: float,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._fetch = fetch
+        self._ttl_seconds = ttl_seconds
+        self._min_refresh_interval_seconds = min_refresh_interval_seconds
+        self._clock = clock
+        self._keys: dict[str, jwt.PyJWK] = {}
+        self._fetched_at: float | None = None
+        self._last_attempt_at: float | None = None
+        self._attempts = 0
+        self._refresh_lock = threading.Lock()
+        self.stats = JwksKeyStoreStats()
+
+    def get_signing_key(self, kid: str) -> jwt.PyJWK:
+        attempts = self._attempts
+        key = self._keys.get(kid)
+        if key is not None and not self._is_expired():
+            self.stats.hits += 1
+            return key
+
+        self.stats.misses += 1
+        self._refresh(seen_attempts=attempts, force=key is None)
+        key = self._keys.get(kid)
+        if key is None:
+            raise PyJWKClientError(
+                f'Unable to find a signing key that matches: "{kid}"'
+            )
+        return key
+
+    def _is_expired(self) -> bool:
+        return (
+            self._fetched_at is None
+            or self._clock() - self._fetched_at >= self._ttl_seconds
+        )
+
+    def _refresh(self, seen_attempts: int, force: bool) -> None:
+        with self._refresh_lock:
+            if self._attempts != seen_attempts:
+                # another thread tried to refresh the keys while we were waiting for the lock
+                return
+            now = self._clock()
+            if (
+                self._last_attempt_at is not None
+                and now - self._last_attempt_at < self._min_refresh_interval_seconds
+                and (self._keys or not force)
+            ):
+                return
+            self._last_attempt_at = now
+            self._attempts += 1
+            try:
+                jwk_set = jwt.PyJWKSet.from_dict(self._fetch())
+            except Exception as e:
+                self.stats.refresh_failures += 1
+                if not self._keys:
+                    if isinstance(e, PyJWKClientError):
+                        raise
+                    raise PyJWKClientError(f"Failed to fetch the JWKS: {e}") from e
+                self.stats.stale_serves += 1
+                logger.warning("JWKS refresh failed, serving stale keys: %s", e)
+                return
+            self._keys = {key.key_id: key for key in jwk_set.keys if key.key_id}
+            self._fetched_at = now
+            self.stats.refreshes += 1
@@ -1,15 +1,31 @@
+import hashlib
+import time
+
 import jwt
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
+from app.core.auth.jwks import JwksKeyStore, make_jwks_fetcher
+from app.core.cache import LruTtlCache
+from app.core.concurrency import run_in_threadpool
 from app.core.config import settings
+from app.core.metrics import jwt_verification_duration
 
 jwks_url = f"https://{settings.CLERK_DOMAIN}/.well-known/jwks.json"
 # audience = settings.CLERK_AUDIENCE
 issuer = settings.CLERK_ISSUER
 algorithm = "RS256"
 
+key_store = JwksKeyStore(
+    make_jwks_fetcher(jwks_url, timeout_seconds=settings.JWKS_FETCH_TIMEOUT_SECONDS),
+    ttl_seconds=settings.JWKS_CACHE_TTL_SECONDS,
+    min_refresh_interval_seconds=settings.JWKS_MIN_REFRESH_INTERVAL_SECONDS,
+)
+
 
 class JwtBody(BaseModel):
+    # instances are shared between requests through the token cache
+    model_config = ConfigDict(frozen=True)
+
     azp: str
     exp: int
     fva: list[int]
@@ -20,10 +36,56 @@ class JwtBody(BaseModel):
     sub: str
 
 
+# maps the sha256 digest of an already verified token to its body
+token_cache: LruTtlCache[bytes, JwtBody] = LruTtlCache(
+    max_size=settings.JWT_CACHE_MAX_SIZE
+)
+
+
 def verify_token(access_token: str) -> JwtBody:
+    """
+    Verifies the token, skipping signature verification for tokens that have been verified before and did not expire yet.
+    """
+    cached = token_cache.get(_digest(access_token))
+    if cached is not None:
+        return cached
+    return _decode_and_cache(access_token)
+
+
+async def verify_token_async(access_token: str) -> JwtBody:
+    """
+    Same as `verify_token`, but on a cache miss the verification runs in the threadpool as it might need to fetch the JWKS.
+    """
+    start = time.perf_counter()
+    cached = token_cache.get(_digest(access_token))
+    if cached is not None:
+        jwt_verification_duration.observe(time.perf_counter() - start, "true")
+        return cached
+    try:
+        return await run_in_threadpool(_decode_and_cache, access_token)
+    finally:
+        jwt_verification_duration.observe(time.perf_counter() - start, "false")
+
+
+def _decode_and_cache(access_token: str) -> JwtBody:
+    jwt_body = decode_token(access_token)
+    token_cache.set(
+        _digest(access_token),
+        jwt_body,
+        expires_at=None
+        if settings.INSECURE_SKIP_JWT_EXPIRATION_CHECK
+        else jwt_body.exp,
+    )
+    return jwt_body
+
+
+def _digest(access_token: str) -> bytes:
+    return hashlib.sha256(access_token.encode()).digest()
+
+
+def decode_token(access_token: str) -> JwtBody:
     header = jwt.get_unverified_header(access_token)
-    jwks_client = jwt.PyJWKClient(jwks_url)
-    key = jwks_client.get_signing_key(header["kid"]).key
+    key = key_store.get_signing_key(header["kid"]).key
     decoded = jwt.decode(
         access_token,
         key,
@@ -0,0 +1,89 @@
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from dataclasses import dataclass
+from typing import Generic, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class LruTtlCache(Generic[K, V]):
+    """
+    Thread-safe, size-bounded LRU cache whose entries can additionally expire at a point in time.
+    A `max_size` of 0 disables the cache.
+    """
+
+    def __init__(self, max_size: int, clock: Callable[[], float] = time.time) -> None:
+        self.max_size = max_size
+        self._clock = clock
+        self._entries: OrderedDict[K, tuple[V, float | None]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = CacheStats()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: K) -> V | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= self._clock():
+                del self._entries[key]
+                self.stats.expirations += 1
+                self.stats.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+            return value
+
+    def set(
+        self,
+        key: K,
+        value: V,
+        *,
+        ttl_seconds: float | None = None,
+        expires_at: float | None = None,
+    ) -> None:
+        """
+        Stores `value` until `expires_at` (same clock as the cache) or for `ttl_seconds`, whichever comes first.
+        Without either, the entry lives until it gets evicted.
+        """
+        if self.max_size <= 0:
+            return
+        if ttl_seconds is not None:
+            ttl_expiry = self._clock() + ttl_seconds
+            expires_at = (
+                ttl_expiry if expires_at is None else min(expires_at, ttl_expiry)
+            )
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.stats.evictions += 1
+
+    def delete(self, key: K) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,34 @@
+"""
+The threadpool of blocking calls, with a per-request hook to observe the threads that run them.
+"""
+
+from collections.abc import Callable
+from contextvars import ContextVar
+from typing import ParamSpec, Protocol, TypeVar
+
+from starlette.concurrency import run_in_threadpool as starlette_run_in_threadpool
+
+P = ParamSpec("P")
+R = TypeVar("R")
+
+
+class ThreadpoolTracer(Protocol):
+    def traced(self, func: Callable[P, R]) -> Callable[P, R]:
+        """Wraps `func` before it is sent to the threadpool."""
+        ...
+
+
+# set per request, e.g. by the profiler
+current_threadpool_tracer: ContextVar[ThreadpoolTracer | None] = ContextVar(
+    "current_threadpool_tracer", default=None
+)
+
+
+async def run_in_threadpool(
+    func: Callable[P, R], *args: P.args, **kwargs: P.kwargs
+) -> R:
+    """Starlette's `run_in_threadpool`, additionally wrapped by the tracer of the request if there is one."""
+    tracer = current_threadpool_tracer.get()
+    if tracer is not None:
+        func = tracer.traced(func)
+    return await starlette_run_in_threadpool(func, *args, **kwargs)
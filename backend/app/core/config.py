@@ -41,7 +41,16 @@ class Settings(BaseSettings):
     CLERK_AUDIENCE: str
     CLERK_ISSUER: str
     INSECURE_SKIP_JWT_EXPIRATION_CHECK: bool = False
+    JWKS_CACHE_TTL_SECONDS: int = 3600
+    # an unknown kid triggers a refresh of the JWKS at most once per interval
+    JWKS_MIN_REFRESH_INTERVAL_SECONDS: int = 30
+    JWKS_FETCH_TIMEOUT_SECONDS: int = 5
+    # max number of verified tokens kept in memory, 0 disables the cache
+    JWT_CACHE_MAX_SIZE: int = 10_000
     TEST_JWT: str = ""
+    # also how long a user deactivated in the database can keep authenticating
+    USER_CACHE_TTL_SECONDS: int = 30
+    USER_CACHE_MAX_SIZE: int = 10_000
 
     PROJECT_NAME: str
     POSTGRES_SERVER: str
@@ -50,6 +59,51 @@ class Settings(BaseSettings):
     POSTGRES_PASSWORD: str = ""
     POSTGRES_DB: str = ""
 
+    # "async" serves requests through AsyncSession and psycopg's async driver
+    DB_MODE: Literal["sync", "async"] = "sync"
+    # sized for the 40 threads that run sync routes per worker
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 30
+    DB_POOL_TIMEOUT_SECONDS: float = 30
+    # -1 disables recycling
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    # 0 disables the timeout
+    DB_STATEMENT_TIMEOUT_MS: int = 0
+    # max number of disbursements per POST /disbursements/bulk
+    DISBURSEMENTS_BULK_MAX_SIZE: int = 500
+    # rows fetched per round trip from the server-side cursor of the exports
+    EXPORT_BATCH_SIZE: int = 1000
+    # caches list responses per user. "memory" is only consistent with a single worker and instance,
+    # deployments with more use "redis", which invalidates everywhere at once
+    RESPONSE_CACHE_BACKEND: Literal["off", "memory", "redis"] = "off"
+    RESPONSE_CACHE_TTL_SECONDS: float = 5
+    RESPONSE_CACHE_MAX_SIZE: int = 10_000
+    RESPONSE_CACHE_REDIS_URL: str = "redis://localhost:6379/0"
+    # statements per request, "raise" fails requests over budget, meant for tests
+    QUERY_BUDGET_MODE: Literal["off", "warn", "raise"] = "warn"
+    QUERY_BUDGET_MAX_STATEMENTS: int = 10
+    # per operation id, e.g. {"disbursements-create_bulk": 20}
+    QUERY_BUDGET_OVERRIDES: dict[str, int] = {}
+    # executions of the same SQL within a request, more are reported as N+1 queries
+    QUERY_BUDGET_MAX_REPEATS: int = 3
+    # statements slower than this are logged with their plan, 0 disables the slow query log
+    SLOW_QUERY_THRESHOLD_MS: float = 0
+    SLOW_QUERY_LOG_PATH: str = "slow_queries.jsonl"
+    SLOW_QUERY_LOG_MAX_BYTES: int = 10_000_000
+    SLOW_QUERY_LOG_BACKUP_COUNT: int = 3
+    # Clerk user ids with access to the admin endpoints
+    ADMIN_CLERK_USER_IDS: Annotated[list[str] | str, BeforeValidator(parse_cors)] = []
+    # bearer token of the scrapers of /utils/metrics/, which is closed while the token is empty
+    METRICS_SCRAPE_TOKEN: str = ""
+    # requests with an X-Profile header equal to PROFILING_TOKEN are profiled, except in production.
+    # Profiling is off while the token is empty.
+    PROFILING_TOKEN: str = ""
+    PROFILING_DIR: str = "profiles"
+    PROFILING_INTERVAL_MS: float = 1
+    # the oldest profiles are deleted beyond this number
+    PROFILING_MAX_FILES: int = 50
+
     @computed_field  # type: ignore[prop-decorator]
     @property
     def SQLALCHEMY_DATABASE_URI(self) -> PostgresDsn:
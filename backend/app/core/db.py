@@ -1,12 +1,227 @@
-from collections.abc import Generator
-from typing import Annotated
+import threading
+import time
+from collections import Counter
+from collections.abc import (
+    AsyncGenerator,
+    AsyncIterator,
+    Iterable,
+    Mapping,
+    Sequence,
+)
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Annotated, Any, TypeVar, overload
 
 from fastapi import Depends
+from pydantic import BaseModel
+from sqlalchemy import AsyncAdaptedQueuePool, Connection, Engine, QueuePool, event
+from sqlalchemy.engine import ExecutionContext, Result, Row, ScalarResult, TupleResult
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.ext.asyncio import AsyncSession as SqlAlchemyAsyncSession
+from sqlalchemy.pool import ConnectionPoolEntry
+from sqlalchemy.sql.base import Executable
 from sqlmodel import Session, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlmodel.sql.expression import Select, SelectOfScalar
 
+from app.core.concurrency import run_in_threadpool
 from app.core.config import settings
+from app.core.metrics import db_statement_duration
 
-engine = create_engine(str(settings.SQLALCHEMY_DATABASE_URI))
+_T = TypeVar("_T")
+
+
+class PoolWaitStats:
+    """Time spent by callers waiting for a connection from the pool."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def record(self, wait_seconds: float, timed_out: bool) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.timeouts += timed_out
+            self.total_wait_seconds += wait_seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, wait_seconds)
+
+
+pool_wait_stats = PoolWaitStats()
+
+
+class InstrumentedQueuePool(QueuePool):
+    def _do_get(self) -> ConnectionPoolEntry:
+        start = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            timed_out = True
+            raise
+        finally:
+            pool_wait_stats.record(time.perf_counter() - start, timed_out)
+
+
+class InstrumentedAsyncAdaptedQueuePool(InstrumentedQueuePool, AsyncAdaptedQueuePool):
+    pass
+
+
+def _connect_args() -> dict[str, Any]:
+    if not settings.DB_STATEMENT_TIMEOUT_MS:
+        return {}
+    return {"options": f"-c statement_timeout={settings.DB_STATEMENT_TIMEOUT_MS}"}
+
+
+engine = create_engine(
+    str(settings.SQLALCHEMY_DATABASE_URI),
+    poolclass=InstrumentedQueuePool,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+    pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+    pool_pre_ping=settings.DB_POOL_PRE_PING,
+    connect_args=_connect_args(),
+)
+
+# in async mode, requests are served through the async driver of psycopg.
+# The sync engine is still used by scripts, migrations and tests.
+async_engine: AsyncEngine | None = (
+    create_async_engine(
+        str(settings.SQLALCHEMY_DATABASE_URI),
+        poolclass=InstrumentedAsyncAdaptedQueuePool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+        pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        connect_args=_connect_args(),
+    )
+    if settings.DB_MODE == "async"
+    else None
+)
+
+
+def serving_engine() -> Engine:
+    """The (sync) engine that serves requests, i.e. the one underlying the async engine in async mode."""
+    return async_engine.sync_engine if async_engine is not None else engine
+
+
+class QueryBudgetExceeded(RuntimeError):
+    pass
+
+
+@dataclass(frozen=True)
+class QueryBudget:
+    max_statements: int
+    # the same SQL executed over and over is usually lazy loading in a loop, i.e. N+1 queries
+    max_repeats: int
+
+
+@dataclass
+class RequestDbStats:
+    statements: int = 0
+    seconds: float = 0.0
+    repeats: Counter[str] = field(default_factory=Counter)
+    # fails the request at the first statement over the budget
+    enforced_budget: QueryBudget | None = None
+
+    def budget_violations(self, budget: QueryBudget) -> list[str]:
+        violations = []
+        if self.statements > budget.max_statements:
+            violations.append(
+                f"{self.statements} statements exceed the budget of {budget.max_statements}"
+            )
+        violations.extend(
+            f"{count} executions of the same statement, likely N+1: {statement}"
+            for statement, count in self.repeats.items()
+            if count > budget.max_repeats
+        )
+        return violations
+
+
+# mutated in place, so that statements executed in the threadpool count for the request, too
+request_db_stats: ContextVar[RequestDbStats | None] = ContextVar(
+    "request_db_stats", default=None
+)
+
+
+def _before_cursor_execute(
+    _conn: Connection,
+    _cursor: Any,
+    statement: str,
+    _parameters: Any,
+    context: ExecutionContext | None,
+    _executemany: bool,
+) -> None:
+    stats = request_db_stats.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.repeats[statement] += 1
+        if stats.enforced_budget is not None:
+            violations = stats.budget_violations(stats.enforced_budget)
+            if violations:
+                raise QueryBudgetExceeded("; ".join(violations))
+    if context is not None:
+        context.query_start = time.perf_counter()  # type: ignore[attr-defined]
+
+
+def _after_cursor_execute(
+    _conn: Connection,
+    _cursor: Any,
+    _statement: str,
+    _parameters: Any,
+    context: ExecutionContext | None,
+    _executemany: bool,
+) -> None:
+    start = getattr(context, "query_start", None)
+    if start is None:
+        return
+    seconds = time.perf_counter() - start
+    db_statement_duration.observe(seconds)
+    stats = request_db_stats.get()
+    if stats is not None:
+        stats.seconds += seconds
+
+
+for _engine in [engine, serving_engine()]:
+    if not event.contains(_engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(_engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class PoolStatus(BaseModel):
+    size: int
+    max_overflow: int
+    checked_out: int
+    idle: int
+    overflow: int
+    checkouts: int
+    timeouts: int
+    total_wait_seconds: float
+    max_wait_seconds: float
+
+
+def get_pool_status() -> PoolStatus:
+    pool = serving_engine().pool
+    if not isinstance(pool, QueuePool):
+        raise TypeError(f"Unsupported pool class {type(pool).__name__}")
+    return PoolStatus(
+        size=pool.size(),
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        checked_out=pool.checkedout(),
+        idle=pool.checkedin(),
+        # QueuePool reports unused capacity as negative overflow
+        overflow=max(pool.overflow(), 0),
+        checkouts=pool_wait_stats.checkouts,
+        timeouts=pool_wait_stats.timeouts,
+        total_wait_seconds=pool_wait_stats.total_wait_seconds,
+        max_wait_seconds=pool_wait_stats.max_wait_seconds,
+    )
 
 
 # make sure all SQLModel models are imported (app.models) before initializing DB
@@ -27,11 +242,149 @@ def init_db(_session: Session) -> None:
     pass
 
 
-def get_db() -> Generator[Session, None, None]:
-    with Session(engine) as session:
+class ThreadedStreamResult:
+    """The part of `AsyncResult` that is used to stream rows from a server-side cursor, fetching in the threadpool."""
+
+    def __init__(self, result: Result[Any]) -> None:
+        self.result = result
+
+    async def partitions(
+        self, size: int | None = None
+    ) -> AsyncIterator[Sequence[Row[Any]]]:
+        while rows := await run_in_threadpool(self.result.fetchmany, size):
+            yield rows
+
+
+class ThreadedSession:
+    """
+    Offers the interface of `AsyncSession` on top of a sync `Session`, so that repositories can be written once for both DB modes.
+    Every call that talks to the database runs in the AnyIO threadpool.
+    """
+
+    # results are fully fetched inside the worker thread
+    _execution_options = {"prebuffer_rows": True}
+
+    def __init__(self, session: Session) -> None:
+        self.sync_session = session
+
+    def add(self, instance: Any) -> None:
+        self.sync_session.add(instance)
+
+    def add_all(self, instances: Iterable[Any]) -> None:
+        self.sync_session.add_all(instances)
+
+    @overload
+    async def exec(self, statement: Select[_T]) -> TupleResult[_T]: ...
+
+    @overload
+    async def exec(self, statement: SelectOfScalar[_T]) -> ScalarResult[_T]: ...
+
+    async def exec(
+        self, statement: Select[_T] | SelectOfScalar[_T]
+    ) -> TupleResult[_T] | ScalarResult[_T]:
+        return await run_in_threadpool(
+            self.sync_session.exec,  # type: ignore[arg-type]
+            statement,
+            execution_options=self._execution_options,
+        )
+
+    async def execute(
+        self,
+        statement: Executable,
+        params: Mapping[str, Any] | Sequence[Mapping[str, Any]] | None = None,
+    ) -> Result[Any]:
+        return await run_in_threadpool(
+            self.sync_session.execute,
+            statement,
+            params,
+            execution_options=self._execution_options,
+        )
+
+    async def scalars(
+        self,
+        statement: Executable,
+        params: Mapping[str, Any] | Sequence[Mapping[str, Any]] | None = None,
+    ) -> ScalarResult[Any]:
+        return await run_in_threadpool(
+            self.sync_session.scalars,
+            statement,
+            params,
+            execution_options=self._execution_options,
+        )
+
+    async def stream(
+        self,
+        statement: Executable,
+        params: Mapping[str, Any] | Sequence[Mapping[str, Any]] | None = None,
+    ) -> ThreadedStreamResult:
+        result = await run_in_threadpool(
+            self.sync_session.execute,
+            statement,
+            params,
+            execution_options={"stream_results": True},
+        )
+        return ThreadedStreamResult(result)
+
+    async def commit(self) -> None:
+        await run_in_threadpool(self.sync_session.commit)
+
+    async def rollback(self) -> None:
+        await run_in_threadpool(self.sync_session.rollback)
+
+    async def flush(self) -> None:
+        await run_in_threadpool(self.sync_session.flush)
+
+    async def refresh(self, instance: Any) -> None:
+        await run_in_threadpool(self.sync_session.refresh, instance)
+
+    async def close(self) -> None:
+        await run_in_threadpool(self.sync_session.close)
+
+
+class SqlAsyncSession(AsyncSession):
+    """
+    sqlmodel's `AsyncSession` with the `execute` of SQLAlchemy's, which sqlmodel deprecates with a warning per call.
+    The repositories use `execute` for multi-column selects and inserts, which `exec` does not cover.
+    """
+
+    async def execute(  # type: ignore[override]
+        self,
+        statement: Executable,
+        params: Mapping[str, Any] | Sequence[Mapping[str, Any]] | None = None,
+        **kwargs: Any,
+    ) -> Result[Any]:
+        # SQLAlchemy's own methods, like `scalars`, pass execution options through `execute`
+        return await SqlAlchemyAsyncSession.execute(self, statement, params, **kwargs)
+
+
+DbSession = SqlAsyncSession | ThreadedSession
+
+
+@asynccontextmanager
+async def open_session() -> AsyncIterator[DbSession]:
+    # attributes stay loaded after commit, lazy reloading is not possible with AsyncSession
+    if async_engine is not None:
+        async with SqlAsyncSession(async_engine, expire_on_commit=False) as session:
+            yield session
+        return
+    threaded_session = ThreadedSession(Session(engine, expire_on_commit=False))
+    try:
+        yield threaded_session
+    finally:
+        await threaded_session.close()
+
+
+async def get_db() -> AsyncGenerator[DbSession, None]:
+    async with open_session() as session:
         yield session
 
 
-SessionDep = Annotated[Session, Depends(get_db)]
+async def dispose_engines() -> None:
+    if async_engine is not None:
+        await async_engine.dispose()
+    await run_in_threadpool(engine.dispose)
+
+
+SessionDep = Annotated[DbSession, Depends(get_db)]
 
-__all__ = ["engine"]
+__all__ = ["engine", "async_engine"]
@@ -0,0 +1,226 @@
+"""
+Minimal metrics in the Prometheus text exposition format, without depending on prometheus_client.
+Metrics are per process. With multiple workers, each one has to be scraped on its own.
+"""
+
+import bisect
+import math
+import threading
+from collections.abc import Callable, Iterator, Sequence
+
+LabelValues = tuple[str, ...]
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+COUNT_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55)
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values, strict=True))
+    return "{" + pairs + "}"
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(
+        self, name: str, documentation: str, label_names: Sequence[str] = ()
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+
+    def samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        header = (
+            f"# HELP {self.name} {self.documentation}\n# TYPE {self.name} {self.type}\n"
+        )
+        return header + "".join(f"{sample}\n" for sample in self.samples())
+
+    def _check(self, label_values: LabelValues) -> None:
+        if len(label_values) != len(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}")
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(
+        self, name: str, documentation: str, label_names: Sequence[str] = ()
+    ) -> None:
+        super().__init__(name, documentation, label_names)
+        self._values: dict[LabelValues, float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        self._check(label_values)
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def set(self, value: float, *label_values: str) -> None:
+        """For counters, mirrors a total that is counted elsewhere."""
+        self._check(label_values)
+        with self._lock:
+            self._values[label_values] = value
+
+    def value(self, *label_values: str) -> float:
+        return self._values.get(label_values, 0)
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_values, value in values:
+            labels = _format_labels(self.label_names, label_values)
+            yield f"{self.name}{labels} {_format_value(value)}"
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, *label_values: str, amount: float = 1) -> None:
+        self.inc(*label_values, amount=-amount)
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets))
+        # per label values: the count of each bucket, without accumulating, the +Inf bucket last, and the sum
+        self._values: dict[LabelValues, tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        self._check(label_values)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.setdefault(
+                label_values, ([0] * (len(self.buckets) + 1), [0.0])
+            )
+            counts[index] += 1
+            total[0] += value
+
+    def count(self, *label_values: str) -> int:
+        entry = self._values.get(label_values)
+        return 0 if entry is None else sum(entry[0])
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = sorted(
+                (labels, (list(counts), total[0]))
+                for labels, (counts, total) in self._values.items()
+            )
+        bucket_label_names = (*self.label_names, "le")
+        for label_values, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), counts, strict=True):
+                cumulative += count
+                labels = _format_labels(
+                    bucket_label_names, (*label_values, _format_value(bound))
+                )
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.label_names, label_values)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: dict[str, Metric] = {}
+        self._collectors: list[Callable[[], None]] = []
+
+    def register(self, metric: Metric) -> None:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+
+    def counter(
+        self, name: str, documentation: str, label_names: Sequence[str] = ()
+    ) -> Counter:
+        counter = Counter(name, documentation, label_names)
+        self.register(counter)
+        return counter
+
+    def gauge(
+        self, name: str, documentation: str, label_names: Sequence[str] = ()
+    ) -> Gauge:
+        gauge = Gauge(name, documentation, label_names)
+        self.register(gauge)
+        return gauge
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        histogram = Histogram(name, documentation, label_names, buckets)
+        self.register(histogram)
+        return histogram
+
+    def on_collect(self, collector: Callable[[], None]) -> None:
+        """Registers a callback that updates gauges of values that are only read on a scrape."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        for collect in self._collectors:
+            collect()
+        return "".join(metric.render() for metric in self._metrics.values())
+
+
+registry = Registry()
+
+http_requests = registry.counter(
+    "http_requests_total", "Finished requests.", ["operation", "status"]
+)
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds",
+    "Time until the response was sent.",
+    ["operation"],
+)
+http_requests_in_flight = registry.gauge(
+    "http_requests_in_flight", "Requests being processed.", ["operation"]
+)
+http_request_db_statements = registry.histogram(
+    "http_request_db_statements",
+    "Database statements per request.",
+    ["operation"],
+    buckets=COUNT_BUCKETS,
+)
+http_request_db_duration = registry.histogram(
+    "http_request_db_duration_seconds",
+    "Time per request spent executing database statements.",
+    ["operation"],
+)
+db_statement_duration = registry.histogram(
+    "db_statement_duration_seconds",
+    "Execution time of single database statements.",
+    buckets=DB_BUCKETS,
+)
+jwt_verification_duration = registry.histogram(
+    "jwt_verification_duration_seconds",
+    "Time to verify an access token, cached if its signature was verified before.",
+    ["cached"],
+    buckets=DB_BUCKETS,
+)
@@ -0,0 +1,85 @@
+import base64
+import binascii
+import uuid
+from collections.abc import Sequence
+from datetime import datetime
+from typing import Any, NamedTuple, Protocol, TypeVar
+
+from sqlalchemy import Select, literal, tuple_
+from sqlmodel import col
+
+
+class Cursor(NamedTuple):
+    """Position after the last row of a page, in the `(created_at, id)` order of listings."""
+
+    created_at: datetime
+    id: uuid.UUID
+
+
+class CollectionVersion(NamedTuple):
+    """Changes whenever rows are added to or removed from a collection, or one of them is updated."""
+
+    total: int
+    last_updated_at: datetime | None
+
+
+class _Keyed(Protocol):
+    @property
+    def created_at(self) -> datetime | None: ...
+
+    @property
+    def id(self) -> uuid.UUID: ...
+
+
+T = TypeVar("T", bound=_Keyed)
+S = TypeVar("S", bound=Select[Any])
+
+
+def encode_cursor(cursor: Cursor) -> str:
+    raw = f"{cursor.created_at.isoformat()}|{cursor.id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(encoded: str) -> Cursor:
+    """Raises ValueError for cursors that have not been created by `encode_cursor`."""
+    try:
+        raw = base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4)).decode()
+        created_at, id = raw.split("|")
+        return Cursor(datetime.fromisoformat(created_at), uuid.UUID(id))
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor {encoded}") from e
+
+
+def split_page(rows: Sequence[T], limit: int) -> tuple[Sequence[T], str | None]:
+    """
+    Expects up to `limit + 1` rows, the extra row only tells that there is a next page.
+    Returns the page and the cursor to the next page, if any.
+    """
+    if len(rows) <= limit:
+        return rows, None
+    page = rows[:limit]
+    last = page[-1]
+    if last.created_at is None:
+        raise ValueError("Cannot paginate rows without created_at")
+    return page, encode_cursor(Cursor(last.created_at, last.id))
+
+
+def keyset_page(
+    statement: S,
+    created_at: Any,
+    id: Any,
+    limit: int,
+    offset: int = 0,
+    after: Cursor | None = None,
+) -> S:
+    """
+    Orders `statement` by the `created_at` and `id` columns, newest first, and restricts it to the rows after the cursor.
+    Fetches one extra row to be passed to `split_page`.
+    """
+    statement = statement.order_by(col(created_at).desc(), col(id).desc())
+    if after is not None:
+        statement = statement.where(
+            tuple_(col(created_at), col(id))
+            < tuple_(literal(after.created_at), literal(after.id))
+        )
+    return statement.offset(offset).limit(limit + 1)
@@ -0,0 +1,164 @@
+"""
+Sampling profiler for single requests, meant for local and staging environments only.
+
+Samples the event loop thread and the threadpool threads that run work of the profiled request,
+and writes the stacks in the folded format of flamegraph.pl, which speedscope and most flamegraph tools read.
+Concurrent requests on the event loop show up in the profile as well, so profile one request at a time.
+Threadpool threads are followed through the `ThreadpoolTracer` hook of app.core.concurrency.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from collections.abc import Callable
+from pathlib import Path
+from types import CodeType, FrameType
+from typing import Any, ParamSpec, TypeVar
+
+from app.core.repos.tracing import current_repository_method
+
+P = ParamSpec("P")
+R = TypeVar("R")
+
+_APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# checked from the root of the stack, the outermost match categorizes a sample
+CATEGORIES = {
+    "auth": ("app/core/auth/",),
+    "repository": ("app/core/repos/", "app/core/db.py", "sqlalchemy/", "psycopg/"),
+    "serialization": (
+        "app/api/serialization.py",
+        "pydantic/",
+        "pydantic_core/",
+        "fastapi/encoders.py",
+    ),
+}
+
+
+def _frame_path(frame: FrameType) -> str:
+    filename = frame.f_code.co_filename
+    if filename.startswith(_APP_DIR):
+        return "app" + filename[len(_APP_DIR) :]
+    _, _, package_path = filename.rpartition("site-packages/")
+    return package_path
+
+
+if sys.version_info >= (3, 11):
+
+    def _code_name(code: CodeType) -> str:
+        return code.co_qualname
+
+else:
+
+    def _code_name(code: CodeType) -> str:
+        # no qualified names before 3.11, the path in the stack locates the function
+        return code.co_name
+
+
+def _category(paths: list[str]) -> str:
+    for path in paths:
+        for category, prefixes in CATEGORIES.items():
+            if path.startswith(prefixes):
+                return category
+    return "other"
+
+
+class RequestProfile:
+    def __init__(self, loop_thread_id: int, interval_seconds: float) -> None:
+        self.interval_seconds = interval_seconds
+        # sampled threads with the frame that roots their stacks
+        self._threads: dict[int, str] = {loop_thread_id: ""}
+        self._threads_lock = threading.Lock()
+        # microseconds per folded stack and per category
+        self.stacks: Counter[str] = Counter()
+        self.categories: Counter[str] = Counter()
+        self._stopped = threading.Event()
+        self._sampler = threading.Thread(
+            target=self._sample, name="request-profiler", daemon=True
+        )
+        self.started_at = time.perf_counter()
+        self.stopped_at = self.started_at
+
+    def start(self) -> None:
+        self.started_at = time.perf_counter()
+        self._sampler.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._sampler.join()
+        self.stopped_at = time.perf_counter()
+
+    def traced(self, func: Callable[P, R]) -> Callable[P, R]:
+        """Samples the thread that runs `func` while it runs, rooted at the repository method that called it."""
+
+        def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+            thread_id = threading.get_ident()
+            root = current_repository_method.get() or "threadpool"
+            with self._threads_lock:
+                self._threads[thread_id] = f"{root} (threadpool)"
+            try:
+                return func(*args, **kwargs)
+            finally:
+                with self._threads_lock:
+                    del self._threads[thread_id]
+
+        return wrapper
+
+    def _sample(self) -> None:
+        last = time.perf_counter()
+        while not self._stopped.wait(self.interval_seconds):
+            now = time.perf_counter()
+            # weighted by the actual time, the GIL delays the sampler
+            weight = round((now - last) * 1_000_000)
+            last = now
+            frames = sys._current_frames()
+            with self._threads_lock:
+                threads = list(self._threads.items())
+            for thread_id, root in threads:
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    self._record(frame, root, weight)
+
+    def _record(self, leaf: FrameType, root: str, weight: int) -> None:
+        frames: list[FrameType] = []
+        frame: FrameType | None = leaf
+        while frame is not None:
+            frames.append(frame)
+            frame = frame.f_back
+        frames.reverse()
+        paths = [_frame_path(f) for f in frames]
+        if not root and not any(path.startswith("app/") for path in paths):
+            # the event loop is idle or serves something else
+            return
+        names = [
+            f"{_code_name(f.f_code)} ({path})"
+            for f, path in zip(frames, paths, strict=True)
+        ]
+        if root:
+            names.insert(0, root)
+        self.stacks[";".join(names)] += weight
+        self.categories[_category(paths)] += weight
+
+    def write(self, directory: str, name: str, details: dict[str, Any]) -> Path:
+        """Writes `<name>.folded` with the stacks and `<name>.json` with the breakdown. Returns the folded file."""
+        path = Path(directory)
+        path.mkdir(parents=True, exist_ok=True)
+        folded = path / f"{name}.folded"
+        folded.write_text(
+            "".join(f"{stack} {weight}\n" for stack, weight in self.stacks.items()),
+            encoding="utf-8",
+        )
+        breakdown = {
+            **details,
+            "wall_ms": round((self.stopped_at - self.started_at) * 1000, 3),
+            "interval_ms": self.interval_seconds * 1000,
+            "sampled_ms": {
+                category: round(microseconds / 1000, 3)
+                for category, microseconds in self.categories.most_common()
+            },
+        }
+        (path / f"{name}.json").write_text(json.dumps(breakdown, indent=2))
+        return folded
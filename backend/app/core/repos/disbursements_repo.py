@@ -1,111 +1,415 @@
-from collections.abc import Sequence
-from datetime import datetime, timezone
-from typing import Annotated
+import uuid
+from collections.abc import AsyncGenerator, Iterable, Sequence
+from datetime import datetime
+from typing import Annotated, Any, NamedTuple
 
 from fastapi import Depends
 from pydantic import UUID4
-from sqlalchemy import func
-from sqlmodel import col, or_, select
+from sqlalchemy import ColumnElement, Select, case, func, update
+from sqlalchemy import select as sa_select
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import and_, col, or_, select
 
+from app.core.config import settings
 from app.core.db import SessionDep
-from app.models import Disbursement
+from app.core.pagination import CollectionVersion, Cursor, keyset_page, split_page
+from app.core.repos.pair_balances_repo import PairBalancesRepository, balance_deltas
+from app.core.repos.tracing import traced
+from app.core.response_cache import response_cache
+from app.models import Disbursement, Settlement
 
 
+def between_parties(first_user_id: UUID4, second_user_id: UUID4) -> ColumnElement[bool]:
+    """Disbursements paid by either of the two users on behalf of the other one."""
+    return or_(
+        and_(
+            Disbursement.paying_party_id == first_user_id,
+            Disbursement.on_behalf_of_party_id == second_user_id,
+        ),
+        and_(
+            Disbursement.paying_party_id == second_user_id,
+            Disbursement.on_behalf_of_party_id == first_user_id,
+        ),
+    )
+
+
+def signed_amount(user_id: UUID4) -> ColumnElement[float]:
+    """
+    The amount of a disbursement from the perspective of `user_id`: positive if they paid it, negative if it was paid on their behalf.
+    Summed up for the sending party, this is the `to_total_amount_due` of a settlement.
+    """
+    return case(
+        (col(Disbursement.paying_party_id) == user_id, Disbursement.amount),
+        else_=-col(Disbursement.amount),
+    )
+
+
+def unsettled_between(
+    sending_party_id: UUID4,
+    receiving_party_id: UUID4,
+    settled_disbursement_ids: Sequence[str | UUID4] | None = None,
+) -> ColumnElement[bool]:
+    """Live disbursements between both parties that are not settled yet, restricted to the listed ones if given."""
+    clauses = [
+        col(Disbursement.deleted_at).is_(None),
+        col(Disbursement.settlement_id).is_(None),
+        between_parties(sending_party_id, receiving_party_id),
+    ]
+    if settled_disbursement_ids is not None:
+        clauses.append(col(Disbursement.id).in_(settled_disbursement_ids))
+    return and_(*clauses)
+
+
+def involved_user_ids(disbursements: Iterable[Disbursement]) -> set[uuid.UUID]:
+    """The users whose views of the disbursements change when they are written."""
+    return {
+        user_id
+        for d in disbursements
+        for user_id in (d.owner_id, d.paying_party_id, d.on_behalf_of_party_id)
+    }
+
+
+class AmountDue(NamedTuple):
+    currency: str
+    disbursement_count: int
+    # sum of the signed amounts from the perspective of the sending party, i.e. minus the amount to pay
+    amount_due: float
+
+
+class DisbursementRow(NamedTuple):
+    """The columns of a disbursement that the API returns. Read without tracking in the session."""
+
+    id: uuid.UUID
+    owner_id: uuid.UUID
+    paying_party_id: uuid.UUID
+    on_behalf_of_party_id: uuid.UUID
+    comment: str | None
+    created_at: datetime
+    updated_at: datetime
+    amount: float
+    currency: str
+
+
+# in the order of the DisbursementRow fields
+DISBURSEMENT_ROW_COLUMNS = (
+    col(Disbursement.id),
+    col(Disbursement.owner_id),
+    col(Disbursement.paying_party_id),
+    col(Disbursement.on_behalf_of_party_id),
+    col(Disbursement.comment),
+    col(Disbursement.created_at),
+    col(Disbursement.updated_at),
+    col(Disbursement.amount),
+    col(Disbursement.currency),
+)
+
+
+@traced
 class DisbursementsRepository:
     def __init__(self, session: SessionDep) -> None:
         self.session = session
+        self.pair_balances = PairBalancesRepository(session)
 
-    def create_and_refresh(self, disbursement: Disbursement) -> None:
+    async def create_and_refresh(self, disbursement: Disbursement) -> None:
         """
         Creates a new disbursement record in the database.
         WARNING: Refreshes the `disbursement` object in place with the new ID and other fields from the database.
         """
         self.session.add(disbursement)
-        self.session.commit()
-        self.session.refresh(disbursement)
+        await self.pair_balances.apply(balance_deltas([disbursement]))
+        involved = involved_user_ids([disbursement])
+        await self.session.commit()
+        await response_cache.invalidate(involved)
+        await self.session.refresh(disbursement)
 
-    def find_one_owned(self, id: UUID4, owner_id: UUID4) -> Disbursement | None:
+    async def create_many(
+        self, disbursements: Sequence[Disbursement]
+    ) -> Sequence[Disbursement]:
+        """
+        Creates all disbursements with a single multi-row `INSERT ... RETURNING` in one transaction.
+        Returns new instances with the fields from the database, in the order of `disbursements`.
+        """
+        if not disbursements:
+            return []
+        insert_all = (
+            insert(Disbursement)
+            .values(
+                [
+                    {
+                        "id": d.id,
+                        "owner_id": d.owner_id,
+                        "paying_party_id": d.paying_party_id,
+                        "on_behalf_of_party_id": d.on_behalf_of_party_id,
+                        "amount": d.amount,
+                        "currency": d.currency,
+                        "comment": d.comment,
+                    }
+                    for d in disbursements
+                ]
+            )
+            .returning(Disbursement)
+        )
+        created = (await self.session.scalars(insert_all)).all()
+        await self.pair_balances.apply(balance_deltas(created))
+        involved = involved_user_ids(created)
+        await self.session.commit()
+        await response_cache.invalidate(involved)
+        # RETURNING does not guarantee the order of the VALUES
+        position = {d.id: i for i, d in enumerate(disbursements)}
+        return sorted(created, key=lambda d: position[d.id])
+
+    async def find_one_owned(self, id: UUID4, owner_id: UUID4) -> Disbursement | None:
         statement = (
             select(Disbursement)
             .where(Disbursement.id == id)
             .where(Disbursement.owner_id == owner_id)
             .where(col(Disbursement.deleted_at).is_(None))
         )
-        return self.session.exec(statement).one_or_none()
+        return (await self.session.exec(statement)).one_or_none()
 
-    def find_all_owned(
-        self, owner_id: UUID4, limit: int, offset: int
-    ) -> Sequence[Disbursement]:
-        get_all = (
-            select(Disbursement)
-            .where(Disbursement.owner_id == owner_id)
-            .offset(offset)
-            .limit(limit)
+    async def find_all_owned(
+        self,
+        owner_id: UUID4,
+        limit: int,
+        offset: int = 0,
+        after: Cursor | None = None,
+    ) -> tuple[Sequence[DisbursementRow], str | None]:
+        """Returns a page of disbursements, newest first, and the cursor to the next page."""
+        get_all = keyset_page(
+            sa_select(*DISBURSEMENT_ROW_COLUMNS)
+            .where(col(Disbursement.owner_id) == owner_id)
+            .where(col(Disbursement.deleted_at).is_(None)),
+            Disbursement.created_at,
+            Disbursement.id,
+            limit,
+            offset,
+            after,
         )
-        return self.session.exec(get_all).all()
+        return split_page(await self._rows(get_all), limit)
 
-    def find_all_between(
+    async def find_all_between(
         self,
         first_user_id: UUID4,
         second_user_id: UUID4,
         limit: int,
         offset: int,
         exclude_settled: bool,
-    ) -> Sequence[Disbursement]:
+        after: Cursor | None = None,
+    ) -> tuple[Sequence[DisbursementRow], str | None]:
+        """Returns a page of disbursements, newest first, and the cursor to the next page."""
         get_all_between = (
-            select(Disbursement)
+            sa_select(*DISBURSEMENT_ROW_COLUMNS)
             .where(col(Disbursement.deleted_at).is_(None))
-            .where(
-                or_(
-                    Disbursement.paying_party_id == first_user_id
-                    and Disbursement.on_behalf_of_party_id == second_user_id,
-                    Disbursement.on_behalf_of_party_id == first_user_id
-                    and Disbursement.paying_party_id == second_user_id,
-                )
-            )
-            .offset(offset)
-            .limit(limit)
+            .where(between_parties(first_user_id, second_user_id))
         )
         if exclude_settled:
             get_all_between = get_all_between.where(
                 col(Disbursement.settlement_id).is_(None)
             )
-        return self.session.exec(get_all_between).all()
+        get_all_between = keyset_page(
+            get_all_between,
+            Disbursement.created_at,
+            Disbursement.id,
+            limit,
+            offset,
+            after,
+        )
+        return split_page(await self._rows(get_all_between), limit)
+
+    async def find_all_by_settlement(
+        self, settlement_ids: Sequence[UUID4]
+    ) -> dict[uuid.UUID, list[DisbursementRow]]:
+        """The live disbursements of each of the settlements, with a single query."""
+        if not settlement_ids:
+            return {}
+        statement = (
+            sa_select(col(Disbursement.settlement_id), *DISBURSEMENT_ROW_COLUMNS)
+            .where(col(Disbursement.settlement_id).in_(settlement_ids))
+            .where(col(Disbursement.deleted_at).is_(None))
+            .order_by(col(Disbursement.created_at).desc(), col(Disbursement.id).desc())
+        )
+        by_settlement: dict[uuid.UUID, list[DisbursementRow]] = {}
+        for settlement_id, *fields in (await self.session.execute(statement)).all():
+            by_settlement.setdefault(settlement_id, []).append(
+                DisbursementRow._make(fields)
+            )
+        return by_settlement
 
-    def count_owned(self, owner_id: UUID4) -> int:
+    async def stream_owned(
+        self, owner_id: UUID4
+    ) -> AsyncGenerator[Sequence[DisbursementRow], None]:
+        """
+        All live disbursements of the owner, newest first, in batches of EXPORT_BATCH_SIZE.
+        Fetched from a server-side cursor, so only one batch is held in memory at a time.
+        """
+        statement = (
+            sa_select(*DISBURSEMENT_ROW_COLUMNS)
+            .where(col(Disbursement.owner_id) == owner_id)
+            .where(col(Disbursement.deleted_at).is_(None))
+            .order_by(col(Disbursement.created_at).desc(), col(Disbursement.id).desc())
+            .execution_options(yield_per=settings.EXPORT_BATCH_SIZE)
+        )
+        result = await self.session.stream(statement)
+        async for rows in result.partitions(settings.EXPORT_BATCH_SIZE):
+            yield list(map(DisbursementRow._make, rows))
+
+    async def _rows(self, statement: Select[Any]) -> list[DisbursementRow]:
+        return list(
+            map(DisbursementRow._make, (await self.session.execute(statement)).all())
+        )
+
+    async def find_updated_at_owned(
+        self, id: UUID4, owner_id: UUID4
+    ) -> datetime | None:
+        statement = (
+            select(Disbursement.updated_at)
+            .where(Disbursement.id == id)
+            .where(Disbursement.owner_id == owner_id)
+            .where(col(Disbursement.deleted_at).is_(None))
+        )
+        return (await self.session.exec(statement)).one_or_none()
+
+    async def version_owned(self, owner_id: UUID4) -> CollectionVersion:
+        """Version of the collection of `find_all_owned`. Its total is the one of `count_owned`."""
+        return await self._version(
+            col(Disbursement.owner_id) == owner_id,
+            col(Disbursement.deleted_at).is_(None),
+        )
+
+    async def version_between(
+        self, first_user_id: UUID4, second_user_id: UUID4, exclude_settled: bool
+    ) -> CollectionVersion:
+        """Version of the collection of `find_all_between`."""
+        clauses: list[ColumnElement[bool]] = [
+            col(Disbursement.deleted_at).is_(None),
+            between_parties(first_user_id, second_user_id),
+        ]
+        if exclude_settled:
+            clauses.append(col(Disbursement.settlement_id).is_(None))
+        return await self._version(*clauses)
+
+    async def version_settled_by(
+        self, settlement_owner_id: UUID4, settlement_id: UUID4 | None = None
+    ) -> CollectionVersion:
+        """Version of the live disbursements of the owner's live settlements, or of one of them."""
+        clauses: list[ColumnElement[bool]] = [
+            col(Disbursement.deleted_at).is_(None),
+            col(Disbursement.settlement_id).in_(
+                select(Settlement.id)
+                .where(Settlement.owner_id == settlement_owner_id)
+                .where(col(Settlement.deleted_at).is_(None))
+            ),
+        ]
+        if settlement_id is not None:
+            clauses.append(col(Disbursement.settlement_id) == settlement_id)
+        return await self._version(*clauses)
+
+    async def _version(self, *clauses: ColumnElement[bool]) -> CollectionVersion:
+        statement = select(func.count(), func.max(Disbursement.updated_at)).where(
+            *clauses
+        )
+        total, last_updated_at = (await self.session.exec(statement)).one()
+        return CollectionVersion(total, last_updated_at)
+
+    async def count_owned(self, owner_id: UUID4) -> int:
         statement = (
             select(func.count())
             .select_from(Disbursement)
             .where(Disbursement.owner_id == owner_id)
+            .where(col(Disbursement.deleted_at).is_(None))
         )
-        return self.session.exec(statement).one()
+        return (await self.session.exec(statement)).one()
 
-    def soft_delete(self, disbursement: Disbursement) -> None:
-        disbursement.sqlmodel_update({"deleted_at": datetime.now(timezone.utc)})
-        self.session.add(disbursement)
-        self.session.commit()
+    async def soft_delete(self, id: UUID4, owner_id: UUID4) -> bool:
+        """
+        Soft-deletes the live disbursement with a single conditional `UPDATE ... RETURNING`.
+        The row lock serializes it with concurrent deletes and settlements, and the returned row is the committed one,
+        so the ledger only changes if the disbursement was unsettled at the time of the delete, and only once.
+        Returns False if the owner has no such live disbursement.
+        """
+        delete_live = (
+            update(Disbursement)
+            .where(col(Disbursement.id) == id)
+            .where(col(Disbursement.owner_id) == owner_id)
+            .where(col(Disbursement.deleted_at).is_(None))
+            .values(deleted_at=func.now())
+            .returning(Disbursement)
+        )
+        deleted = (await self.session.scalars(delete_live)).one_or_none()
+        if deleted is None:
+            await self.session.rollback()
+            return False
+        if deleted.settlement_id is None:
+            await self.pair_balances.apply(balance_deltas([deleted], sign=-1))
+        involved = involved_user_ids([deleted])
+        await self.session.commit()
+        await response_cache.invalidate(involved)
+        return True
 
-    def find_affected_for_settlement(
+    async def sum_amount_due(
+        self,
+        sending_party_id: UUID4,
+        receiving_party_id: UUID4,
+        settled_disbursement_ids: Sequence[str | UUID4] | None = None,
+        lock: bool = False,
+    ) -> list[AmountDue]:
+        """
+        Amount due per currency over the unsettled disbursements between both parties, or the listed ones among them.
+        With `lock`, the disbursements are locked until the end of the transaction
+        and rows locked by a concurrent settlement are skipped instead of waited for.
+        """
+        affected = select(
+            Disbursement.currency, signed_amount(sending_party_id).label("amount")
+        ).where(
+            unsettled_between(
+                sending_party_id, receiving_party_id, settled_disbursement_ids
+            )
+        )
+        if lock:
+            affected = affected.with_for_update(skip_locked=True)
+        subquery = affected.subquery()
+        statement = (
+            select(subquery.c.currency, func.count(), func.sum(subquery.c.amount))
+            .group_by(subquery.c.currency)
+            .order_by(subquery.c.currency)
+        )
+        rows = (await self.session.exec(statement)).all()
+        return [AmountDue(*row) for row in rows]
+
+    async def count_affected_for_settlement(
         self,
         settled_disbursement_ids: list[str],
         receiving_party_id: UUID4,
         sending_party_id: UUID4,
-    ) -> Sequence[Disbursement]:
-        find_affected_disbursements = (
-            select(Disbursement)
-            .where(col(Disbursement.id).in_(settled_disbursement_ids))
-            .where(col(Disbursement.deleted_at).is_(None))
+    ) -> int:
+        """Counts the listed disbursements that could be settled, including rows locked by a concurrent settlement."""
+        statement = (
+            select(func.count())
+            .select_from(Disbursement)
             .where(
-                or_(
-                    Disbursement.paying_party_id == receiving_party_id
-                    and Disbursement.on_behalf_of_party_id == sending_party_id,
-                    Disbursement.on_behalf_of_party_id == receiving_party_id
-                    and Disbursement.paying_party_id == sending_party_id,
+                unsettled_between(
+                    sending_party_id, receiving_party_id, settled_disbursement_ids
                 )
             )
-            .where(col(Disbursement.settlement_id).is_(None))  # i.e. not settled yet
         )
-        return self.session.exec(find_affected_disbursements).all()
+        return (await self.session.exec(statement)).one()
+
+    async def attach_to_settlement(
+        self, settled_disbursement_ids: list[str], settlement_id: UUID4
+    ) -> int:
+        """
+        Sets the settlement of all listed disbursements that are not settled yet, with a single UPDATE.
+        Returns the number of attached disbursements.
+        """
+        attach = (
+            update(Disbursement)
+            .where(col(Disbursement.id).in_(settled_disbursement_ids))
+            .where(col(Disbursement.deleted_at).is_(None))
+            .where(col(Disbursement.settlement_id).is_(None))
+            .values(settlement_id=settlement_id)
+            .returning(col(Disbursement.id))
+        )
+        return len((await self.session.scalars(attach)).all())
 
 
 DisbursementRepositoryDep = Annotated[DisbursementsRepository, Depends()]
@@ -0,0 +1,279 @@
+import uuid
+from collections import defaultdict
+from collections.abc import Iterable, Sequence
+from typing import Annotated, Any, NamedTuple
+
+from fastapi import Depends
+from pydantic import UUID4
+from sqlalchemy import delete, func, join, literal, text, union_all
+from sqlalchemy import select as sa_select
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import and_, case, col, or_, select
+from sqlmodel.sql.expression import Select
+
+from app.core.db import SessionDep
+from app.core.repos.tracing import traced
+from app.models import Disbursement, PairBalance
+
+# below half a cent, a balance is zero and a ledger entry matches its recomputed value
+TOLERANCE = 0.005
+
+
+class PairDelta(NamedTuple):
+    user_a_id: uuid.UUID
+    user_b_id: uuid.UUID
+    currency: str
+    # positive if user b owes user a more than before
+    amount: float
+
+    @classmethod
+    def between(
+        cls,
+        user_id: uuid.UUID,
+        counterparty_id: uuid.UUID,
+        currency: str,
+        amount: float,
+    ) -> "PairDelta":
+        """`amount` is positive if the counterparty owes the user more than before."""
+        if user_id < counterparty_id:
+            return cls(user_id, counterparty_id, currency, amount)
+        return cls(counterparty_id, user_id, currency, -amount)
+
+
+class CounterpartyBalance(NamedTuple):
+    counterparty_id: uuid.UUID
+    currency: str
+    # positive if the counterparty owes the user
+    amount: float
+
+
+class PairBalanceDrift(NamedTuple):
+    user_a_id: uuid.UUID
+    user_b_id: uuid.UUID
+    currency: str
+    recorded: float
+    expected: float
+
+
+def balance_deltas(
+    disbursements: Iterable[Disbursement], sign: float = 1.0
+) -> list[PairDelta]:
+    """
+    The changes to the ledger when the disbursements become unsettled (`sign=1`) or stop being so (`sign=-1`).
+    Aggregated per pair and currency, and sorted, so that concurrent writers lock the ledger rows in the same order.
+    """
+    totals: defaultdict[tuple[uuid.UUID, uuid.UUID, str], float] = defaultdict(float)
+    for d in disbursements:
+        if d.paying_party_id == d.on_behalf_of_party_id:
+            continue
+        delta = PairDelta.between(
+            d.paying_party_id, d.on_behalf_of_party_id, d.currency, d.amount
+        )
+        totals[(delta.user_a_id, delta.user_b_id, delta.currency)] += (
+            sign * delta.amount
+        )
+    return [PairDelta(*key, amount) for key, amount in sorted(totals.items())]
+
+
+def _expected_balances() -> Select[Any]:
+    """
+    The ledger recomputed from the disbursements, with the amount of the unsettled, not deleted ones.
+    Like `apply` leaves it, every pair and currency that ever had a disbursement keeps a row, zero if nothing is open.
+    """
+    user_a_id = func.least(
+        Disbursement.paying_party_id, Disbursement.on_behalf_of_party_id
+    )
+    user_b_id = func.greatest(
+        Disbursement.paying_party_id, Disbursement.on_behalf_of_party_id
+    )
+    is_open = and_(
+        col(Disbursement.deleted_at).is_(None),
+        col(Disbursement.settlement_id).is_(None),
+    )
+    amount = func.sum(
+        case(
+            (
+                and_(
+                    is_open,
+                    col(Disbursement.paying_party_id)
+                    < col(Disbursement.on_behalf_of_party_id),
+                ),
+                Disbursement.amount,
+            ),
+            (is_open, -col(Disbursement.amount)),
+            else_=literal(0.0),
+        )
+    )
+    return (
+        select(
+            user_a_id.label("user_a_id"),
+            user_b_id.label("user_b_id"),
+            col(Disbursement.currency).label("currency"),
+            amount.label("amount"),
+        )
+        .where(Disbursement.paying_party_id != Disbursement.on_behalf_of_party_id)
+        .group_by(user_a_id, user_b_id, Disbursement.currency)
+    )
+
+
+@traced
+class PairBalancesRepository:
+    def __init__(self, session: SessionDep) -> None:
+        self.session = session
+
+    async def apply(self, deltas: list[PairDelta]) -> None:
+        """
+        Adds the deltas to the ledger with a single upsert. Does not commit,
+        so that the ledger changes together with the disbursements in the caller's transaction.
+        """
+        if not deltas:
+            return
+        upsert = insert(PairBalance).values([d._asdict() for d in deltas])
+        upsert = upsert.on_conflict_do_update(
+            index_elements=[
+                col(PairBalance.user_a_id),
+                col(PairBalance.user_b_id),
+                col(PairBalance.currency),
+            ],
+            set_={
+                "amount": col(PairBalance.amount) + upsert.excluded.amount,
+                "updated_at": func.now(),
+            },
+        )
+        await self.session.execute(upsert)
+
+    async def find_for_user(
+        self, user_id: UUID4, other_user_id: UUID4 | None = None
+    ) -> list[CounterpartyBalance]:
+        """
+        Non-zero balances between the user and each counterparty, per currency.
+        Restricted to a single counterparty if `other_user_id` is given.
+        """
+        is_user_a = col(PairBalance.user_a_id) == user_id
+        counterparty_id = case(
+            (is_user_a, PairBalance.user_b_id), else_=PairBalance.user_a_id
+        ).label("counterparty_id")
+        amount = case(
+            (is_user_a, PairBalance.amount), else_=-col(PairBalance.amount)
+        ).label("amount")
+        statement = (
+            select(counterparty_id, PairBalance.currency, amount)
+            .where(func.abs(PairBalance.amount) >= TOLERANCE)
+            .order_by(counterparty_id, PairBalance.currency)
+        )
+        if other_user_id is None:
+            statement = statement.where(
+                or_(PairBalance.user_a_id == user_id, PairBalance.user_b_id == user_id)
+            )
+        else:
+            statement = statement.where(
+                PairBalance.user_a_id == min(user_id, other_user_id),
+                PairBalance.user_b_id == max(user_id, other_user_id),
+            )
+        rows = (await self.session.exec(statement)).all()
+        return [CounterpartyBalance(*row) for row in rows]
+
+    async def find_counterparty_ids(
+        self, user_id: UUID4, among: Sequence[UUID4]
+    ) -> set[uuid.UUID]:
+        """
+        The users among `among` that have ever shared a disbursement with the user, open, settled or deleted.
+        Relies on the ledger keeping a row per pair once it has one, see `_expected_balances`.
+        """
+        statement = select(PairBalance.user_a_id, PairBalance.user_b_id).where(
+            or_(
+                and_(
+                    PairBalance.user_a_id == user_id,
+                    col(PairBalance.user_b_id).in_(among),
+                ),
+                and_(
+                    PairBalance.user_b_id == user_id,
+                    col(PairBalance.user_a_id).in_(among),
+                ),
+            )
+        )
+        rows = (await self.session.exec(statement)).all()
+        return {b if a == user_id else a for a, b in rows}
+
+    async def sum_net_balances(
+        self, user_ids: Sequence[UUID4], currency: str
+    ) -> dict[uuid.UUID, float]:
+        """
+        Net balance of each user within the group of `user_ids`, positive if the others owe the user.
+        Pairs with users outside of the group are left out. Users without balances are missing.
+        """
+        in_group = and_(
+            col(PairBalance.user_a_id).in_(user_ids),
+            col(PairBalance.user_b_id).in_(user_ids),
+            col(PairBalance.currency) == currency,
+        )
+        per_side = union_all(
+            select(
+                col(PairBalance.user_a_id).label("user_id"),
+                col(PairBalance.amount).label("amount"),
+            ).where(in_group),
+            select(
+                col(PairBalance.user_b_id).label("user_id"),
+                (-col(PairBalance.amount)).label("amount"),
+            ).where(in_group),
+        ).subquery()
+        statement = select(per_side.c.user_id, func.sum(per_side.c.amount)).group_by(
+            per_side.c.user_id
+        )
+        rows = (await self.session.exec(statement)).all()
+        return dict(rows)
+
+    async def find_drift(
+        self, user_ids: Sequence[UUID4] | None = None
+    ) -> list[PairBalanceDrift]:
+        """
+        Ledger entries that differ from the balances recomputed from the disbursements.
+        Restricted to the pairs with one of `user_ids` if given.
+        """
+        expected = _expected_balances().subquery()
+        on = and_(
+            col(PairBalance.user_a_id) == expected.c.user_a_id,
+            col(PairBalance.user_b_id) == expected.c.user_b_id,
+            col(PairBalance.currency) == expected.c.currency,
+        )
+        user_a_id = func.coalesce(PairBalance.user_a_id, expected.c.user_a_id)
+        user_b_id = func.coalesce(PairBalance.user_b_id, expected.c.user_b_id)
+        recorded_amount = func.coalesce(PairBalance.amount, literal(0.0))
+        expected_amount = func.coalesce(expected.c.amount, literal(0.0))
+        # more columns than sqlmodel's select is typed for
+        statement = (
+            sa_select(
+                user_a_id,
+                user_b_id,
+                func.coalesce(PairBalance.currency, expected.c.currency),
+                recorded_amount,
+                expected_amount,
+            )
+            .select_from(join(PairBalance, expected, on, full=True))
+            .where(func.abs(recorded_amount - expected_amount) >= TOLERANCE)
+        )
+        if user_ids is not None:
+            statement = statement.where(
+                or_(user_a_id.in_(user_ids), user_b_id.in_(user_ids))
+            )
+        rows = (await self.session.execute(statement)).all()
+        return [PairBalanceDrift(*row) for row in rows]
+
+    async def rebuild(self) -> None:
+        """
+        Recomputes the whole ledger from the disbursements and commits.
+        The lock blocks concurrent ledger writes, but not reads, until the rebuild is committed.
+        Writers that changed disbursements before the lock was taken are waited for and included.
+        """
+        await self.session.execute(text("LOCK TABLE pair_balance IN EXCLUSIVE MODE"))
+        await self.session.execute(delete(PairBalance))
+        await self.session.execute(
+            insert(PairBalance).from_select(
+                ["user_a_id", "user_b_id", "currency", "amount"],
+                _expected_balances(),
+            )
+        )
+        await self.session.commit()
+
+
+PairBalancesRepositoryDep = Annotated[PairBalancesRepository, Depends()]
@@ -1,57 +1,244 @@
-from collections.abc import Sequence
+import uuid
+from collections.abc import AsyncGenerator, Sequence
 from datetime import datetime, timezone
-from typing import Annotated
+from typing import Annotated, NamedTuple
 
 from fastapi import Depends
 from pydantic import UUID4
-from sqlalchemy import func
+from sqlalchemy import Float, Numeric, case, cast, func, literal, true, update
+from sqlalchemy import select as sa_select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import selectinload
+from sqlalchemy.orm.interfaces import LoaderOption
 from sqlmodel import col, select
 
+from app.core.config import settings
 from app.core.db import SessionDep
-from app.models import Settlement
+from app.core.pagination import CollectionVersion, Cursor, keyset_page, split_page
+from app.core.repos.disbursements_repo import unsettled_between
+from app.core.repos.tracing import traced
+from app.core.response_cache import response_cache
+from app.models import Disbursement, Settlement
 
 
+def _load_settled_disbursements() -> LoaderOption:
+    """Loads the live settled disbursements with a single `SELECT ... WHERE settlement_id IN (...)`."""
+    return selectinload(
+        Settlement.settled_disbursements.and_(  # type: ignore[attr-defined]
+            col(Disbursement.deleted_at).is_(None)
+        )
+    )
+
+
+def involved_user_ids(settlement: Settlement) -> set[uuid.UUID]:
+    """The users whose views of the settlement and its disbursements change when it is written."""
+    return {
+        settlement.owner_id,
+        settlement.sending_party_id,
+        settlement.receiving_party_id,
+    }
+
+
+class SettlementRow(NamedTuple):
+    """The columns of a settlement that the API returns. Read without tracking in the session."""
+
+    id: uuid.UUID
+    owner_id: uuid.UUID
+    receiving_party_id: uuid.UUID
+    sending_party_id: uuid.UUID
+    amount_paid: float
+    currency: str
+    settled_at: datetime
+    created_at: datetime
+    updated_at: datetime
+
+
+# in the order of the SettlementRow fields
+SETTLEMENT_ROW_COLUMNS = (
+    col(Settlement.id),
+    col(Settlement.owner_id),
+    col(Settlement.receiving_party_id),
+    col(Settlement.sending_party_id),
+    col(Settlement.amount_paid),
+    col(Settlement.currency),
+    col(Settlement.settled_at),
+    col(Settlement.created_at),
+    col(Settlement.updated_at),
+)
+
+
+class SettledAll(NamedTuple):
+    settlement_id: uuid.UUID
+    # sum of the signed amounts from the perspective of the sending party
+    amount_due: float
+
+
+@traced
 class SettlementsRepository:
     def __init__(self, session: SessionDep) -> None:
         self.session = session
 
-    def find_one(self, id: UUID4) -> Settlement | None:
+    async def find_one(self, id: UUID4) -> Settlement | None:
         statement = (
             select(Settlement)
             .where(Settlement.id == id)
             .where(col(Settlement.deleted_at).is_(None))
         )
-        return self.session.exec(statement).one_or_none()
+        return (await self.session.exec(statement)).one_or_none()
 
-    def soft_delete(self, settlement: Settlement) -> None:
+    async def soft_delete(self, settlement: Settlement) -> None:
         settlement.sqlmodel_update({"deleted_at": datetime.now(timezone.utc)})
         self.session.add(settlement)
-        self.session.commit()
+        involved = involved_user_ids(settlement)
+        await self.session.commit()
+        await response_cache.invalidate(involved)
 
-    def find_one_owned(self, id: UUID4, owner_id: UUID4) -> Settlement | None:
+    async def find_one_owned(
+        self, id: UUID4, owner_id: UUID4, with_disbursements: bool = False
+    ) -> Settlement | None:
         statement = (
             select(Settlement)
             .where(col(Settlement.deleted_at).is_(None))
             .where(Settlement.owner_id == owner_id)
             .where(Settlement.id == id)
         )
-        return self.session.exec(statement).one_or_none()
+        if with_disbursements:
+            statement = statement.options(_load_settled_disbursements())
+        return (await self.session.exec(statement)).one_or_none()
+
+    async def find_all_owned(
+        self, owner_id: UUID4, limit: int, after: Cursor | None = None
+    ) -> tuple[Sequence[SettlementRow], str | None]:
+        """Returns a page of settlements, newest first, and the cursor to the next page."""
+        statement = keyset_page(
+            sa_select(*SETTLEMENT_ROW_COLUMNS)
+            .where(col(Settlement.deleted_at).is_(None))
+            .where(col(Settlement.owner_id) == owner_id),
+            Settlement.created_at,
+            Settlement.id,
+            limit,
+            after=after,
+        )
+        rows = (await self.session.execute(statement)).all()
+        return split_page(list(map(SettlementRow._make, rows)), limit)
 
-    def find_all_owned(self, owner_id: UUID4) -> Sequence[Settlement]:
+    async def stream_owned(
+        self, owner_id: UUID4
+    ) -> AsyncGenerator[Sequence[SettlementRow], None]:
+        """
+        All live settlements of the owner, newest first, in batches of EXPORT_BATCH_SIZE.
+        Fetched from a server-side cursor, so only one batch is held in memory at a time.
+        """
         statement = (
-            select(Settlement)
+            sa_select(*SETTLEMENT_ROW_COLUMNS)
+            .where(col(Settlement.owner_id) == owner_id)
             .where(col(Settlement.deleted_at).is_(None))
+            .order_by(col(Settlement.created_at).desc(), col(Settlement.id).desc())
+            .execution_options(yield_per=settings.EXPORT_BATCH_SIZE)
+        )
+        result = await self.session.stream(statement)
+        async for rows in result.partitions(settings.EXPORT_BATCH_SIZE):
+            yield list(map(SettlementRow._make, rows))
+
+    async def settle_all_between(
+        self,
+        *,
+        owner_id: UUID4,
+        sending_party_id: UUID4,
+        receiving_party_id: UUID4,
+        currency: str,
+        settled_at: datetime,
+        settled_before: datetime | None = None,
+    ) -> SettledAll | None:
+        """
+        Attaches all unsettled disbursements in `currency` between both parties, created before `settled_before` if given,
+        to a new settlement over their amount due. A single statement regardless of the number of disbursements.
+        Returns None without creating a settlement if there is nothing to settle. Does not commit.
+        """
+        settlement_id = uuid.uuid4()
+        attach = (
+            update(Disbursement)
+            .where(unsettled_between(sending_party_id, receiving_party_id))
+            .where(col(Disbursement.currency) == currency)
+            .values(settlement_id=settlement_id)
+            .returning(col(Disbursement.paying_party_id), col(Disbursement.amount))
+        )
+        if settled_before is not None:
+            attach = attach.where(col(Disbursement.created_at) < settled_before)
+        attached = attach.cte("attached")
+        signed = case(
+            (attached.c.paying_party_id == sending_party_id, attached.c.amount),
+            else_=-attached.c.amount,
+        )
+        totals = (
+            sa_select(
+                func.count().label("n"),
+                func.coalesce(func.sum(signed), 0.0).label("amount_due"),
+            )
+            .select_from(attached)
+            .cte("totals")
+        )
+        amount_paid = cast(func.round(cast(-totals.c.amount_due, Numeric), 2), Float)
+        create = (
+            insert(Settlement)
+            .from_select(
+                [
+                    "id",
+                    "owner_id",
+                    "sending_party_id",
+                    "receiving_party_id",
+                    "currency",
+                    "settled_at",
+                    "amount_paid",
+                ],
+                sa_select(
+                    literal(settlement_id),
+                    literal(owner_id),
+                    literal(sending_party_id),
+                    literal(receiving_party_id),
+                    literal(currency),
+                    literal(settled_at),
+                    amount_paid,
+                ).where(totals.c.n > 0),
+            )
+            .returning(col(Settlement.id))
+            .cte("created")
+        )
+        statement = sa_select(create.c.id, totals.c.amount_due).select_from(
+            totals.join(create, true())
+        )
+        row = (await self.session.execute(statement)).one_or_none()
+        return None if row is None else SettledAll(*row)
+
+    async def find_updated_at_owned(
+        self, id: UUID4, owner_id: UUID4
+    ) -> datetime | None:
+        statement = (
+            select(Settlement.updated_at)
+            .where(col(Settlement.deleted_at).is_(None))
+            .where(Settlement.owner_id == owner_id)
+            .where(Settlement.id == id)
+        )
+        return (await self.session.exec(statement)).one_or_none()
+
+    async def version_owned(self, owner_id: UUID4) -> CollectionVersion:
+        """Version of the collection of `find_all_owned`. Its total is the one of `count_owned`."""
+        statement = (
+            select(func.count(), func.max(Settlement.updated_at))
             .where(Settlement.owner_id == owner_id)
+            .where(col(Settlement.deleted_at).is_(None))
         )
-        return self.session.exec(statement).all()
+        total, last_updated_at = (await self.session.exec(statement)).one()
+        return CollectionVersion(total, last_updated_at)
 
-    def count_owned(self, owner_id: UUID4) -> int:
+    async def count_owned(self, owner_id: UUID4) -> int:
         statement = (
             select(func.count())
             .select_from(Settlement)
             .where(Settlement.owner_id == owner_id)
+            .where(col(Settlement.deleted_at).is_(None))
         )
-        return self.session.exec(statement).one()
+        return (await self.session.exec(statement)).one()
 
 
 SettlementsRepositoryDep = Annotated[SettlementsRepository, Depends()]
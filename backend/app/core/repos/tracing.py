@@ -0,0 +1,66 @@
+import functools
+import inspect
+from collections.abc import AsyncGenerator, Callable, Coroutine
+from contextvars import ContextVar
+from typing import Any, TypeVar
+
+T = TypeVar("T", bound=type)
+
+# the innermost repository method being awaited, e.g. "DisbursementsRepository.find_all_between".
+# Unlike the call stack, it survives the hop into the threadpool or the greenlet that runs the statement.
+current_repository_method: ContextVar[str | None] = ContextVar(
+    "current_repository_method", default=None
+)
+
+
+def traced(cls: T) -> T:
+    """
+    Records the public coroutine methods of the repository in `current_repository_method` while they run.
+    Async generator methods are recorded while they produce their next item.
+    """
+    for name, method in list(vars(cls).items()):
+        if name.startswith("_"):
+            continue
+        qualified_name = f"{cls.__name__}.{name}"
+        if inspect.iscoroutinefunction(method):
+            setattr(cls, name, _traced_method(qualified_name, method))
+        elif inspect.isasyncgenfunction(method):
+            setattr(cls, name, _traced_generator(qualified_name, method))
+    return cls
+
+
+def _traced_method(
+    qualified_name: str, method: Callable[..., Coroutine[Any, Any, Any]]
+) -> Callable[..., Coroutine[Any, Any, Any]]:
+    @functools.wraps(method)
+    async def wrapper(*args: Any, **kwargs: Any) -> Any:
+        token = current_repository_method.set(qualified_name)
+        try:
+            return await method(*args, **kwargs)
+        finally:
+            current_repository_method.reset(token)
+
+    return wrapper
+
+
+def _traced_generator(
+    qualified_name: str, method: Callable[..., AsyncGenerator[Any, None]]
+) -> Callable[..., AsyncGenerator[Any, None]]:
+    @functools.wraps(method)
+    async def wrapper(*args: Any, **kwargs: Any) -> AsyncGenerator[Any, None]:
+        generator = method(*args, **kwargs)
+        try:
+            while True:
+                # set per item, the consumer's context may change between items
+                token = current_repository_method.set(qualified_name)
+                try:
+                    item = await anext(generator)
+                except StopAsyncIteration:
+                    return
+                finally:
+                    current_repository_method.reset(token)
+                yield item
+        finally:
+            await generator.aclose()
+
+    return wrapper
@@ -1,30 +1,77 @@
+import uuid
 from typing import Annotated
 
 from fastapi import Depends
-from sqlmodel import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import col, select
 
+from app.core.cache import LruTtlCache
+from app.core.config import settings
 from app.core.db import SessionDep
+from app.core.repos.tracing import traced
 from app.models import User
 
+# short-lived clerk_user_id -> User cache to skip the user lookup on every authenticated request.
+# Holds detached copies so that no session state is shared between requests.
+# The app never changes users, so the cache is not invalidated: a user deactivated in the database
+# keeps the cached `is_active` until USER_CACHE_TTL_SECONDS expire.
+user_cache: LruTtlCache[str, User] = LruTtlCache(max_size=settings.USER_CACHE_MAX_SIZE)
 
+
+@traced
 class UsersRepository:
     def __init__(self, session: SessionDep) -> None:
         self.session = session
 
-    def find_one_by_clerk_user_id(self, clerk_user_id: str) -> User | None:
+    async def find_one_by_clerk_user_id(self, clerk_user_id: str) -> User | None:
         find_user_by_clerk_uid = select(User).where(User.clerk_user_id == clerk_user_id)
-        return self.session.exec(find_user_by_clerk_uid).one_or_none()
+        return (await self.session.exec(find_user_by_clerk_uid)).one_or_none()
+
+    async def find_one_by_clerk_user_id_cached(self, clerk_user_id: str) -> User | None:
+        cached = user_cache.get(clerk_user_id)
+        if cached is not None:
+            return _detached_copy(cached)
+        user = await self.find_one_by_clerk_user_id(clerk_user_id)
+        if user is not None:
+            self._cache(user)
+        return user
 
-    def create(
-        self, *, clerk_user_id: str, is_active: bool = True, is_superuser: bool = False
-    ) -> User:
-        user = User(
-            clerk_user_id=clerk_user_id,
+    async def find_or_create(self, *, clerk_user_id: str) -> User:
+        """
+        Creates the user with a single `INSERT ... ON CONFLICT DO NOTHING RETURNING`.
+        If a concurrent request created the user first, that user is returned instead.
+        """
+        insert_user = (
+            insert(User)
+            .values(id=uuid.uuid4(), clerk_user_id=clerk_user_id, is_active=True)
+            .on_conflict_do_nothing(index_elements=[col(User.clerk_user_id)])
+            .returning(User)
         )
-        self.session.add(user)
-        self.session.commit()
-        self.session.refresh(user)
+        created = (await self.session.scalars(insert_user)).one_or_none()
+        if created is None:
+            # lost the race against a concurrent insert
+            user = await self.find_one_by_clerk_user_id(clerk_user_id)
+            if user is None:
+                raise RuntimeError(f"User {clerk_user_id} vanished right after insert")
+        else:
+            # copy before committing to not reload the expired instance afterwards
+            user = _detached_copy(created)
+            await self.session.commit()
+        self._cache(user)
         return user
 
+    def _cache(self, user: User) -> None:
+        if user.clerk_user_id is not None:
+            user_cache.set(
+                user.clerk_user_id,
+                _detached_copy(user),
+                ttl_seconds=settings.USER_CACHE_TTL_SECONDS,
+            )
+
+
+def _detached_copy(user: User) -> User:
+    # copies column attributes only, model_validate would lazy-load every relationship
+    return User(id=user.id, clerk_user_id=user.clerk_user_id, is_active=user.is_active)
+
 
 UsersRepositoryDep = Annotated[UsersRepository, Depends()]
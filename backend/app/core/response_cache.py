@@ -0,0 +1,223 @@
+import asyncio
+import hashlib
+import uuid
+from collections.abc import Awaitable, Callable, Iterable
+from dataclasses import dataclass
+from typing import NamedTuple, Protocol
+
+from starlette.requests import Request
+
+from app.core.cache import LruTtlCache
+from app.core.config import settings
+
+# a lost generation merely orphans the entries of its user, so it may expire
+GENERATION_TTL_SECONDS = 24 * 3600
+
+
+class CachedResponse(NamedTuple):
+    etag: str
+    body: bytes
+
+    def pack(self) -> bytes:
+        return self.etag.encode() + b"\n" + self.body
+
+    @classmethod
+    def unpack(cls, packed: bytes) -> "CachedResponse":
+        etag, body = packed.split(b"\n", 1)
+        return cls(etag.decode(), body)
+
+
+class CacheBackend(Protocol):
+    async def get(self, key: str) -> bytes | None: ...
+
+    async def set(self, key: str, value: bytes, ttl_seconds: float) -> None: ...
+
+    async def add(self, key: str, value: bytes, ttl_seconds: float) -> bytes:
+        """Stores `value` unless the key exists. Returns the value stored under the key."""
+        ...
+
+    async def delete(self, key: str) -> None: ...
+
+    @property
+    def evictions(self) -> int: ...
+
+
+class MemoryCacheBackend:
+    """
+    Per process, thus only consistent if the app runs a single worker.
+    With more workers, another worker's writes show up after the TTL at the latest.
+    """
+
+    def __init__(self, max_size: int) -> None:
+        self._entries: LruTtlCache[str, bytes] = LruTtlCache(max_size=max_size)
+
+    async def get(self, key: str) -> bytes | None:
+        return self._entries.get(key)
+
+    async def set(self, key: str, value: bytes, ttl_seconds: float) -> None:
+        self._entries.set(key, value, ttl_seconds=ttl_seconds)
+
+    async def add(self, key: str, value: bytes, ttl_seconds: float) -> bytes:
+        # atomic as nothing is awaited in between
+        existing = self._entries.get(key)
+        if existing is not None:
+            return existing
+        self._entries.set(key, value, ttl_seconds=ttl_seconds)
+        return value
+
+    async def delete(self, key: str) -> None:
+        self._entries.delete(key)
+
+    @property
+    def evictions(self) -> int:
+        return self._entries.stats.evictions + self._entries.stats.expirations
+
+
+class RedisClient(Protocol):
+    """The subset of `redis.asyncio.Redis` the shared backend uses."""
+
+    async def get(self, name: str) -> bytes | None: ...
+
+    async def set(
+        self, name: str, value: bytes, px: int | None = None, nx: bool = False
+    ) -> bool | None: ...
+
+    async def delete(self, *names: str) -> int: ...
+
+
+class RedisCacheBackend:
+    """Shared between all workers and instances, so writes invalidate everywhere at once."""
+
+    def __init__(self, client: RedisClient, prefix: str = "mimo:") -> None:
+        self._client = client
+        self._prefix = prefix
+
+    async def get(self, key: str) -> bytes | None:
+        return await self._client.get(self._prefix + key)
+
+    async def set(self, key: str, value: bytes, ttl_seconds: float) -> None:
+        await self._client.set(self._prefix + key, value, px=int(ttl_seconds * 1000))
+
+    async def add(self, key: str, value: bytes, ttl_seconds: float) -> bytes:
+        px = int(ttl_seconds * 1000)
+        if await self._client.set(self._prefix + key, value, px=px, nx=True):
+            return value
+        existing = await self._client.get(self._prefix + key)
+        # expired in between, the next lookup adds it again
+        return value if existing is None else existing
+
+    async def delete(self, key: str) -> None:
+        await self._client.delete(self._prefix + key)
+
+    @property
+    def evictions(self) -> int:
+        # Redis counts its own evictions, see `evicted_keys` in INFO stats
+        return 0
+
+
+@dataclass
+class ResponseCacheStats:
+    hits: int = 0
+    misses: int = 0
+    # misses that waited for an identical load instead of querying the database
+    coalesced: int = 0
+    evictions: int = 0
+
+
+class ResponseCache:
+    """
+    Caches serialized read responses per user, route and query parameters.
+    Keys contain a generation per user, so that writes invalidate all entries of the affected users
+    by dropping their generations. Entries of a previous generation are never read again and age out.
+    Identical misses within the process wait for the first one to load instead of loading again.
+    A `backend` of None disables the cache.
+    """
+
+    def __init__(self, backend: CacheBackend | None, ttl_seconds: float) -> None:
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self._loading: dict[str, asyncio.Event] = {}
+        self._stats = ResponseCacheStats()
+
+    @property
+    def stats(self) -> ResponseCacheStats:
+        evictions = 0 if self.backend is None else self.backend.evictions
+        return ResponseCacheStats(
+            self._stats.hits, self._stats.misses, self._stats.coalesced, evictions
+        )
+
+    async def get_or_load(
+        self,
+        user_id: uuid.UUID,
+        request: Request,
+        load: Callable[[], Awaitable[CachedResponse]],
+    ) -> CachedResponse:
+        """
+        Returns the cached response of the user for the request's route and query, or loads and caches it.
+        Exceptions of `load` are not cached, requests that waited for it load on their own.
+        """
+        if self.backend is None:
+            return await load()
+        key = await self._key(self.backend, user_id, request)
+        waited = False
+        while True:
+            packed = await self.backend.get(key)
+            if packed is not None:
+                if waited:
+                    self._stats.coalesced += 1
+                else:
+                    self._stats.hits += 1
+                return CachedResponse.unpack(packed)
+            loading = self._loading.get(key)
+            if loading is None:
+                break
+            await loading.wait()
+            waited = True
+        self._stats.misses += 1
+        loading = self._loading[key] = asyncio.Event()
+        try:
+            response = await load()
+            await self.backend.set(key, response.pack(), self.ttl_seconds)
+            return response
+        finally:
+            del self._loading[key]
+            loading.set()
+
+    async def invalidate(self, user_ids: Iterable[uuid.UUID]) -> None:
+        """Drops the cached responses of the users. Call it after committing a write that affects them."""
+        if self.backend is None:
+            return
+        for user_id in set(user_ids):
+            await self.backend.delete(_generation_key(user_id))
+
+    async def _key(
+        self, backend: CacheBackend, user_id: uuid.UUID, request: Request
+    ) -> str:
+        generation = await backend.add(
+            _generation_key(user_id), uuid.uuid4().hex.encode(), GENERATION_TTL_SECONDS
+        )
+        query = sorted(request.query_params.multi_items())
+        digest = hashlib.sha256(f"{request.url.path}|{query}".encode()).hexdigest()
+        return f"response:{user_id}:{generation.decode()}:{digest}"
+
+
+def _generation_key(user_id: uuid.UUID) -> str:
+    return f"generation:{user_id}"
+
+
+def make_backend() -> CacheBackend | None:
+    if settings.RESPONSE_CACHE_BACKEND == "memory":
+        return MemoryCacheBackend(settings.RESPONSE_CACHE_MAX_SIZE)
+    if settings.RESPONSE_CACHE_BACKEND == "redis":
+        try:
+            import redis.asyncio as redis  # type: ignore[import-not-found]
+        except ImportError as e:
+            raise RuntimeError(
+                "RESPONSE_CACHE_BACKEND=redis requires the redis package"
+            ) from e
+        client: RedisClient = redis.Redis.from_url(settings.RESPONSE_CACHE_REDIS_URL)
+        return RedisCacheBackend(client)
+    return None
+
+
+response_cache = ResponseCache(make_backend(), settings.RESPONSE_CACHE_TTL_SECONDS)
@@ -0,0 +1,36 @@
+import heapq
+import uuid
+from collections.abc import Mapping
+from typing import NamedTuple
+
+
+class Transfer(NamedTuple):
+    sending_party_id: uuid.UUID
+    receiving_party_id: uuid.UUID
+    amount: float
+
+
+def minimize_transfers(balances: Mapping[uuid.UUID, float]) -> list[Transfer]:
+    """
+    Suggests transfers that settle all net balances, positive if the others owe the user.
+    Greedily matches the largest debtor with the largest creditor, so that every transfer
+    settles at least one of them. That makes at most `n - 1` transfers in O(n log n).
+    Works in cents, residues below a cent stay unsettled.
+    """
+    cents = {user_id: round(amount * 100) for user_id, amount in balances.items()}
+    # max heaps through negated cents, the user id breaks ties deterministically
+    creditors = [(-c, user_id) for user_id, c in cents.items() if c > 0]
+    debtors = [(c, user_id) for user_id, c in cents.items() if c < 0]
+    heapq.heapify(creditors)
+    heapq.heapify(debtors)
+    transfers: list[Transfer] = []
+    while creditors and debtors:
+        credit, creditor = heapq.heappop(creditors)
+        debt, debtor = heapq.heappop(debtors)
+        amount = min(-credit, -debt)
+        transfers.append(Transfer(debtor, creditor, amount / 100))
+        if credit + amount < 0:
+            heapq.heappush(creditors, (credit + amount, creditor))
+        if debt + amount < 0:
+            heapq.heappush(debtors, (debt + amount, debtor))
+    return transfers
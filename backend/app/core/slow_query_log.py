@@ -0,0 +1,157 @@
+"""
+Opt-in log of statements slower than SLOW_QUERY_THRESHOLD_MS, with their query plans.
+
+The plan is captured in the background on a separate connection, so the slow request does not wait for it.
+Only plain SELECTs run with EXPLAIN ANALYZE, in a read-only transaction that is rolled back.
+Other statements are explained without executing them.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from typing import Any
+
+from sqlalchemy import Connection, event
+from sqlalchemy.engine import ExecutionContext
+
+from app.core.cache import LruTtlCache
+from app.core.config import settings
+from app.core.db import engine, serving_engine
+from app.core.repos.tracing import current_repository_method
+
+logger = logging.getLogger(__name__)
+
+# a statement is explained at most once per interval, EXPLAIN ANALYZE runs it once more
+EXPLAIN_INTERVAL_SECONDS = 600
+EXPLAIN_TIMEOUT_MS = 30_000
+# skips the hooks for the connections that capture the plans
+_EXPLAINING = "slow_query_log_explaining"
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="slow-query-explain")
+_explained: LruTtlCache[str, bool] = LruTtlCache(max_size=1000)
+_store_lock = threading.Lock()
+_store: RotatingFileHandler | None = None
+
+
+def parameter_shapes(parameters: Any) -> Any:
+    """The types of the bound parameters instead of their values, which might be personal data."""
+    if isinstance(parameters, dict):
+        return {name: type(value).__name__ for name, value in parameters.items()}
+    if isinstance(parameters, list | tuple):
+        if parameters and isinstance(parameters[0], dict | list | tuple):
+            # executemany
+            return {"rows": len(parameters), "row": parameter_shapes(parameters[0])}
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+
+def _explain_statement(statement: str) -> str:
+    upper = statement.lstrip().upper()
+    analyzable = upper.startswith("SELECT") and " FOR UPDATE" not in upper
+    if analyzable:
+        return f"EXPLAIN (ANALYZE, BUFFERS) {statement}"
+    return f"EXPLAIN {statement}"
+
+
+def _capture(entry: dict[str, Any], statement: str, parameters: Any) -> None:
+    try:
+        with engine.connect().execution_options(**{_EXPLAINING: True}) as conn:
+            conn.exec_driver_sql("SET TRANSACTION READ ONLY")
+            conn.exec_driver_sql(f"SET LOCAL statement_timeout = {EXPLAIN_TIMEOUT_MS}")
+            rows = conn.exec_driver_sql(_explain_statement(statement), parameters)
+            entry["plan"] = "\n".join(row[0] for row in rows)
+            conn.rollback()
+    except Exception as e:
+        # e.g. statements referencing temporary tables of the original connection
+        entry["plan_error"] = f"{type(e).__name__}: {e}"
+    _write(entry)
+
+
+def _write(entry: dict[str, Any]) -> None:
+    global _store
+    with _store_lock:
+        path = os.path.abspath(settings.SLOW_QUERY_LOG_PATH)
+        if _store is None or _store.baseFilename != path:
+            if _store is not None:
+                _store.close()
+            _store = RotatingFileHandler(
+                path,
+                maxBytes=settings.SLOW_QUERY_LOG_MAX_BYTES,
+                backupCount=settings.SLOW_QUERY_LOG_BACKUP_COUNT,
+                encoding="utf-8",
+            )
+        _store.emit(logging.makeLogRecord({"msg": json.dumps(entry, default=str)}))
+
+
+def read_entries(limit: int) -> list[dict[str, Any]]:
+    """The most recent entries of the store, newest first."""
+    path = Path(settings.SLOW_QUERY_LOG_PATH)
+    files = [
+        path.with_name(f"{path.name}.{i}")
+        for i in range(settings.SLOW_QUERY_LOG_BACKUP_COUNT, 0, -1)
+    ]
+    entries: deque[dict[str, Any]] = deque(maxlen=limit)
+    with _store_lock:
+        for file in [*files, path]:
+            if file.exists():
+                with file.open(encoding="utf-8") as lines:
+                    entries.extend(json.loads(line) for line in lines if line.strip())
+    return list(reversed(entries))
+
+
+def wait_for_pending_plans() -> None:
+    # the executor has a single worker, so this runs after everything submitted before
+    _executor.submit(lambda: None).result()
+
+
+def _after_cursor_execute(
+    conn: Connection,
+    _cursor: Any,
+    statement: str,
+    parameters: Any,
+    context: ExecutionContext | None,
+    executemany: bool,
+) -> None:
+    threshold_ms = settings.SLOW_QUERY_THRESHOLD_MS
+    start = getattr(context, "query_start", None)
+    if not threshold_ms or start is None:
+        return
+    duration_ms = (time.perf_counter() - start) * 1000
+    if duration_ms < threshold_ms or conn.get_execution_options().get(_EXPLAINING):
+        return
+    caller = current_repository_method.get()
+    shapes = parameter_shapes(parameters)
+    logger.warning(
+        "Slow statement of %.1fms in %s: %s with parameters %s",
+        duration_ms,
+        caller,
+        statement,
+        shapes,
+    )
+    entry = {
+        "at": datetime.now(timezone.utc).isoformat(),
+        "duration_ms": round(duration_ms, 3),
+        "caller": caller,
+        "statement": statement,
+        "parameters": shapes,
+        "plan": None,
+    }
+    if executemany or _explained.get(statement) is not None:
+        _executor.submit(_write, entry)
+        return
+    _explained.set(statement, True, ttl_seconds=EXPLAIN_INTERVAL_SECONDS)
+    _executor.submit(_capture, entry, statement, parameters)
+
+
+def install() -> None:
+    """Attaches the log to the engines. It stays inactive while SLOW_QUERY_THRESHOLD_MS is 0."""
+    for target in {engine, serving_engine()}:
+        if not event.contains(target, "after_cursor_execute", _after_cursor_execute):
+            event.listen(target, "after_cursor_execute", _after_cursor_execute)
@@ -1,21 +1,34 @@
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.routing import APIRoute
 from starlette.middleware.cors import CORSMiddleware
 
 from app.api.main import api_router
+from app.api.middleware import MetricsMiddleware, ProfilingMiddleware
+from app.core import slow_query_log
 from app.core.config import settings
+from app.core.db import dispose_engines
 
 
 def custom_generate_unique_id(route: APIRoute) -> str:
     return f"{route.tags[0]}-{route.name}"
 
 
+@asynccontextmanager
+async def lifespan(_app: FastAPI) -> AsyncIterator[None]:
+    yield
+    await dispose_engines()
+
+
 app = FastAPI(
     title=settings.PROJECT_NAME,
     openapi_url=f"{settings.API_V1_STR}/openapi.json",
     generate_unique_id_function=custom_generate_unique_id,
     redirect_slashes=False,
     version="0.2.0",
+    lifespan=lifespan,
 )
 
 # Set all CORS enabled origins
@@ -26,6 +39,15 @@ if settings.all_cors_origins:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["ETag", "Server-Timing"],
     )
 
 app.include_router(api_router, prefix=settings.API_V1_STR)
+
+slow_query_log.install()
+
+if settings.ENVIRONMENT in ("local", "staging"):
+    app.add_middleware(ProfilingMiddleware)
+
+# outermost, so that the metrics include the time spent in the other middlewares
+app.add_middleware(MetricsMiddleware, routes=app.routes)
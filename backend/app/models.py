@@ -1,10 +1,19 @@
 import uuid
 from datetime import datetime
 from enum import Enum
+from typing import Any
 
 from pydantic import UUID4
 from pydantic import Field as PdField
-from sqlalchemy import TIMESTAMP, Column, DateTime, func
+from sqlalchemy import (
+    TIMESTAMP,
+    CheckConstraint,
+    Column,
+    DateTime,
+    Index,
+    func,
+    text,
+)
 from sqlmodel import Field, Relationship, SQLModel
 
 # this must come BEFORE we set up our model classes
@@ -62,7 +71,44 @@ class Currency(Enum):
     EUR = "EUR"
 
 
+class ExportFormat(Enum):
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+
 class Disbursement(SQLModel, table=True):
+    # partial indexes on live rows, matching the queries of DisbursementsRepository
+    __table_args__ = (
+        Index(
+            "ix_disbursement_owner_id_created_at_live",
+            "owner_id",
+            "created_at",
+            "id",
+            postgresql_where=text("deleted_at IS NULL"),
+        ),
+        Index(
+            "ix_disbursement_pair_created_at_live",
+            "paying_party_id",
+            "on_behalf_of_party_id",
+            "created_at",
+            "id",
+            postgresql_where=text("deleted_at IS NULL"),
+        ),
+        Index(
+            "ix_disbursement_pair_unsettled",
+            "paying_party_id",
+            "on_behalf_of_party_id",
+            "created_at",
+            "id",
+            postgresql_where=text("deleted_at IS NULL AND settlement_id IS NULL"),
+        ),
+        Index(
+            "ix_disbursement_settlement_id",
+            "settlement_id",
+            postgresql_where=text("settlement_id IS NOT NULL"),
+        ),
+    )
+
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     owner_id: uuid.UUID = Field(
         foreign_key="user.id", nullable=False, ondelete="CASCADE"
@@ -136,7 +182,8 @@ class DisbursementPublic(SQLModel):
     # replacing the explicit ref by using from __future__ import annotations did not work. Type system was happy but fastapi broke ¯\_(ツ)_/¯
     @staticmethod
     def make(d: Disbursement) -> "DisbursementPublic":
-        return DisbursementPublic(**d.model_dump(), amount_paid=Money(**d.model_dump()))
+        fields = d.model_dump()
+        return DisbursementPublic(**fields, amount_paid=Money(**fields))
 
     id: uuid.UUID
     owner_id: uuid.UUID
@@ -151,6 +198,56 @@ class DisbursementPublic(SQLModel):
 class DisbursementsPublic(SQLModel):
     data: list[DisbursementPublic]
     total: int = Field(int, description="The total count of resources.")
+    next_cursor: str | None = Field(
+        None,
+        description="Pass as `cursor` to get the next page. Null on the last page.",
+    )
+
+
+class PairBalance(SQLModel, table=True):
+    """
+    Net balance of the unsettled, not deleted disbursements between two users in one currency.
+    Maintained in the same transaction as every write to those disbursements.
+    The pair is stored once, with `user_a_id < user_b_id`.
+    """
+
+    __tablename__ = "pair_balance"
+    __table_args__ = (
+        CheckConstraint("user_a_id < user_b_id", name="ordered_pair"),
+        Index("ix_pair_balance_user_b_id", "user_b_id"),
+    )
+
+    user_a_id: uuid.UUID = Field(
+        foreign_key="user.id", primary_key=True, ondelete="CASCADE"
+    )
+    user_b_id: uuid.UUID = Field(
+        foreign_key="user.id", primary_key=True, ondelete="CASCADE"
+    )
+    currency: str = Field(primary_key=True)
+    amount: float = Field(
+        0.0,
+        description="Positive if user b owes user a, negative if user a owes user b.",
+    )
+    updated_at: datetime | None = Field(
+        None,
+        sa_column=Column(
+            DateTime,
+            server_default=func.now(),
+            onupdate=func.current_timestamp(),
+            nullable=False,
+        ),
+    )
+
+
+class BalancePublic(SQLModel):
+    counterparty_id: uuid.UUID
+    balance: Money = Field(
+        description="Net amount of all unsettled disbursements with the counterparty. Positive if the counterparty owes you, negative if you owe the counterparty."
+    )
+
+
+class BalancesPublic(SQLModel):
+    data: list[BalancePublic]
 
 
 class SettlementCreate(SQLModel):
@@ -162,7 +259,48 @@ class SettlementCreate(SQLModel):
     currency: Currency
 
 
+class SettlementQuoteCreate(SQLModel):
+    receiving_party_id: UUID4
+    settled_disbursement_ids: list[UUID4] | None = Field(
+        None,
+        min_length=1,
+        unique_items=True,
+        description="Defaults to all unsettled disbursements between you and the receiving party.",
+    )
+
+
+class AmountDuePublic(SQLModel):
+    amount_paid: Money = Field(
+        description="The amount_paid that settles the disbursements in this currency. Negative if the receiving party owes you."
+    )
+    disbursement_count: int
+
+
+class SettlementQuotePublic(SQLModel):
+    data: list[AmountDuePublic]
+
+
+class SettlementSuggestionPublic(SQLModel):
+    sending_party_id: uuid.UUID
+    receiving_party_id: uuid.UUID
+    amount_paid: Money
+
+
+class SettlementSuggestionsPublic(SQLModel):
+    data: list[SettlementSuggestionPublic]
+
+
 class Settlement(SQLModel, table=True):
+    __table_args__ = (
+        Index(
+            "ix_settlement_owner_id_created_at_live",
+            "owner_id",
+            "created_at",
+            "id",
+            postgresql_where=text("deleted_at IS NULL"),
+        ),
+    )
+
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     owner_id: uuid.UUID = Field(
         foreign_key="user.id", nullable=False, ondelete="CASCADE"
@@ -217,8 +355,16 @@ class Settlement(SQLModel, table=True):
 
 class SettlementPublic(SQLModel):
     @staticmethod
-    def make(s: Settlement) -> "SettlementPublic":
-        return SettlementPublic(**s.model_dump())
+    def make(s: Settlement, with_disbursements: bool = False) -> "SettlementPublic":
+        # only touches the relationship if requested, it must have been loaded eagerly then
+        settled_disbursements = (
+            list(map(DisbursementPublic.make, s.settled_disbursements))
+            if with_disbursements
+            else None
+        )
+        return SettlementPublic(
+            **s.model_dump(), settled_disbursements=settled_disbursements
+        )
 
     id: uuid.UUID
     owner_id: uuid.UUID
@@ -229,8 +375,31 @@ class SettlementPublic(SQLModel):
     settled_at: datetime
     created_at: datetime
     updated_at: datetime
+    settled_disbursements: list[DisbursementPublic] | None = Field(
+        None, description="Only included with `include=disbursements`."
+    )
 
 
 class SettlementsPublic(SQLModel):
     data: list[SettlementPublic]
     total: int = Field(int, description="The total count of resources.")
+    next_cursor: str | None = Field(
+        None,
+        description="Pass as `cursor` to get the next page. Null on the last page.",
+    )
+
+
+class SlowQueryPublic(SQLModel):
+    at: datetime
+    duration_ms: float
+    # the repository method that ran the statement
+    caller: str | None
+    statement: str
+    # the types of the bound parameters
+    parameters: Any
+    plan: str | None
+    plan_error: str | None = None
+
+
+class SlowQueriesPublic(SQLModel):
+    data: list[SlowQueryPublic]
@@ -0,0 +1,44 @@
+import argparse
+import asyncio
+import logging
+
+from sqlmodel import Session
+
+from app.core.db import ThreadedSession, engine
+from app.core.repos.pair_balances_repo import PairBalancesRepository
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def check(fix: bool) -> bool:
+    """Returns whether the ledger is consistent with the disbursements, after the fix if requested."""
+    with Session(engine) as session:
+        repo = PairBalancesRepository(ThreadedSession(session))
+        drifts = await repo.find_drift()
+        for drift in drifts:
+            logger.warning("Drifted pair balance %s", drift)
+        if not drifts or not fix:
+            return not drifts
+        logger.info("Rebuilding pair balances")
+        await repo.rebuild()
+        return not await repo.find_drift()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Verify the pair balance ledger against the disbursements."
+    )
+    parser.add_argument(
+        "--fix", action="store_true", help="rebuild the ledger if it drifted"
+    )
+    args = parser.parse_args()
+    logger.info("Verifying pair balances")
+    consistent = asyncio.run(check(args.fix))
+    logger.info("Pair balances %s", "consistent" if consistent else "drifted")
+    if not consistent:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
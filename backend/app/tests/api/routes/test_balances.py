@@ -0,0 +1,36 @@
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.tests.utils.disbursements import create_disbursement
+from app.tests.utils.users import create_user
+
+
+def test_balances_net_unsettled_disbursements_per_counterparty(
+    client: TestClient,
+) -> None:
+    me, headers = create_user(client)
+    other, other_headers = create_user(client)
+    third, _ = create_user(client)
+    create_disbursement(client, headers, me, other, amount=10)
+    create_disbursement(client, headers, other, me, amount=4)
+    create_disbursement(client, headers, me, other, amount=5, currency="JPY")
+    create_disbursement(client, headers, third, me, amount=2.5)
+    create_disbursement(client, headers, me, me, amount=100)
+
+    r = client.get(f"{settings.API_V1_STR}/balances/", headers=headers)
+    assert r.status_code == 200
+    balances = {
+        (b["counterparty_id"], b["balance"]["currency"]): b["balance"]["amount"]
+        for b in r.json()["data"]
+    }
+    assert balances == {
+        (other, "EUR"): 6,
+        (other, "JPY"): 5,
+        (third, "EUR"): -2.5,
+    }
+
+    r = client.get(f"{settings.API_V1_STR}/balances/{me}", headers=other_headers)
+    other_balances = {
+        b["balance"]["currency"]: b["balance"]["amount"] for b in r.json()["data"]
+    }
+    assert other_balances == {"EUR": -6, "JPY": -5}
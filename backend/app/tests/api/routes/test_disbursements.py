@@ -1,10 +1,16 @@
+import csv
+import io
+import json
 from typing import Any
 
+import pytest
 from fastapi.testclient import TestClient
 from sqlmodel import Session
 
 from app.core.config import settings
 from app.crud import ensure_user_exists
+from app.tests.utils.disbursements import create_disbursement
+from app.tests.utils.users import create_user
 
 
 def test_create_disbursement(
@@ -34,3 +40,143 @@ def test_create_disbursement(
     assert "owner_id" in body
     assert "updated_at" in body
     assert "created_at" in body
+
+
+def test_find_all_owned_pages_with_cursor(client: TestClient) -> None:
+    user_id, headers = create_user(client)
+    created = [
+        create_disbursement(client, headers, user_id, user_id)["id"] for _ in range(3)
+    ]
+
+    seen: list[str] = []
+    params: dict[str, Any] = {"limit": 2}
+    while True:
+        r = client.get(
+            f"{settings.API_V1_STR}/disbursements/", headers=headers, params=params
+        )
+        assert r.status_code == 200
+        body = r.json()
+        seen += [d["id"] for d in body["data"]]
+        if body["next_cursor"] is None:
+            break
+        params["cursor"] = body["next_cursor"]
+
+    assert seen == list(reversed(created))
+
+
+def test_find_all_owned_rejects_invalid_cursor(
+    client: TestClient, user_token_headers: dict[str, str]
+) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/disbursements/",
+        headers=user_token_headers,
+        params={"cursor": "not-a-cursor"},
+    )
+    assert r.status_code == 422
+
+
+def test_find_all_with_user_only_lists_disbursements_between_both(
+    client: TestClient,
+) -> None:
+    me, headers = create_user(client)
+    other, _ = create_user(client)
+    third, _ = create_user(client)
+    between = create_disbursement(client, headers, me, other)
+    create_disbursement(client, headers, me, third)
+
+    r = client.get(
+        f"{settings.API_V1_STR}/disbursements/users/{other}", headers=headers
+    )
+    assert [d["id"] for d in r.json()["data"]] == [between["id"]]
+
+
+def test_create_bulk_creates_all_disbursements_in_order(client: TestClient) -> None:
+    me, headers = create_user(client)
+    other, _ = create_user(client)
+    data = [
+        {
+            "amount_paid": {"amount": amount, "currency": "EUR"},
+            "paying_party_id": me,
+            "on_behalf_of_party_id": other,
+        }
+        for amount in [1.0, 2.0, 3.0]
+    ]
+
+    r = client.post(
+        f"{settings.API_V1_STR}/disbursements/bulk", headers=headers, json=data
+    )
+
+    assert r.status_code == 201
+    assert [d["amount_paid"]["amount"] for d in r.json()] == [1.0, 2.0, 3.0]
+    r = client.get(f"{settings.API_V1_STR}/balances/{other}", headers=headers)
+    assert r.json()["data"][0]["balance"]["amount"] == 6
+
+
+def test_create_bulk_enforces_batch_size(client: TestClient) -> None:
+    me, headers = create_user(client)
+    item = {
+        "amount_paid": {"amount": 1.0, "currency": "EUR"},
+        "paying_party_id": me,
+        "on_behalf_of_party_id": me,
+    }
+
+    for size in [0, settings.DISBURSEMENTS_BULK_MAX_SIZE + 1]:
+        r = client.post(
+            f"{settings.API_V1_STR}/disbursements/bulk",
+            headers=headers,
+            json=[item] * size,
+        )
+        assert r.status_code == 422
+
+
+def test_find_all_owned_revalidates_with_etag(client: TestClient) -> None:
+    me, headers = create_user(client)
+    other, _ = create_user(client)
+    first = create_disbursement(client, headers, me, other, amount=1)
+    url = f"{settings.API_V1_STR}/disbursements/"
+
+    r = client.get(url, headers=headers)
+    etag = r.headers["etag"]
+    r = client.get(url, headers={**headers, "If-None-Match": etag})
+    assert r.status_code == 304
+    assert r.headers["etag"] == etag
+    assert r.content == b""
+
+    create_disbursement(client, headers, me, other, amount=2)
+    r = client.get(url, headers={**headers, "If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.headers["etag"] != etag
+
+    r = client.get(f"{url}{first['id']}", headers=headers)
+    etag = r.headers["etag"]
+    client.delete(f"{url}{first['id']}", headers=headers)
+    r = client.get(f"{url}{first['id']}", headers={**headers, "If-None-Match": etag})
+    assert r.status_code == 404
+
+
+def test_export_streams_all_live_disbursements(
+    client: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(settings, "EXPORT_BATCH_SIZE", 2)
+    me, headers = create_user(client)
+    other, _ = create_user(client)
+    created = [
+        create_disbursement(client, headers, me, other, amount=i)["id"]
+        for i in range(1, 6)
+    ]
+    client.delete(f"{settings.API_V1_STR}/disbursements/{created[0]}", headers=headers)
+    url = f"{settings.API_V1_STR}/disbursements/export"
+
+    r = client.get(url, headers=headers)
+    assert r.status_code == 200
+    assert r.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in r.text.splitlines()]
+    assert [d["id"] for d in lines] == list(reversed(created[1:]))
+    assert lines[0]["amount_paid"] == {"amount": 5.0, "currency": "EUR"}
+
+    r = client.get(url, headers=headers, params={"format": "csv"})
+    assert r.headers["content-type"] == "text/csv; charset=utf-8"
+    header, *rows = csv.reader(io.StringIO(r.text))
+    assert header[0] == "id"
+    assert [row[0] for row in rows] == list(reversed(created[1:]))
+    assert dict(zip(header, rows[0], strict=True))["amount"] == "5.0"
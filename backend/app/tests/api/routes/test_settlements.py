@@ -0,0 +1,248 @@
+import json
+from typing import Any
+
+from fastapi.testclient import TestClient
+from sqlmodel import Session, col, select
+
+from app.core.config import settings
+from app.core.db import engine
+from app.models import Disbursement
+from app.tests.utils.disbursements import create_disbursement
+from app.tests.utils.users import create_user
+
+
+def settle(
+    client: TestClient,
+    headers: dict[str, str],
+    sender: str,
+    receiver: str,
+    ids: list[str],
+    amount_paid: float,
+) -> Any:
+    return client.post(
+        f"{settings.API_V1_STR}/settlements/",
+        headers=headers,
+        json={
+            "settled_disbursement_ids": ids,
+            "receiving_party_id": receiver,
+            "sending_party_id": sender,
+            "settled_at": "2025-01-01T00:00:00Z",
+            "amount_paid": amount_paid,
+            "currency": "EUR",
+        },
+    )
+
+
+def test_create_settles_disbursements_once(client: TestClient) -> None:
+    me, headers = create_user(client)
+    other, other_headers = create_user(client)
+    ids = [create_disbursement(client, headers, me, other, amount=5)["id"]]
+    ids.append(create_disbursement(client, headers, me, other, amount=2)["id"])
+
+    r = settle(client, other_headers, other, me, ids, amount_paid=7)
+    assert r.status_code == 201
+
+    r = settle(client, other_headers, other, me, ids, amount_paid=7)
+    assert r.status_code == 422
+
+
+def test_create_conflicts_with_concurrent_settlement(client: TestClient) -> None:
+    me, headers = create_user(client)
+    other, other_headers = create_user(client)
+    id = create_disbursement(client, headers, me, other, amount=5)["id"]
+
+    with Session(engine) as concurrent:
+        # holds the row lock like a settlement that has not committed yet
+        concurrent.exec(
+            select(Disbursement).where(col(Disbursement.id) == id).with_for_update()
+        ).one()
+        r = settle(client, other_headers, other, me, [id], amount_paid=5)
+        concurrent.rollback()
+
+    assert r.status_code == 409
+    r = settle(client, other_headers, other, me, [id], amount_paid=5)
+    assert r.status_code == 201
+
+
+def test_settle_all_settles_open_disbursements_in_currency(client: TestClient) -> None:
+    me, headers = create_user(client)
+    other, other_headers = create_user(client)
+    create_disbursement(client, headers, me, other, amount=10)
+    create_disbursement(client, headers, other, me, amount=4)
+    create_disbursement(client, headers, me, other, amount=3, currency="JPY")
+    url = f"{settings.API_V1_STR}/settlements/settle-all/{me}"
+
+    r = client.post(url, headers=other_headers, params={"currency": "EUR"})
+
+    assert r.status_code == 201
+    body = r.json()
+    assert body["amount_paid"] == 6
+    assert body["sending_party_id"] == other
+    assert body["currency"] == "EUR"
+    r = client.get(f"{settings.API_V1_STR}/balances/{me}", headers=other_headers)
+    assert [b["balance"] for b in r.json()["data"]] == [
+        {"amount": -3, "currency": "JPY"}
+    ]
+    r = client.post(url, headers=other_headers, params={"currency": "EUR"})
+    assert r.status_code == 422
+
+
+def test_settle_all_only_settles_disbursements_before(client: TestClient) -> None:
+    me, headers = create_user(client)
+    other, other_headers = create_user(client)
+    first = create_disbursement(client, headers, me, other, amount=10)
+    create_disbursement(client, headers, me, other, amount=4)
+
+    r = client.post(
+        f"{settings.API_V1_STR}/settlements/settle-all/{me}",
+        headers=other_headers,
+        params={"currency": "EUR", "settled_before": first["created_at"]},
+    )
+    assert r.status_code == 422
+
+    r = client.post(
+        f"{settings.API_V1_STR}/settlements/settle-all/{me}",
+        headers=other_headers,
+        params={"currency": "EUR", "settled_before": "2999-01-01T00:00:00"},
+    )
+    assert r.json()["amount_paid"] == 14
+
+
+def test_quote_returns_amount_paid_per_currency(client: TestClient) -> None:
+    me, headers = create_user(client)
+    other, other_headers = create_user(client)
+    first = create_disbursement(client, headers, me, other, amount=10)
+    second = create_disbursement(client, headers, other, me, amount=4.5)
+    create_disbursement(client, headers, me, other, amount=3, currency="JPY")
+    url = f"{settings.API_V1_STR}/settlements/quote"
+
+    r = client.post(url, headers=other_headers, json={"receiving_party_id": me})
+    assert r.status_code == 200
+    assert r.json()["data"] == [
+        {"amount_paid": {"amount": 5.5, "currency": "EUR"}, "disbursement_count": 2},
+        {"amount_paid": {"amount": 3, "currency": "JPY"}, "disbursement_count": 1},
+    ]
+
+    ids = [first["id"], second["id"]]
+    r = client.post(
+        url,
+        headers=other_headers,
+        json={"receiving_party_id": me, "settled_disbursement_ids": ids},
+    )
+    [quoted] = r.json()["data"]
+    r = settle(client, other_headers, other, me, ids, quoted["amount_paid"]["amount"])
+    assert r.status_code == 201
+
+
+def test_quote_rejects_malformed_disbursement_ids(client: TestClient) -> None:
+    me, _ = create_user(client)
+    _, other_headers = create_user(client)
+
+    r = client.post(
+        f"{settings.API_V1_STR}/settlements/quote",
+        headers=other_headers,
+        json={"receiving_party_id": me, "settled_disbursement_ids": ["nope"]},
+    )
+
+    assert r.status_code == 422
+
+
+def test_create_rejects_disbursements_in_other_currencies(client: TestClient) -> None:
+    me, headers = create_user(client)
+    other, other_headers = create_user(client)
+    ids = [
+        create_disbursement(client, headers, me, other, amount=1)["id"],
+        create_disbursement(client, headers, me, other, amount=1, currency="JPY")["id"],
+    ]
+
+    r = settle(client, other_headers, other, me, ids, amount_paid=2)
+    assert r.status_code == 422
+
+
+def test_suggestions_minimize_transfers_within_group(client: TestClient) -> None:
+    me, headers = create_user(client)
+    second, _ = create_user(client)
+    third, _ = create_user(client)
+    # a chain of debts settles with a single transfer
+    create_disbursement(client, headers, me, second, amount=10)
+    create_disbursement(client, headers, second, third, amount=10)
+    create_disbursement(client, headers, me, third, amount=0.01)
+    url = f"{settings.API_V1_STR}/settlements/suggestions"
+
+    r = client.get(
+        url, headers=headers, params={"user_ids": [second, third], "currency": "EUR"}
+    )
+
+    assert r.status_code == 200
+    assert r.json()["data"] == [
+        {
+            "sending_party_id": third,
+            "receiving_party_id": me,
+            "amount_paid": {"amount": 10.01, "currency": "EUR"},
+        }
+    ]
+    stranger, _ = create_user(client)
+    r = client.get(
+        url, headers=headers, params={"user_ids": [stranger], "currency": "EUR"}
+    )
+    assert r.status_code == 422
+
+
+def test_include_disbursements_embeds_settled_disbursements(
+    client: TestClient,
+) -> None:
+    me, headers = create_user(client)
+    other, other_headers = create_user(client)
+    ids = [
+        create_disbursement(client, headers, me, other, amount=amount)["id"]
+        for amount in [1, 2]
+    ]
+    id = settle(client, other_headers, other, me, ids, amount_paid=3).json()["id"]
+    url = f"{settings.API_V1_STR}/settlements/"
+
+    r = client.get(f"{url}{id}", headers=other_headers)
+    assert r.json()["settled_disbursements"] is None
+
+    r = client.get(
+        f"{url}{id}", headers=other_headers, params={"include": "disbursements"}
+    )
+    assert sorted(d["id"] for d in r.json()["settled_disbursements"]) == sorted(ids)
+
+    r = client.get(url, headers=other_headers, params={"include": "disbursements"})
+    [settlement] = r.json()["data"]
+    assert len(settlement["settled_disbursements"]) == 2
+
+
+def test_find_one_revalidates_with_etag(client: TestClient) -> None:
+    me, headers = create_user(client)
+    other, other_headers = create_user(client)
+    ids = [create_disbursement(client, headers, me, other, amount=1)["id"]]
+    id = settle(client, other_headers, other, me, ids, amount_paid=1).json()["id"]
+    url = f"{settings.API_V1_STR}/settlements/{id}"
+
+    r = client.get(url, headers=other_headers)
+    etag = r.headers["etag"]
+    r = client.get(url, headers={**other_headers, "If-None-Match": f"W/{etag}"})
+    assert r.status_code == 304
+
+    # embedding disbursements is a different representation
+    params = {"include": "disbursements"}
+    r = client.get(url, headers={**other_headers, "If-None-Match": etag}, params=params)
+    assert r.status_code == 200
+    assert r.headers["etag"] != etag
+
+
+def test_export_streams_settlements_without_disbursements(client: TestClient) -> None:
+    me, headers = create_user(client)
+    other, other_headers = create_user(client)
+    ids = [create_disbursement(client, headers, me, other, amount=4)["id"]]
+    settlement = settle(client, other_headers, other, me, ids, 4)
+    assert settlement.status_code == 201
+
+    r = client.get(f"{settings.API_V1_STR}/settlements/export", headers=other_headers)
+
+    assert r.status_code == 200
+    [line] = r.text.splitlines()
+    exported = json.loads(line)
+    assert exported["id"] == settlement.json()["id"]
+    assert exported["settled_disbursements"] is None
@@ -0,0 +1,68 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.tests.utils.auth import auth_headers
+from app.tests.utils.users import create_user
+
+
+def test_db_pool_status_for_admins(
+    client: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    _, headers = create_user(client)
+    monkeypatch.setattr(settings, "ADMIN_CLERK_USER_IDS", ["user_admin"])
+    url = f"{settings.API_V1_STR}/utils/db-pool/"
+
+    assert client.get(url).status_code == 403
+    assert client.get(url, headers=headers).status_code == 403
+    r = client.get(url, headers=auth_headers("user_admin"))
+    assert r.status_code == 200
+    body = r.json()
+    assert body["size"] == settings.DB_POOL_SIZE
+    assert body["checked_out"] >= 0
+    assert body["checkouts"] >= body["timeouts"]
+
+
+def test_metrics_require_the_scrape_token(
+    client: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    _, headers = create_user(client)
+    url = f"{settings.API_V1_STR}/utils/metrics/"
+
+    assert client.get(url, headers=headers).status_code == 403
+    monkeypatch.setattr(settings, "METRICS_SCRAPE_TOKEN", "scrape")
+    assert client.get(url, headers=headers).status_code == 403
+    r = client.get(url, headers={"Authorization": "Bearer scrape"})
+    assert r.status_code == 200
+
+
+def test_metrics_per_operation(
+    client: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    _, headers = create_user(client)
+    monkeypatch.setattr(settings, "METRICS_SCRAPE_TOKEN", "scrape")
+    client.get(f"{settings.API_V1_STR}/disbursements/", headers=headers)
+
+    r = client.get(
+        f"{settings.API_V1_STR}/utils/metrics/",
+        headers={"Authorization": "Bearer scrape"},
+    )
+
+    assert r.status_code == 200
+    lines = r.text.splitlines()
+    assert "# TYPE http_request_duration_seconds histogram" in lines
+    operation = 'operation="disbursements-find_all_owned"'
+    assert f'http_requests_total{{{operation},status="200"}}' in r.text
+    [statements] = [
+        line
+        for line in lines
+        if line.startswith(f"http_request_db_statements_count{{{operation}}}")
+    ]
+    assert int(statements.split()[-1]) >= 1
+    assert (
+        'http_request_db_statements_bucket{operation="disbursements-find_all_owned",le="+Inf"}'
+        in r.text
+    )
+    assert 'jwt_verification_duration_seconds_count{cached="true"}' in r.text
+    assert 'db_pool_connections{state="size"}' in r.text
+    assert "db_pool_checkouts_total " in r.text
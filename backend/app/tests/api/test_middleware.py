@@ -0,0 +1,97 @@
+import json
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.core.db import QueryBudget, QueryBudgetExceeded, RequestDbStats
+from app.tests.api.routes.test_settlements import settle
+from app.tests.utils.disbursements import create_disbursement
+from app.tests.utils.users import create_user
+
+
+def test_reports_db_time_in_server_timing(client: TestClient) -> None:
+    _, headers = create_user(client)
+
+    r = client.get(f"{settings.API_V1_STR}/disbursements/", headers=headers)
+
+    db, app = r.headers["server-timing"].split(", ")
+    assert db.startswith("db;dur=")
+    assert "statements" in db
+    assert app.startswith("app;dur=")
+
+
+def test_fails_requests_over_their_query_budget(
+    client: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    _, headers = create_user(client)
+    monkeypatch.setattr(
+        settings, "QUERY_BUDGET_OVERRIDES", {"disbursements-find_all_owned": 1}
+    )
+
+    with pytest.raises(QueryBudgetExceeded, match="exceed the budget of 1"):
+        client.get(f"{settings.API_V1_STR}/disbursements/", headers=headers)
+
+
+def test_reports_repeated_statements_as_n_plus_one() -> None:
+    stats = RequestDbStats(statements=4)
+    stats.repeats.update({"SELECT a": 1, "SELECT b WHERE id = %(id)s": 3})
+
+    [violation] = stats.budget_violations(QueryBudget(max_statements=10, max_repeats=2))
+
+    assert violation.startswith("3 executions of the same statement")
+    assert violation.endswith("SELECT b WHERE id = %(id)s")
+
+
+def test_profiles_requests_on_demand(
+    client: TestClient, monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    monkeypatch.setattr(settings, "PROFILING_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "PROFILING_TOKEN", "secret")
+    # samples even a fast request
+    monkeypatch.setattr(settings, "PROFILING_INTERVAL_MS", 0.1)
+    me, headers = create_user(client)
+    other, other_headers = create_user(client)
+    ids = [create_disbursement(client, headers, me, other, amount=1)["id"]]
+    health_check = f"{settings.API_V1_STR}/utils/health-check/"
+    assert "x-profile" not in client.get(health_check).headers
+    assert (
+        "x-profile"
+        not in client.get(health_check, headers={"X-Profile": "guess"}).headers
+    )
+
+    r = settle(client, {**other_headers, "X-Profile": "secret"}, other, me, ids, 1)
+
+    assert r.status_code == 201
+    folded = tmp_path / r.headers["x-profile"]
+    stacks = folded.read_text().splitlines()
+    assert stacks
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in stacks)
+    breakdown = json.loads(folded.with_suffix(".json").read_text())
+    assert breakdown["method"] == "POST"
+    assert breakdown["wall_ms"] > 0
+    assert breakdown["sampled_ms"]
+    assert set(breakdown["sampled_ms"]) <= {
+        "auth",
+        "repository",
+        "serialization",
+        "other",
+    }
+
+
+def test_keeps_the_newest_profiles(
+    client: TestClient, monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    monkeypatch.setattr(settings, "PROFILING_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "PROFILING_TOKEN", "secret")
+    monkeypatch.setattr(settings, "PROFILING_MAX_FILES", 2)
+    long_path = f"{settings.API_V1_STR}/utils/health-check/{'x' * 1000}"
+
+    names = [
+        client.get(long_path, headers={"X-Profile": "secret"}).headers["x-profile"]
+        for _ in range(3)
+    ]
+
+    assert all(len(name) < 255 for name in names)
+    assert sorted(p.name for p in tmp_path.glob("*.folded")) == names[1:]
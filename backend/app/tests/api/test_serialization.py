@@ -0,0 +1,84 @@
+import json
+import uuid
+from datetime import datetime
+
+from app.api.serialization import (
+    disbursement_json,
+    disbursements_adapter,
+    settlement_json,
+    settlements_adapter,
+)
+from app.core.repos.disbursements_repo import DisbursementRow
+from app.core.repos.settlements_repo import SettlementRow
+from app.models import (
+    Disbursement,
+    DisbursementPublic,
+    DisbursementsPublic,
+    SettlementPublic,
+    SettlementsPublic,
+)
+
+
+def make_disbursement() -> DisbursementRow:
+    user_id = uuid.uuid4()
+    return DisbursementRow(
+        id=uuid.uuid4(),
+        owner_id=user_id,
+        paying_party_id=user_id,
+        on_behalf_of_party_id=uuid.uuid4(),
+        comment=None,
+        created_at=datetime(2025, 1, 1, 12, 30, 0, 123456),
+        updated_at=datetime(2025, 1, 2),
+        amount=10.5,
+        currency="EUR",
+    )
+
+
+def test_disbursements_match_public_model() -> None:
+    d = make_disbursement()
+
+    fast = disbursements_adapter.dump_json(
+        {"data": [disbursement_json(d)], "total": 1, "next_cursor": "abc"}
+    )
+    public = DisbursementsPublic(
+        data=[DisbursementPublic.make(Disbursement(**d._asdict()))],
+        total=1,
+        next_cursor="abc",
+    )
+
+    assert list(json.loads(fast).items()) == list(
+        json.loads(public.model_dump_json()).items()
+    )
+
+
+def test_settlements_match_public_model() -> None:
+    d = make_disbursement()
+    s = SettlementRow(
+        id=uuid.uuid4(),
+        owner_id=d.on_behalf_of_party_id,
+        receiving_party_id=d.paying_party_id,
+        sending_party_id=d.on_behalf_of_party_id,
+        amount_paid=10.5,
+        currency="EUR",
+        settled_at=datetime(2025, 1, 3),
+        created_at=datetime(2025, 1, 3),
+        updated_at=datetime(2025, 1, 3),
+    )
+
+    fast = settlements_adapter.dump_json(
+        {"data": [settlement_json(s, [d])], "total": 1, "next_cursor": None}
+    )
+    public = SettlementsPublic(
+        data=[
+            SettlementPublic(
+                **s._asdict(),
+                settled_disbursements=[
+                    DisbursementPublic.make(Disbursement(**d._asdict()))
+                ],
+            )
+        ],
+        total=1,
+        next_cursor=None,
+    )
+
+    assert json.loads(fast) == json.loads(public.model_dump_json())
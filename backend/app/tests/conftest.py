@@ -4,10 +4,15 @@ import pytest
 from fastapi.testclient import TestClient
 from sqlmodel import Session, delete
 
+from app.core.auth import oidc
+from app.core.auth.jwks import JwksKeyStore
 from app.core.config import settings
 from app.core.db import engine, init_db
 from app.main import app
 from app.models import User
+from app.tests.utils.auth import local_jwks, mint_token
+
+TEST_CLERK_USER_ID = "user_2uYtK90rO3HFzRhvuAU8GVBZeqR"
 
 
 @pytest.fixture(scope="session", autouse=True)
@@ -20,14 +25,42 @@ def db() -> Generator[Session, None, None]:
         session.commit()
 
 
+@pytest.fixture(scope="session")
+def anyio_backend() -> str:
+    return "asyncio"
+
+
 @pytest.fixture(scope="module")
 def client() -> Generator[TestClient, None, None]:
     with TestClient(app) as c:
         yield c
 
 
+@pytest.fixture(scope="session", autouse=True)
+def local_key_store() -> Generator[JwksKeyStore, None, None]:
+    # without a TEST_JWT issued by Clerk, tests sign their own tokens against a local JWKS
+    if settings.TEST_JWT:
+        yield oidc.key_store
+        return
+    original = oidc.key_store
+    oidc.key_store = JwksKeyStore(
+        local_jwks, ttl_seconds=3600, min_refresh_interval_seconds=0
+    )
+    yield oidc.key_store
+    oidc.key_store = original
+
+
+@pytest.fixture(scope="session", autouse=True)
+def enforce_query_budget() -> Generator[None, None, None]:
+    # requests over their query budget, e.g. through lazy loading in a loop, fail the test
+    original = settings.QUERY_BUDGET_MODE
+    settings.QUERY_BUDGET_MODE = "raise"
+    yield
+    settings.QUERY_BUDGET_MODE = original
+
+
 @pytest.fixture(scope="module")
 def user_token_headers() -> dict[str, str]:
-    token = settings.TEST_JWT
+    token = settings.TEST_JWT or mint_token(TEST_CLERK_USER_ID)
     headers = {"Authorization": f"Bearer {token}"}
     return headers
@@ -0,0 +1,58 @@
+from unittest.mock import patch
+
+from app.core.auth import oidc
+from app.core.cache import LruTtlCache
+from app.tests.utils.auth import mint_token
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_evicts_least_recently_used() -> None:
+    cache: LruTtlCache[str, int] = LruTtlCache(max_size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.stats.evictions == 1
+
+
+def test_entries_expire() -> None:
+    clock = FakeClock()
+    cache: LruTtlCache[str, int] = LruTtlCache(max_size=10, clock=clock)
+    cache.set("ttl", 1, ttl_seconds=5)
+    cache.set("absolute", 2, expires_at=1010)
+
+    clock.now = 1005
+    assert cache.get("ttl") is None
+    assert cache.get("absolute") == 2
+    clock.now = 1010
+    assert cache.get("absolute") is None
+    assert cache.stats.expirations == 2
+    assert cache.stats.hit_rate == 1 / 3
+
+
+def test_zero_max_size_disables_cache() -> None:
+    cache: LruTtlCache[str, int] = LruTtlCache(max_size=0)
+    cache.set("a", 1)
+    assert cache.get("a") is None
+
+
+def test_verify_token_skips_signature_check_for_known_tokens() -> None:
+    token = mint_token("user_token_cache")
+    oidc.token_cache.clear()
+
+    with patch.object(oidc, "decode_token", wraps=oidc.decode_token) as decode:
+        first = oidc.verify_token(token)
+        second = oidc.verify_token(token)
+
+    assert first == second
+    assert decode.call_count == 1
@@ -0,0 +1,104 @@
+import threading
+import time
+from typing import Any
+
+import pytest
+from jwt import PyJWKClientError
+
+from app.core.auth.jwks import JwksKeyStore
+from app.tests.utils.auth import TEST_KID, local_jwks
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class CountingFetcher:
+    def __init__(self, delay: float = 0.0) -> None:
+        self.calls = 0
+        self.fail = False
+        self.delay = delay
+
+    def __call__(self) -> dict[str, Any]:
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.fail:
+            raise PyJWKClientError("JWKS endpoint unreachable")
+        return local_jwks()
+
+
+def make_store(
+    fetch: CountingFetcher, clock: FakeClock, ttl: float = 60, min_interval: float = 10
+) -> JwksKeyStore:
+    return JwksKeyStore(
+        fetch, ttl_seconds=ttl, min_refresh_interval_seconds=min_interval, clock=clock
+    )
+
+
+def test_keys_are_cached_until_ttl() -> None:
+    fetch, clock = CountingFetcher(), FakeClock()
+    store = make_store(fetch, clock)
+
+    store.get_signing_key(TEST_KID)
+    store.get_signing_key(TEST_KID)
+    assert fetch.calls == 1
+    assert (store.stats.hits, store.stats.misses) == (1, 1)
+
+    clock.now = 61
+    store.get_signing_key(TEST_KID)
+    assert fetch.calls == 2
+    assert store.stats.refreshes == 2
+
+
+def test_unknown_kid_refreshes_at_most_once_per_interval() -> None:
+    fetch, clock = CountingFetcher(), FakeClock()
+    store = make_store(fetch, clock)
+    store.get_signing_key(TEST_KID)
+
+    clock.now = 20
+    with pytest.raises(PyJWKClientError):
+        store.get_signing_key("unknown-kid")
+    with pytest.raises(PyJWKClientError):
+        store.get_signing_key("unknown-kid")
+    assert fetch.calls == 2
+
+
+def test_serves_stale_keys_when_refresh_fails() -> None:
+    fetch, clock = CountingFetcher(), FakeClock()
+    store = make_store(fetch, clock)
+    store.get_signing_key(TEST_KID)
+
+    fetch.fail = True
+    clock.now = 61
+    assert store.get_signing_key(TEST_KID)
+    assert store.stats.refresh_failures == 1
+    assert store.stats.stale_serves == 1
+
+
+def test_raises_when_no_keys_could_be_fetched() -> None:
+    fetch, clock = CountingFetcher(), FakeClock()
+    fetch.fail = True
+    store = make_store(fetch, clock)
+
+    with pytest.raises(PyJWKClientError):
+        store.get_signing_key(TEST_KID)
+
+
+def test_concurrent_refreshes_share_one_fetch() -> None:
+    fetch = CountingFetcher(delay=0.05)
+    store = JwksKeyStore(fetch, ttl_seconds=60, min_refresh_interval_seconds=10)
+
+    threads = [
+        threading.Thread(target=store.get_signing_key, args=(TEST_KID,))
+        for _ in range(10)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert fetch.calls == 1
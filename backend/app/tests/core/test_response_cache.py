@@ -0,0 +1,139 @@
+import asyncio
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.requests import Request
+
+from app.core.config import settings
+from app.core.response_cache import (
+    CachedResponse,
+    MemoryCacheBackend,
+    RedisCacheBackend,
+    ResponseCache,
+    response_cache,
+)
+from app.tests.api.routes.test_settlements import settle
+from app.tests.utils.cache import FakeRedis
+from app.tests.utils.disbursements import create_disbursement
+from app.tests.utils.users import create_user
+
+
+def make_request(query: str = "") -> Request:
+    return Request(
+        {
+            "type": "http",
+            "method": "GET",
+            "path": "/api/v1/disbursements/",
+            "query_string": query.encode(),
+            "headers": [],
+        }
+    )
+
+
+class Loader:
+    def __init__(self, delay: float = 0) -> None:
+        self.calls = 0
+        self.delay = delay
+
+    async def __call__(self) -> CachedResponse:
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return CachedResponse(f'"{self.calls}"', b"[]")
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("backend", ["memory", "redis"])
+async def test_caches_per_user_and_query_until_invalidated(backend: str) -> None:
+    cache = ResponseCache(
+        MemoryCacheBackend(max_size=100)
+        if backend == "memory"
+        else RedisCacheBackend(FakeRedis()),
+        ttl_seconds=60,
+    )
+    me, other = uuid.uuid4(), uuid.uuid4()
+    load = Loader()
+
+    assert await cache.get_or_load(me, make_request("limit=1"), load) == ('"1"', b"[]")
+    assert await cache.get_or_load(me, make_request("limit=1"), load) == ('"1"', b"[]")
+    await cache.get_or_load(me, make_request("limit=2"), load)
+    await cache.get_or_load(other, make_request("limit=1"), load)
+    assert load.calls == 3
+
+    await cache.invalidate([me])
+    assert await cache.get_or_load(me, make_request("limit=1"), load) == ('"4"', b"[]")
+    assert (cache.stats.hits, cache.stats.misses) == (1, 4)
+
+
+@pytest.mark.anyio
+async def test_coalesces_concurrent_misses() -> None:
+    cache = ResponseCache(MemoryCacheBackend(max_size=100), ttl_seconds=60)
+    load = Loader(delay=0.05)
+    me = uuid.uuid4()
+
+    responses = await asyncio.gather(
+        *(cache.get_or_load(me, make_request(), load) for _ in range(5))
+    )
+
+    assert load.calls == 1
+    assert set(responses) == {CachedResponse('"1"', b"[]")}
+    assert (cache.stats.misses, cache.stats.coalesced) == (1, 4)
+
+
+@pytest.mark.anyio
+async def test_waiters_load_themselves_if_the_first_load_fails() -> None:
+    cache = ResponseCache(MemoryCacheBackend(max_size=100), ttl_seconds=60)
+    me = uuid.uuid4()
+
+    async def fail() -> CachedResponse:
+        await asyncio.sleep(0.05)
+        raise RuntimeError("database is down")
+
+    failing = asyncio.ensure_future(cache.get_or_load(me, make_request(), fail))
+    await asyncio.sleep(0)
+    waiting = cache.get_or_load(me, make_request(), Loader())
+
+    assert await waiting == CachedResponse('"1"', b"[]")
+    with pytest.raises(RuntimeError):
+        await failing
+
+
+@pytest.fixture
+def memory_cache(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(response_cache, "backend", MemoryCacheBackend(max_size=100))
+
+
+@pytest.mark.usefixtures("memory_cache")
+def test_settlement_invalidates_lists_of_both_parties(client: TestClient) -> None:
+    me, headers = create_user(client)
+    other, other_headers = create_user(client)
+    id = create_disbursement(client, headers, me, other, amount=5)["id"]
+    url = f"{settings.API_V1_STR}/disbursements/users/{me}"
+
+    r = client.get(url, headers=other_headers)
+    assert [d["id"] for d in r.json()["data"]] == [id]
+    hits = response_cache.stats.hits
+    r = client.get(url, headers=other_headers)
+    assert response_cache.stats.hits == hits + 1
+
+    settle(client, other_headers, other, me, [id], amount_paid=5)
+    r = client.get(url, headers=other_headers)
+    assert r.json()["data"] == []
+
+
+@pytest.mark.usefixtures("memory_cache")
+def test_conditional_request_on_a_miss_fills_the_cache(client: TestClient) -> None:
+    me, headers = create_user(client)
+    other, _ = create_user(client)
+    create_disbursement(client, headers, me, other, amount=5)
+    url = f"{settings.API_V1_STR}/disbursements/"
+    etag = client.get(url, headers=headers).headers["etag"]
+    # a new generation, as after a write that changed nothing the client sees
+    asyncio.run(response_cache.invalidate([uuid.UUID(me)]))
+
+    r = client.get(url, headers={**headers, "If-None-Match": etag})
+    assert r.status_code == 304
+    hits = response_cache.stats.hits
+    r = client.get(url, headers=headers)
+    assert r.status_code == 200
+    assert response_cache.stats.hits == hits + 1
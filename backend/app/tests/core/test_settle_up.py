@@ -0,0 +1,33 @@
+import random
+import uuid
+
+from app.core.settle_up import minimize_transfers
+
+
+def test_settles_every_balance_with_at_most_n_minus_one_transfers() -> None:
+    rng = random.Random(42)
+    balances = {uuid.uuid4(): rng.randint(-10_000, 10_000) / 100 for _ in range(50)}
+    balances[uuid.uuid4()] = -sum(balances.values())
+
+    transfers = minimize_transfers(balances)
+
+    assert len(transfers) <= len(balances) - 1
+    remaining = dict(balances)
+    for t in transfers:
+        assert t.amount > 0
+        remaining[t.sending_party_id] += t.amount
+        remaining[t.receiving_party_id] -= t.amount
+    assert all(abs(amount) < 0.01 for amount in remaining.values())
+
+
+def test_pays_largest_creditor_from_largest_debtor() -> None:
+    a, b, c = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+
+    transfers = minimize_transfers({a: 30, b: -20, c: -10})
+
+    assert [
+        (t.sending_party_id, t.receiving_party_id, t.amount) for t in transfers
+    ] == [
+        (b, a, 20),
+        (c, a, 10),
+    ]
@@ -0,0 +1,49 @@
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core import slow_query_log
+from app.core.config import settings
+from app.tests.utils.auth import auth_headers
+from app.tests.utils.users import create_user
+
+
+def test_parameter_shapes_hide_values() -> None:
+    assert slow_query_log.parameter_shapes({"owner_id": "x", "limit": 1}) == {
+        "owner_id": "str",
+        "limit": "int",
+    }
+    assert slow_query_log.parameter_shapes([{"id": 1}, {"id": 2}]) == {
+        "rows": 2,
+        "row": {"id": "int"},
+    }
+
+
+def test_records_slow_statements_with_plans_for_admins(
+    client: TestClient, monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    me, headers = create_user(client)
+    other, _ = create_user(client)
+    admin_headers = auth_headers("user_admin")
+    monkeypatch.setattr(settings, "ADMIN_CLERK_USER_IDS", ["user_admin"])
+    monkeypatch.setattr(settings, "SLOW_QUERY_LOG_PATH", str(tmp_path / "slow.jsonl"))
+    monkeypatch.setattr(settings, "SLOW_QUERY_THRESHOLD_MS", 1e-6)
+
+    client.get(f"{settings.API_V1_STR}/disbursements/users/{other}", headers=headers)
+    monkeypatch.setattr(settings, "SLOW_QUERY_THRESHOLD_MS", 0)
+    slow_query_log.wait_for_pending_plans()
+
+    url = f"{settings.API_V1_STR}/utils/slow-queries/"
+    assert client.get(url, headers=headers).status_code == 403
+    r = client.get(url, headers=admin_headers)
+    assert r.status_code == 200
+    [entry, *_] = [
+        e
+        for e in r.json()["data"]
+        if e["caller"] == "DisbursementsRepository.find_all_between"
+    ]
+    assert entry["statement"].startswith("SELECT")
+    assert "UUID" in entry["parameters"].values()
+    assert me not in str(entry["parameters"])
+    assert "actual time" in entry["plan"]
@@ -0,0 +1,114 @@
+import asyncio
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.core.db import ThreadedSession, engine
+from app.core.repos.disbursements_repo import DisbursementsRepository
+from app.core.repos.pair_balances_repo import PairBalancesRepository
+from app.models import PairBalance
+from app.tests.api.routes.test_settlements import settle
+from app.tests.utils.disbursements import create_disbursement
+from app.tests.utils.users import create_user
+
+
+@pytest.mark.anyio
+async def test_ledger_follows_disbursement_writes(
+    client: TestClient, db: Session
+) -> None:
+    repo = PairBalancesRepository(ThreadedSession(db))
+    me, headers = create_user(client)
+    other, other_headers = create_user(client)
+    paid_by_me = create_disbursement(client, headers, me, other, amount=10)
+    paid_by_other = create_disbursement(client, headers, other, me, amount=4)
+    deleted = create_disbursement(client, headers, other, me, amount=3)
+    client.delete(
+        f"{settings.API_V1_STR}/disbursements/{deleted['id']}", headers=headers
+    )
+
+    balances = await repo.find_for_user(uuid.UUID(me))
+    assert [(str(b.counterparty_id), b.amount) for b in balances] == [(other, 6)]
+
+    r = client.post(
+        f"{settings.API_V1_STR}/settlements/",
+        headers=other_headers,
+        json={
+            "settled_disbursement_ids": [paid_by_me["id"], paid_by_other["id"]],
+            "receiving_party_id": me,
+            "sending_party_id": other,
+            "settled_at": "2025-01-01T00:00:00Z",
+            "amount_paid": 6,
+            "currency": "EUR",
+        },
+    )
+    assert r.status_code == 201
+    db.expire_all()
+
+    assert await repo.find_for_user(uuid.UUID(me)) == []
+    assert await repo.find_drift([uuid.UUID(me), uuid.UUID(other)]) == []
+
+
+@pytest.mark.anyio
+async def test_rebuild_repairs_drift(client: TestClient, db: Session) -> None:
+    repo = PairBalancesRepository(ThreadedSession(db))
+    me, headers = create_user(client)
+    other, _ = create_user(client)
+    create_disbursement(client, headers, me, other, amount=10)
+    entry = db.exec(
+        select(PairBalance).where(
+            PairBalance.user_a_id == min(uuid.UUID(me), uuid.UUID(other))
+        )
+    ).one()
+    entry.amount += 1
+    db.add(entry)
+    db.commit()
+
+    users = [uuid.UUID(me), uuid.UUID(other)]
+    [drift] = await repo.find_drift(users)
+    assert (drift.recorded, drift.expected) == (entry.amount, entry.amount - 1)
+
+    await repo.rebuild()
+    assert await repo.find_drift(users) == []
+
+
+@pytest.mark.anyio
+async def test_rebuild_keeps_settled_counterparties(
+    client: TestClient, db: Session
+) -> None:
+    repo = PairBalancesRepository(ThreadedSession(db))
+    me, headers = create_user(client)
+    other, other_headers = create_user(client)
+    ids = [create_disbursement(client, headers, me, other, amount=10)["id"]]
+    assert settle(client, other_headers, other, me, ids, 10).status_code == 201
+    me_id, other_id = uuid.UUID(me), uuid.UUID(other)
+    assert await repo.find_counterparty_ids(me_id, [other_id]) == {other_id}
+
+    await repo.rebuild()
+
+    assert await repo.find_counterparty_ids(me_id, [other_id]) == {other_id}
+    assert await repo.find_for_user(me_id) == []
+
+
+@pytest.mark.anyio
+async def test_concurrent_deletes_change_the_ledger_once(client: TestClient) -> None:
+    me, headers = create_user(client)
+    other, _ = create_user(client)
+    create_disbursement(client, headers, me, other, amount=10)
+    deleted = create_disbursement(client, headers, me, other, amount=3)
+    id, owner_id = uuid.UUID(deleted["id"]), uuid.UUID(me)
+
+    with Session(engine) as first, Session(engine) as second:
+        results = await asyncio.gather(
+            DisbursementsRepository(ThreadedSession(first)).soft_delete(id, owner_id),
+            DisbursementsRepository(ThreadedSession(second)).soft_delete(id, owner_id),
+        )
+
+    assert sorted(results) == [False, True]
+    with Session(engine) as session:
+        repo = PairBalancesRepository(ThreadedSession(session))
+        assert await repo.find_drift([owner_id, uuid.UUID(other)]) == []
+        [balance] = await repo.find_for_user(owner_id)
+        assert balance.amount == 10
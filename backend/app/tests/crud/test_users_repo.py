@@ -0,0 +1,17 @@
+import pytest
+from sqlmodel import Session
+
+from app.core.db import ThreadedSession
+from app.core.repos.users_repo import UsersRepository
+from app.tests.utils.utils import random_lower_string
+
+
+@pytest.mark.anyio
+async def test_find_or_create_returns_existing_user(db: Session) -> None:
+    users = UsersRepository(ThreadedSession(db))
+    clerk_user_id = f"user_{random_lower_string()}"
+
+    created = await users.find_or_create(clerk_user_id=clerk_user_id)
+    found = await users.find_or_create(clerk_user_id=clerk_user_id)
+
+    assert created.id == found.id
@@ -0,0 +1,41 @@
+import json
+import time
+from functools import cache
+from typing import Any
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from app.core.config import settings
+
+TEST_KID = "test-kid"
+
+
+@cache
+def _private_key() -> rsa.RSAPrivateKey:
+    return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+
+def local_jwks() -> dict[str, Any]:
+    jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(_private_key().public_key()))
+    jwk.update({"kid": TEST_KID, "use": "sig", "alg": "RS256"})
+    return {"keys": [jwk]}
+
+
+def mint_token(sub: str, expires_in: int = 3600, kid: str = TEST_KID) -> str:
+    now = int(time.time())
+    claims = {
+        "azp": "http://localhost:5173",
+        "exp": now + expires_in,
+        "fva": [0, -1],
+        "iat": now,
+        "iss": settings.CLERK_ISSUER,
+        "nbf": now - 10,
+        "sid": "sess_test",
+        "sub": sub,
+    }
+    return jwt.encode(claims, _private_key(), algorithm="RS256", headers={"kid": kid})
+
+
+def auth_headers(sub: str) -> dict[str, str]:
+    return {"Authorization": f"Bearer {mint_token(sub)}"}
@@ -0,0 +1,30 @@
+import time
+
+
+class FakeRedis:
+    """In-memory stand-in for the subset of `redis.asyncio.Redis` that the response cache uses."""
+
+    def __init__(self) -> None:
+        self.entries: dict[str, tuple[bytes, float | None]] = {}
+
+    async def get(self, name: str) -> bytes | None:
+        entry = self.entries.get(name)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self.entries[name]
+            return None
+        return value
+
+    async def set(
+        self, name: str, value: bytes, px: int | None = None, nx: bool = False
+    ) -> bool | None:
+        if nx and await self.get(name) is not None:
+            return None
+        expires_at = None if px is None else time.monotonic() + px / 1000
+        self.entries[name] = (value, expires_at)
+        return True
+
+    async def delete(self, *names: str) -> int:
+        return sum(self.entries.pop(name, None) is not None for name in names)
@@ -0,0 +1,27 @@
+from typing import Any
+
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+
+
+def create_disbursement(
+    client: TestClient,
+    headers: dict[str, str],
+    paying_party_id: str,
+    on_behalf_of_party_id: str,
+    amount: float = 1.0,
+    currency: str = "EUR",
+) -> dict[str, Any]:
+    response = client.post(
+        f"{settings.API_V1_STR}/disbursements/",
+        headers=headers,
+        json={
+            "amount_paid": {"amount": amount, "currency": currency},
+            "paying_party_id": paying_party_id,
+            "on_behalf_of_party_id": on_behalf_of_party_id,
+        },
+    )
+    assert response.status_code == 201
+    body: dict[str, Any] = response.json()
+    return body
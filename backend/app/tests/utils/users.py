@@ -0,0 +1,12 @@
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.tests.utils.auth import auth_headers
+from app.tests.utils.utils import random_lower_string
+
+
+def create_user(client: TestClient) -> tuple[str, dict[str, str]]:
+    """Signs in a new user. Returns the user id and the headers to authenticate as the user."""
+    headers = auth_headers(f"user_{random_lower_string()}")
+    r = client.get(f"{settings.API_V1_STR}/users/me", headers=headers)
+    return r.json()["id"], headers
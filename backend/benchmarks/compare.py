@@ -0,0 +1,51 @@
+"""
+Compares two result files of the same benchmark, e.g. of two commits.
+
+    python -m benchmarks.compare benchmarks/results/load-<before>.json benchmarks/results/load-<after>.json
+
+Prints every number of the results side by side with the relative change.
+"""
+
+import argparse
+import json
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Any
+
+
+def flatten(results: Any, prefix: str = "") -> Iterator[tuple[str, float]]:
+    if isinstance(results, dict):
+        for key, value in results.items():
+            yield from flatten(value, f"{prefix}.{key}" if prefix else key)
+    elif isinstance(results, int | float) and not isinstance(results, bool):
+        yield prefix, float(results)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("before", type=Path)
+    parser.add_argument("after", type=Path)
+    args = parser.parse_args()
+    before, after = (json.loads(p.read_text()) for p in (args.before, args.after))
+    if before["benchmark"] != after["benchmark"]:
+        parser.error("the files are results of different benchmarks")
+    print(f"before: {before['commit'][:10]} {before['created_at']}")
+    print(f"after:  {after['commit'][:10]} {after['created_at']}")
+    old = dict(flatten(before["results"]))
+    new = dict(flatten(after["results"]))
+    width = max(map(len, old | new), default=10)
+    for key in sorted(old.keys() | new.keys()):
+        old_value, new_value = old.get(key), new.get(key)
+        change = (
+            f"{(new_value - old_value) / old_value * 100:+8.1f}%"
+            if old_value and new_value is not None
+            else ""
+        )
+        print(
+            f"{key:<{width}} {'' if old_value is None else f'{old_value:12.3f}':>12} "
+            f"{'' if new_value is None else f'{new_value:12.3f}':>12} {change}"
+        )
+
+
+if __name__ == "__main__":
+    main()
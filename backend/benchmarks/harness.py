@@ -0,0 +1,109 @@
+"""
+Timing helpers and the JSON result files shared by the benchmarks.
+
+Results are stored in benchmarks/results, one file per run, stamped with the commit they ran on.
+Compare two runs with `python -m benchmarks.compare <before.json> <after.json>`.
+"""
+
+import json
+import platform
+import subprocess
+import time
+from collections.abc import Awaitable, Callable, Sequence
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+from app.core.config import settings
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+
+def percentile(sorted_values: Sequence[float], q: float) -> float:
+    """Nearest-rank percentile of already sorted values, `q` between 0 and 100."""
+    if not sorted_values:
+        return float("nan")
+    rank = max(round(q / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def summarize(seconds: Sequence[float]) -> dict[str, float]:
+    """Count, mean and percentiles of the timings, in milliseconds."""
+    ordered = sorted(seconds)
+    return {
+        "count": len(ordered),
+        "mean_ms": sum(ordered) / len(ordered) * 1000 if ordered else float("nan"),
+        "p50_ms": percentile(ordered, 50) * 1000,
+        "p95_ms": percentile(ordered, 95) * 1000,
+        "p99_ms": percentile(ordered, 99) * 1000,
+    }
+
+
+def time_calls(run: Callable[[], object], rounds: int) -> list[float]:
+    run()  # warm up
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+async def time_async_calls(
+    run: Callable[[], Awaitable[object]], rounds: int
+) -> list[float]:
+    await run()  # warm up
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        await run()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+TIMING_COLUMNS = {"count": ".0f", "p50_ms": ".3f", "p95_ms": ".3f", "p99_ms": ".3f"}
+
+
+def print_table(
+    rows: dict[str, dict[str, float]], columns: dict[str, str] = TIMING_COLUMNS
+) -> None:
+    """Prints the `columns` of the rows, with the format spec of each column."""
+    width = max(map(len, rows), default=10)
+    print(" ".join([f"{'':<{width}}", *(f"{column:>10}" for column in columns)]))
+    for name, row in rows.items():
+        cells = (f"{row[column]:>10{spec}}" for column, spec in columns.items())
+        print(" ".join([f"{name:<{width}}", *cells]))
+
+
+def _git(*args: str) -> str:
+    try:
+        return subprocess.run(
+            ["git", *args], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def save_results(benchmark: str, results: dict[str, Any]) -> Path:
+    """Writes the results with the commit, the machine and the relevant settings. Returns the file."""
+    commit = _git("rev-parse", "HEAD") or "unknown"
+    now = datetime.now(timezone.utc)
+    document = {
+        "benchmark": benchmark,
+        "commit": commit,
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "created_at": now.isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "settings": {
+            "DB_MODE": settings.DB_MODE,
+            "DB_POOL_SIZE": settings.DB_POOL_SIZE,
+            "RESPONSE_CACHE_BACKEND": settings.RESPONSE_CACHE_BACKEND,
+            "QUERY_BUDGET_MODE": settings.QUERY_BUDGET_MODE,
+        },
+        "results": results,
+    }
+    RESULTS_DIR.mkdir(exist_ok=True)
+    path = RESULTS_DIR / f"{benchmark}-{now:%Y%m%dT%H%M%S}-{commit[:10]}.json"
+    path.write_text(json.dumps(document, indent=2))
+    return path
@@ -0,0 +1,215 @@
+"""
+Scripted load against the app, in-process through httpx's ASGITransport, with tokens signed for a local JWKS.
+
+    python -m benchmarks.load --users 100 --concurrency 20 --duration 30
+    python -m benchmarks.load --save        # stores the results in benchmarks/results
+
+The virtual users are the seeded users `bench_<n>` (see benchmarks.seed). Each worker plays one of them at a time
+and loops over SCENARIO, a weighted mix of reads and writes, until the duration is over.
+Reports p50/p95/p99 latency and throughput per endpoint.
+
+Client and app share one event loop and there is no network in between, so the numbers cover the app,
+the threadpool and the database, not the ASGI server. The created disbursements stay in the database.
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from collections import defaultdict
+from collections.abc import Callable
+from typing import Any, NamedTuple
+
+import httpx
+
+from app.core.auth import oidc
+from app.core.auth.jwks import JwksKeyStore
+from app.core.config import settings
+from app.core.db import dispose_engines
+from app.main import app
+from app.tests.utils.auth import auth_headers, local_jwks
+from benchmarks.harness import TIMING_COLUMNS, print_table, save_results, summarize
+from benchmarks.seed import CLERK_USER_ID_PREFIX
+
+
+class VirtualUser(NamedTuple):
+    id: str
+    headers: dict[str, str]
+    counterparty_ids: list[str]
+
+
+class Request(NamedTuple):
+    method: str
+    url: str
+    json: dict[str, Any] | None = None
+    params: dict[str, Any] | None = None
+
+
+def create_disbursement(user: VirtualUser, rng: random.Random) -> Request:
+    return Request(
+        "POST",
+        "/disbursements/",
+        json={
+            "paying_party_id": user.id,
+            "on_behalf_of_party_id": rng.choice(user.counterparty_ids),
+            "amount_paid": {
+                "amount": rng.randint(100, 10_000) / 100,
+                "currency": "EUR",
+            },
+            "comment": "benchmarks.load",
+        },
+    )
+
+
+# name, weight and request of each endpoint, names are the operation ids of the routes
+SCENARIO: list[tuple[str, int, Callable[[VirtualUser, random.Random], Request]]] = [
+    (
+        "disbursements-find_all_owned",
+        30,
+        lambda u, rng: Request("GET", "/disbursements/", params={"limit": 20}),
+    ),
+    (
+        "disbursements-find_all_with_user",
+        15,
+        lambda u, rng: Request(
+            "GET",
+            f"/disbursements/users/{rng.choice(u.counterparty_ids)}",
+            params={"limit": 20},
+        ),
+    ),
+    (
+        "settlements-find_all_owned",
+        10,
+        lambda u, rng: Request("GET", "/settlements/", params={"limit": 20}),
+    ),
+    ("balances-find_all", 20, lambda u, rng: Request("GET", "/balances/")),
+    ("disbursements-create", 15, create_disbursement),
+    (
+        "settlements-quote",
+        5,
+        lambda u, rng: Request(
+            "POST",
+            "/settlements/quote",
+            json={"receiving_party_id": rng.choice(u.counterparty_ids)},
+        ),
+    ),
+    (
+        "settlements-suggestions",
+        5,
+        lambda u, rng: Request(
+            "GET",
+            "/settlements/suggestions",
+            params={"user_ids": u.counterparty_ids, "currency": "EUR"},
+        ),
+    ),
+]
+
+
+async def sign_in(client: httpx.AsyncClient, n: int) -> VirtualUser | None:
+    headers = auth_headers(f"{CLERK_USER_ID_PREFIX}{n}")
+    me = (await client.get("/users/me", headers=headers)).raise_for_status().json()
+    balances = (
+        (await client.get("/balances/", headers=headers)).raise_for_status().json()
+    )
+    counterparty_ids = sorted({b["counterparty_id"] for b in balances["data"]})
+    if not counterparty_ids:
+        return None
+    return VirtualUser(me["id"], headers, counterparty_ids)
+
+
+async def worker(
+    client: httpx.AsyncClient,
+    users: list[VirtualUser],
+    rng: random.Random,
+    deadline: float,
+    timings: dict[str, list[float]],
+    errors: dict[str, int],
+) -> None:
+    names = [name for name, _, _ in SCENARIO]
+    weights = [weight for _, weight, _ in SCENARIO]
+    make_requests = {name: make for name, _, make in SCENARIO}
+    while time.perf_counter() < deadline:
+        user = rng.choice(users)
+        [name] = rng.choices(names, weights)
+        request = make_requests[name](user, rng)
+        start = time.perf_counter()
+        r = await client.request(
+            request.method,
+            request.url,
+            json=request.json,
+            params=request.params,
+            headers=user.headers,
+        )
+        timings[name].append(time.perf_counter() - start)
+        if r.is_error:
+            errors[name] += 1
+
+
+async def run(
+    users: int, concurrency: int, duration: float, seed: int
+) -> dict[str, Any]:
+    oidc.key_store = JwksKeyStore(
+        local_jwks, ttl_seconds=3600, min_refresh_interval_seconds=0
+    )
+    transport = httpx.ASGITransport(app=app)
+    base_url = f"http://load{settings.API_V1_STR}"
+    timings: dict[str, list[float]] = defaultdict(list)
+    errors: dict[str, int] = defaultdict(int)
+    async with httpx.AsyncClient(transport=transport, base_url=base_url) as client:
+        signed_in = [await sign_in(client, n) for n in range(users)]
+        virtual_users = [u for u in signed_in if u is not None]
+        if not virtual_users:
+            raise SystemExit("No seeded data, run `python -m benchmarks.seed` first")
+        start = time.perf_counter()
+        deadline = start + duration
+        await asyncio.gather(
+            *(
+                worker(
+                    client,
+                    virtual_users,
+                    random.Random(f"{seed}-{i}"),
+                    deadline,
+                    timings,
+                    errors,
+                )
+                for i in range(concurrency)
+            )
+        )
+        elapsed = time.perf_counter() - start
+    await dispose_engines()
+    endpoints = {
+        name: summarize(seconds)
+        | {"errors": errors[name], "requests_per_second": len(seconds) / elapsed}
+        for name, seconds in sorted(timings.items())
+    }
+    everything = [s for seconds in timings.values() for s in seconds]
+    return {
+        "virtual_users": len(virtual_users),
+        "concurrency": concurrency,
+        "duration_seconds": elapsed,
+        "total": summarize(everything)
+        | {
+            "errors": sum(errors.values()),
+            "requests_per_second": len(everything) / elapsed,
+        },
+        "endpoints": endpoints,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=100, help="virtual users")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=30, help="seconds")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save", action="store_true", help="store the results")
+    args = parser.parse_args()
+    results = asyncio.run(run(args.users, args.concurrency, args.duration, args.seed))
+    rows = results["endpoints"] | {"total": results["total"]}
+    print_table(rows, TIMING_COLUMNS | {"errors": ".0f", "requests_per_second": ".1f"})
+    if args.save:
+        print(f"saved {save_results('load', results)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""
+Microbenchmarks of the hot paths: DisbursementPublic.make, verify_token and the repository methods.
+
+    python -m benchmarks.micro                  # without the database
+    python -m benchmarks.micro --db             # plus the read methods of the repositories
+    python -m benchmarks.micro --db --writes    # plus the write methods, which leave soft-deleted rows behind
+    python -m benchmarks.micro --db --save      # stores the results in benchmarks/results
+
+The repository methods run against the seeded user `bench_0` (see benchmarks.seed) and its first counterparty,
+through the session of the configured DB_MODE, like in a request.
+"""
+
+import argparse
+import asyncio
+import uuid
+from collections.abc import Awaitable, Callable
+from datetime import datetime
+
+from sqlmodel import select
+
+from app.core.auth import oidc
+from app.core.auth.jwks import JwksKeyStore
+from app.core.db import DbSession, open_session
+from app.core.repos.disbursements_repo import DisbursementsRepository
+from app.core.repos.pair_balances_repo import PairBalancesRepository
+from app.core.repos.settlements_repo import SettlementsRepository
+from app.core.repos.users_repo import UsersRepository
+from app.models import Disbursement, DisbursementPublic, Settlement, User
+from app.tests.utils.auth import local_jwks, mint_token
+from benchmarks.harness import (
+    print_table,
+    save_results,
+    summarize,
+    time_async_calls,
+    time_calls,
+)
+from benchmarks.seed import CLERK_USER_ID_PREFIX
+
+PAGE_SIZE = 20
+
+
+def bench_make(rounds: int) -> dict[str, dict[str, float]]:
+    disbursement = Disbursement(
+        id=uuid.uuid4(),
+        owner_id=uuid.uuid4(),
+        paying_party_id=uuid.uuid4(),
+        on_behalf_of_party_id=uuid.uuid4(),
+        amount=12.34,
+        currency="EUR",
+        comment="Dinner",
+        created_at=datetime(2025, 1, 1),
+        updated_at=datetime(2025, 1, 1),
+    )
+    return {
+        "DisbursementPublic.make": summarize(
+            time_calls(lambda: DisbursementPublic.make(disbursement), rounds)
+        )
+    }
+
+
+def bench_verify_token(rounds: int) -> dict[str, dict[str, float]]:
+    oidc.key_store = JwksKeyStore(
+        local_jwks, ttl_seconds=3600, min_refresh_interval_seconds=0
+    )
+    token = mint_token("bench_micro")
+
+    def uncached() -> None:
+        oidc.token_cache.clear()
+        oidc.verify_token(token)
+
+    return {
+        "verify_token (signature)": summarize(time_calls(uncached, rounds)),
+        "verify_token (cached)": summarize(
+            time_calls(lambda: oidc.verify_token(token), rounds)
+        ),
+    }
+
+
+async def bench_repositories(rounds: int, writes: bool) -> dict[str, dict[str, float]]:
+    async with open_session() as session:
+        return await bench_session(session, rounds, writes)
+
+
+async def bench_session(
+    session: DbSession, rounds: int, writes: bool
+) -> dict[str, dict[str, float]]:
+    clerk_user_id = f"{CLERK_USER_ID_PREFIX}0"
+    me = (
+        await session.exec(select(User.id).where(User.clerk_user_id == clerk_user_id))
+    ).one_or_none()
+    if me is None:
+        raise SystemExit("No seeded data, run `python -m benchmarks.seed` first")
+    other = (
+        await session.exec(
+            select(Disbursement.on_behalf_of_party_id)
+            .where(Disbursement.paying_party_id == me)
+            .where(Disbursement.on_behalf_of_party_id != me)
+            .limit(1)
+        )
+    ).one()
+    settlement_ids = list(
+        (
+            await session.exec(
+                select(Settlement.id).where(Settlement.owner_id == me).limit(20)
+            )
+        ).all()
+    )
+    group = [me, other]
+    await session.rollback()
+
+    users = UsersRepository(session)
+    disbursements = DisbursementsRepository(session)
+    settlements = SettlementsRepository(session)
+    balances = PairBalancesRepository(session)
+    cases: dict[str, Callable[[], Awaitable[object]]] = {
+        "users.find_one_by_clerk_user_id": lambda: users.find_one_by_clerk_user_id(
+            clerk_user_id
+        ),
+        "disbursements.find_all_owned": lambda: disbursements.find_all_owned(
+            me, PAGE_SIZE
+        ),
+        "disbursements.find_all_between": lambda: disbursements.find_all_between(
+            me, other, PAGE_SIZE, 0, exclude_settled=False
+        ),
+        "disbursements.find_all_by_settlement": lambda: (
+            disbursements.find_all_by_settlement(settlement_ids)
+        ),
+        "disbursements.count_owned": lambda: disbursements.count_owned(me),
+        "disbursements.version_owned": lambda: disbursements.version_owned(me),
+        "disbursements.version_between": lambda: disbursements.version_between(
+            me, other, exclude_settled=False
+        ),
+        "disbursements.sum_amount_due": lambda: disbursements.sum_amount_due(me, other),
+        "settlements.find_all_owned": lambda: settlements.find_all_owned(me, PAGE_SIZE),
+        "settlements.count_owned": lambda: settlements.count_owned(me),
+        "settlements.version_owned": lambda: settlements.version_owned(me),
+        "pair_balances.find_for_user": lambda: balances.find_for_user(me),
+        "pair_balances.sum_net_balances": lambda: balances.sum_net_balances(
+            group, "EUR"
+        ),
+    }
+    results = {}
+    for name, run in cases.items():
+        results[name] = summarize(await time_async_calls(run, rounds))
+        # no transaction left open between the cases, like between requests
+        await session.rollback()
+    if writes:
+        results |= await bench_writes(disbursements, me, other, rounds)
+    return results
+
+
+async def bench_writes(
+    disbursements: DisbursementsRepository,
+    me: uuid.UUID,
+    other: uuid.UUID,
+    rounds: int,
+) -> dict[str, dict[str, float]]:
+    created: list[Disbursement] = []
+
+    def new_disbursement() -> Disbursement:
+        return Disbursement(
+            owner_id=me,
+            paying_party_id=me,
+            on_behalf_of_party_id=other,
+            amount=10,
+            currency="EUR",
+            comment="benchmarks.micro",
+        )
+
+    async def create_and_refresh() -> None:
+        disbursement = new_disbursement()
+        await disbursements.create_and_refresh(disbursement)
+        created.append(disbursement)
+
+    async def create_many() -> None:
+        created.extend(
+            await disbursements.create_many([new_disbursement() for _ in range(10)])
+        )
+
+    async def soft_delete() -> None:
+        await disbursements.soft_delete(created.pop().id, me)
+
+    results = {
+        "disbursements.create_and_refresh": summarize(
+            await time_async_calls(create_and_refresh, rounds)
+        ),
+        "disbursements.create_many (10)": summarize(
+            await time_async_calls(create_many, rounds)
+        ),
+    }
+    # deletes what was created, so that the balances are as before
+    results["disbursements.soft_delete"] = summarize(
+        await time_async_calls(soft_delete, len(created) - 1)
+    )
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--db", action="store_true", help="benchmark the repositories")
+    parser.add_argument(
+        "--writes", action="store_true", help="benchmark the write methods, too"
+    )
+    parser.add_argument("--save", action="store_true", help="store the results")
+    args = parser.parse_args()
+    results = bench_make(args.rounds * 10) | bench_verify_token(args.rounds)
+    if args.db:
+        results |= asyncio.run(bench_repositories(args.rounds, args.writes))
+    print_table(results)
+    if args.save:
+        print(f"saved {save_results('micro', results)}")
+
+
+if __name__ == "__main__":
+    main()
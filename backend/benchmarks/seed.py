@@ -0,0 +1,276 @@
+"""
+Bulk-loads synthetic users, disbursements and settlements with COPY, for benchmarks against realistic table sizes.
+
+    python -m benchmarks.seed --users 200000 --disbursements 5000000
+    python -m benchmarks.seed --clean       # deletes the seeded users, their data goes with them by cascade
+
+Users come in groups of friends that share expenses. Per pair and currency, the disbursements older than
+a cutoff are settled with one settlement of exactly their amount due, so the data passes the API's checks.
+The seeded users have the Clerk user ids `bench_<n>`, which benchmarks.load signs tokens for.
+
+Every group draws from its own random generator, so the rows can be generated twice without holding them:
+once for the settlements, once for the disbursements that reference them.
+"""
+
+import argparse
+import asyncio
+import random
+import time
+import uuid
+from collections.abc import Iterator
+from datetime import datetime, timedelta
+from typing import Any, NamedTuple
+
+from sqlalchemy import text
+from sqlmodel import Session
+
+from app.core.db import ThreadedSession, engine
+from app.core.repos.pair_balances_repo import PairBalancesRepository
+
+CLERK_USER_ID_PREFIX = "bench_"
+GROUP_SIZES = (3, 12)
+HISTORY = timedelta(days=730)
+# the timestamp columns are without time zone
+NOW = datetime(2026, 1, 1)
+DELETED_FRACTION = 0.02
+
+# column names and Postgres types, declared up front so COPY does not look up a dumper per value
+USER_COLUMNS = {"id": "uuid", "clerk_user_id": "varchar", "is_active": "bool"}
+DISBURSEMENT_COLUMNS = {
+    "id": "uuid",
+    "owner_id": "uuid",
+    "paying_party_id": "uuid",
+    "on_behalf_of_party_id": "uuid",
+    "amount": "float8",
+    "currency": "varchar",
+    "comment": "varchar",
+    "created_at": "timestamp",
+    "updated_at": "timestamp",
+    "deleted_at": "timestamp",
+    "settlement_id": "uuid",
+}
+SETTLEMENT_COLUMNS = {
+    "id": "uuid",
+    "owner_id": "uuid",
+    "sending_party_id": "uuid",
+    "receiving_party_id": "uuid",
+    "amount_paid": "float8",
+    "currency": "varchar",
+    "settled_at": "timestamp",
+    "created_at": "timestamp",
+    "updated_at": "timestamp",
+}
+
+
+class Group(NamedTuple):
+    number: int
+    first_user: int
+    size: int
+    disbursements: int
+
+
+def user_id(seed: int, n: int) -> uuid.UUID:
+    return uuid.UUID(int=(seed << 64) | n, version=4)
+
+
+def plan_groups(seed: int, users: int, disbursements: int) -> list[Group]:
+    rng = random.Random(seed)
+    sizes = []
+    remaining = users
+    while remaining > 0:
+        size = min(rng.randint(*GROUP_SIZES), remaining)
+        if remaining - size < GROUP_SIZES[0]:
+            size = remaining
+        sizes.append(size)
+        remaining -= size
+    groups = []
+    first_user = 0
+    assigned = 0
+    for number, size in enumerate(sizes):
+        # proportional to the group size, rounded such that the total matches
+        upto = round(disbursements * (first_user + size) / users)
+        groups.append(Group(number, first_user, size, upto - assigned))
+        first_user += size
+        assigned = upto
+    return groups
+
+
+def generate_group(
+    seed: int, group: Group, settle_fraction: float
+) -> tuple[list[tuple[Any, ...]], list[tuple[Any, ...]]]:
+    """The settlement and the disbursement rows of the group, in the order of SETTLEMENT_COLUMNS and DISBURSEMENT_COLUMNS."""
+    rng = random.Random(f"{seed}-{group.number}")
+    members = [user_id(seed, group.first_user + i) for i in range(group.size)]
+    cutoff = NOW - HISTORY * (1 - settle_fraction)
+    disbursements: list[list[Any]] = []
+    for _ in range(group.disbursements):
+        paying, on_behalf = rng.sample(members, 2)
+        currency = "EUR" if rng.random() < 0.9 else "JPY"
+        amount = (
+            round(rng.uniform(1, 250), 2)
+            if currency == "EUR"
+            else float(rng.randint(100, 30_000))
+        )
+        created_at = NOW - HISTORY * rng.random()
+        deleted_at = (
+            created_at + timedelta(hours=1) if rng.random() < DELETED_FRACTION else None
+        )
+        disbursements.append(
+            [
+                uuid.UUID(int=rng.getrandbits(128), version=4),
+                paying if rng.random() < 0.8 else on_behalf,
+                paying,
+                on_behalf,
+                amount,
+                currency,
+                None,
+                created_at,
+                created_at if deleted_at is None else deleted_at,
+                deleted_at,
+                None,
+            ]
+        )
+    # everything live before the cutoff is settled, one settlement per pair and currency
+    to_settle: dict[tuple[uuid.UUID, uuid.UUID, str], list[list[Any]]] = {}
+    for d in disbursements:
+        if d[9] is None and d[7] < cutoff:
+            a, b = sorted((d[2], d[3]))
+            to_settle.setdefault((a, b, d[5]), []).append(d)
+    settlements = []
+    for (a, b, currency), settled in to_settle.items():
+        # the amount due from the perspective of `a`, positive if `b` owes `a`
+        due = round(sum(d[4] if d[2] == a else -d[4] for d in settled), 2)
+        if due == 0:
+            continue
+        sending, receiving = (b, a) if due > 0 else (a, b)
+        settlement_id = uuid.UUID(int=rng.getrandbits(128), version=4)
+        settled_at = max(d[7] for d in settled) + timedelta(days=1)
+        settlements.append(
+            (
+                settlement_id,
+                sending,
+                sending,
+                receiving,
+                abs(due),
+                currency,
+                settled_at,
+                settled_at,
+                settled_at,
+            )
+        )
+        for d in settled:
+            d[10] = settlement_id
+            d[8] = settled_at
+    return settlements, [tuple(d) for d in disbursements]
+
+
+def user_rows(seed: int, users: int) -> Iterator[tuple[Any, ...]]:
+    for n in range(users):
+        yield user_id(seed, n), f"{CLERK_USER_ID_PREFIX}{n}", True
+
+
+def settlement_rows(
+    seed: int, groups: list[Group], settle_fraction: float
+) -> Iterator[tuple[Any, ...]]:
+    for group in groups:
+        yield from generate_group(seed, group, settle_fraction)[0]
+
+
+def disbursement_rows(
+    seed: int, groups: list[Group], settle_fraction: float
+) -> Iterator[tuple[Any, ...]]:
+    for group in groups:
+        yield from generate_group(seed, group, settle_fraction)[1]
+
+
+def copy_rows(
+    cursor: Any, table: str, columns: dict[str, str], rows: Iterator[tuple[Any, ...]]
+) -> None:
+    start = time.perf_counter()
+    count = 0
+    statement = f"COPY {table} ({', '.join(columns)}) FROM STDIN (FORMAT BINARY)"
+    with cursor.copy(statement) as copy:
+        copy.set_types(list(columns.values()))
+        for row in rows:
+            copy.write_row(row)
+            count += 1
+    seconds = time.perf_counter() - start
+    print(
+        f"{table:>14} {count:>10} rows {seconds:>8.1f}s {count / max(seconds, 1e-9):>10.0f} rows/s"
+    )
+
+
+def load(users: int, disbursements: int, settle_fraction: float, seed: int) -> None:
+    groups = plan_groups(seed, users, disbursements)
+    connection = engine.raw_connection()
+    try:
+        # the psycopg connection, for its COPY support
+        psycopg_connection = connection.driver_connection
+        assert psycopg_connection is not None
+        cursor = psycopg_connection.cursor()
+        copy_rows(cursor, '"user"', USER_COLUMNS, user_rows(seed, users))
+        copy_rows(
+            cursor,
+            "settlement",
+            SETTLEMENT_COLUMNS,
+            settlement_rows(seed, groups, settle_fraction),
+        )
+        copy_rows(
+            cursor,
+            "disbursement",
+            DISBURSEMENT_COLUMNS,
+            disbursement_rows(seed, groups, settle_fraction),
+        )
+        connection.commit()
+    finally:
+        connection.close()
+    start = time.perf_counter()
+    with Session(engine) as session:
+        asyncio.run(PairBalancesRepository(ThreadedSession(session)).rebuild())
+    print(f"{'pair_balance':>14} rebuilt in {time.perf_counter() - start:.1f}s")
+    analyze()
+
+
+def clean() -> None:
+    with Session(engine) as session:
+        result = session.execute(
+            text('DELETE FROM "user" WHERE clerk_user_id LIKE :prefix'),
+            {"prefix": f"{CLERK_USER_ID_PREFIX}%"},
+        )
+        session.commit()
+    print(f"deleted {result.rowcount} users")  # type: ignore[attr-defined]
+    analyze()
+
+
+def analyze() -> None:
+    with engine.connect() as connection:
+        connection = connection.execution_options(isolation_level="AUTOCOMMIT")
+        for table in ('"user"', "disbursement", "settlement", "pair_balance"):
+            connection.execute(text(f"VACUUM ANALYZE {table}"))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--disbursements", type=int, default=500_000)
+    parser.add_argument(
+        "--settle-fraction",
+        type=float,
+        default=0.7,
+        help="share of the history that is settled",
+    )
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument(
+        "--clean", action="store_true", help="delete the seeded data instead"
+    )
+    args = parser.parse_args()
+    if args.clean:
+        clean()
+        return
+    if args.users < GROUP_SIZES[0]:
+        parser.error(f"seed at least {GROUP_SIZES[0]} users")
+    load(args.users, args.disbursements, args.settle_fraction, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Per-row cost of serializing a 100-row page of disbursements to the response body.
+
+    python -m benchmarks.serialization
+
+"models" is the previous path: DisbursementPublic.make, then FastAPI validating against the
+response_model and rendering a JSONResponse. "fast path" is app.api.serialization.
+"""
+
+import asyncio
+import time
+import uuid
+from collections.abc import Awaitable, Callable, Sequence
+from datetime import datetime
+from typing import TypeVar
+
+from fastapi import Response
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from app.api.serialization import dump_disbursements
+from app.core.repos.disbursements_repo import DisbursementRow
+from app.models import Disbursement, DisbursementPublic, DisbursementsPublic, Money
+
+T = TypeVar("T")
+
+PAGE_SIZE = 100
+ROUNDS = 200
+
+response_field = create_model_field(name="Response", type_=DisbursementsPublic)
+
+
+def make_page() -> list[DisbursementRow]:
+    owner_id = uuid.uuid4()
+    return [
+        DisbursementRow(
+            id=uuid.uuid4(),
+            owner_id=owner_id,
+            paying_party_id=owner_id,
+            on_behalf_of_party_id=uuid.uuid4(),
+            comment=f"receipt {i}",
+            created_at=datetime.now(),
+            updated_at=datetime.now(),
+            amount=i + 0.5,
+            currency="EUR",
+        )
+        for i in range(PAGE_SIZE)
+    ]
+
+
+def legacy_make(d: Disbursement) -> DisbursementPublic:
+    return DisbursementPublic(**d.model_dump(), amount_paid=Money(**d.model_dump()))
+
+
+async def with_models(page: Sequence[Disbursement]) -> Response:
+    content = DisbursementsPublic(
+        data=list(map(legacy_make, page)), total=PAGE_SIZE, next_cursor=None
+    )
+    jsonable = await serialize_response(field=response_field, response_content=content)
+    return JSONResponse(jsonable)
+
+
+async def with_fast_path(page: Sequence[DisbursementRow]) -> Response:
+    # the list routes return the body the same way
+    return Response(
+        dump_disbursements(page, PAGE_SIZE, None), media_type="application/json"
+    )
+
+
+async def per_row_microseconds(
+    serialize: Callable[[Sequence[T]], Awaitable[Response]], page: Sequence[T]
+) -> float:
+    await serialize(page)
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        await serialize(page)
+    return (time.perf_counter() - start) / ROUNDS / PAGE_SIZE * 1e6
+
+
+def main() -> None:
+    rows = make_page()
+    # the repositories used to load entities
+    entities = [Disbursement(**row._asdict()) for row in rows]
+    before = asyncio.run(per_row_microseconds(with_models, entities))
+    after = asyncio.run(per_row_microseconds(with_fast_path, rows))
+    print(f"{'models':>10} {before:8.2f} us/row")
+    print(f"{'fast path':>10} {after:8.2f} us/row ({before / after:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+How the settlement suggestions scale with the size of the group.
+
+    python -m benchmarks.settle_up          # solver only
+    python -m benchmarks.settle_up --db     # plus the net balance query against a fully connected ledger
+
+The ledger holds one row per pair and currency, so the query does not depend on the number of disbursements.
+The --db run seeds users and ledger rows in a transaction that is rolled back.
+"""
+
+import argparse
+import asyncio
+import random
+import time
+import uuid
+from collections.abc import Callable
+from functools import partial
+
+from sqlalchemy import insert
+from sqlmodel import Session
+
+from app.core.db import ThreadedSession, engine
+from app.core.repos.pair_balances_repo import PairBalancesRepository
+from app.core.settle_up import minimize_transfers
+from app.models import PairBalance, User
+
+GROUP_SIZES = [10, 50, 200, 1000, 5000]
+DB_GROUP_SIZES = [10, 50, 200]
+
+
+def best_of(repeat: int, run: Callable[[], object]) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def random_balances(size: int, rng: random.Random) -> dict[uuid.UUID, float]:
+    balances = {
+        uuid.uuid4(): rng.randint(-100_000, 100_000) / 100 for _ in range(size - 1)
+    }
+    balances[uuid.uuid4()] = -sum(balances.values())
+    return balances
+
+
+def bench_solver() -> None:
+    rng = random.Random(0)
+    print(f"{'members':>8} {'transfers':>10} {'solver ms':>10}")
+    for size in GROUP_SIZES:
+        balances = random_balances(size, rng)
+        transfers = minimize_transfers(balances)
+        seconds = best_of(5, partial(minimize_transfers, balances))
+        print(f"{size:>8} {len(transfers):>10} {seconds * 1000:>10.2f}")
+
+
+def query_net_balances(repo: PairBalancesRepository, user_ids: list[uuid.UUID]) -> None:
+    asyncio.run(repo.sum_net_balances(user_ids, "EUR"))
+
+
+def bench_query() -> None:
+    rng = random.Random(0)
+    print(f"{'members':>8} {'ledger rows':>12} {'query ms':>10}")
+    for size in DB_GROUP_SIZES:
+        with Session(engine) as session:
+            user_ids = sorted(uuid.uuid4() for _ in range(size))
+            session.execute(
+                insert(User), [{"id": id, "is_active": True} for id in user_ids]
+            )
+            rows = [
+                {
+                    "user_a_id": a,
+                    "user_b_id": b,
+                    "currency": "EUR",
+                    "amount": rng.randint(-10_000, 10_000) / 100,
+                }
+                for i, a in enumerate(user_ids)
+                for b in user_ids[i + 1 :]
+            ]
+            session.execute(insert(PairBalance), rows)
+            repo = PairBalancesRepository(ThreadedSession(session))
+            seconds = best_of(5, partial(query_net_balances, repo, user_ids))
+            print(f"{size:>8} {len(rows):>12} {seconds * 1000:>10.2f}")
+            session.rollback()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--db", action="store_true", help="benchmark the query, too")
+    args = parser.parse_args()
+    bench_solver()
+    if args.db:
+        bench_query()
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,6 @@
 set -e
 set -x
 
-mypy app
-ruff check app
-ruff format app --check
+mypy app benchmarks
+ruff check app benchmarks
+ruff format app benchmarks --check